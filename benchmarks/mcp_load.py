@@ -0,0 +1,364 @@
+"""
+Load generator for the streamable HTTP MCP server (mcp/mcp_duckdb_http.py).
+
+Replays a mix of ``query_duckdb`` and ``list_tables`` calls from a number of
+concurrent clients, each with its own MCP session, and reports per-tool
+p50/p95/p99 latency, throughput, errors and the server's memory, so pooling and
+caching changes can be checked under realistic concurrency.
+
+The calls come either from a recording or from a seeded synthetic mix. To
+record real agent traffic, start any server with ``MCP_RECORD_CALLS`` set; every
+tool call is appended to that JSONL file:
+
+    MCP_RECORD_CALLS=data/benchmarks/calls.jsonl uv run mcp/mcp_duckdb_http.py
+
+Then replay it, or a synthetic mix, against a running server or one started
+for the run:
+
+    uv run benchmarks/mcp_load.py --spawn --concurrency 16 --duration 30
+    uv run benchmarks/mcp_load.py --url http://127.0.0.1:8000/mcp --server-pid <pid> --recording data/benchmarks/calls.jsonl
+    uv run benchmarks/mcp_load.py --spawn --workers 4 --mix list_tables=1,query_duckdb=9 --distinct 1000
+
+Server memory (RSS of the server process and its workers, sampled every 100ms)
+is read from /proc and is only available on Linux with --spawn or --server-pid.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from pydantic import AnyUrl
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORTS_DIR = os.path.join(PROJECT_ROOT, "data", "benchmarks", "reports")
+DEFAULT_MIX = "list_tables=1,query_duckdb=4"
+MEMORY_SAMPLE_SECONDS = 0.1
+
+# Shapes of the queries agents send; {crate_id}, {limit} and {days} vary per call
+QUERY_TEMPLATES = [
+    "SELECT id, name, created_at FROM staging.stg_crates ORDER BY created_at DESC LIMIT {limit}",
+    "SELECT c.name, cd.downloads FROM staging.stg_crates c JOIN staging.stg_crate_downloads cd ON cd.crate_id = c.id "
+    "ORDER BY cd.downloads DESC LIMIT {limit}",
+    "SELECT num, yanked, created_at, downloads FROM staging.stg_versions WHERE crate_id = {crate_id} "
+    "ORDER BY created_at DESC LIMIT {limit}",
+    "SELECT vd.date, SUM(vd.downloads) AS downloads FROM staging.stg_version_downloads vd "
+    "JOIN staging.stg_versions v ON v.id = vd.version_id WHERE v.crate_id = {crate_id} "
+    "AND vd.date >= (SELECT MAX(date) FROM staging.stg_version_downloads) - INTERVAL {days} DAY "
+    "GROUP BY vd.date ORDER BY vd.date",
+    "SELECT kind, COUNT(*) AS dependencies FROM staging.stg_dependencies WHERE crate_id = {crate_id} GROUP BY kind",
+    "SELECT date, SUM(downloads) AS downloads FROM staging.stg_version_downloads "
+    "WHERE date >= (SELECT MAX(date) FROM staging.stg_version_downloads) - INTERVAL {days} DAY "
+    "GROUP BY date ORDER BY date",
+]
+
+
+def parse_mix(mix: str) -> dict:
+    """"list_tables=1,query_duckdb=4" -> {'list_tables': 1.0, 'query_duckdb': 4.0}"""
+    weights = {}
+    for part in mix.split(","):
+        tool, _, weight = part.partition("=")
+        if tool.strip() not in ("list_tables", "query_duckdb"):
+            raise ValueError(f"Unsupported tool in mix: {tool.strip()!r}")
+        weights[tool.strip()] = float(weight or 1)
+    return weights
+
+
+def synthetic_calls(count: int, mix: dict, distinct: int, seed: int) -> list:
+    """
+    A seeded list of (tool, arguments) calls.
+
+    ``distinct`` bounds the number of different values per query parameter, and
+    so how often the same SQL is repeated.
+    """
+    rng = random.Random(seed)
+    tools, weights = list(mix), list(mix.values())
+    calls = []
+    for _ in range(count):
+        tool = rng.choices(tools, weights)[0]
+        if tool == "list_tables":
+            calls.append((tool, {}))
+            continue
+        template = rng.choice(QUERY_TEMPLATES)
+        variant = rng.randrange(distinct)
+        sql = template.format(crate_id=variant % 2000 + 1, limit=10 + variant % 90, days=7 + variant % 358)
+        calls.append((tool, {"sql": sql}))
+    return calls
+
+
+def recorded_calls(path: str, tools: set = None) -> list:
+    """(tool, arguments) calls from a file written with MCP_RECORD_CALLS, in recorded order."""
+    calls = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if tools is None or record["tool"] in tools:
+                calls.append((record["tool"], record.get("arguments") or {}))
+    if not calls:
+        raise ValueError(f"No replayable calls in {path}")
+    return calls
+
+
+def percentile(samples: list, p: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+def _process_tree(pid: int) -> list:
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def tree_rss_mb(pid: int):
+    """Resident memory of a process and all its descendants, or None when /proc isn't available."""
+    total_kb, found = 0, False
+    for current in _process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        found = True
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024 if found else None
+
+
+async def _sample_memory(pid: int, samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        rss = tree_rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), MEMORY_SAMPLE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _is_error(result) -> bool:
+    # Tool failures come back as text for the agent, not as protocol errors
+    if result.isError:
+        return True
+    return any(getattr(item, "text", "").startswith("Error:") for item in result.content)
+
+
+async def _client(url: str, calls: list, next_call, deadline: float, results: list, errors: dict):
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            while time.perf_counter() < deadline:
+                index = next_call()
+                if index is None:
+                    return
+                tool, arguments = calls[index % len(calls)]
+                start = time.perf_counter()
+                try:
+                    failed = _is_error(await session.call_tool(tool, arguments))
+                except Exception as e:
+                    failed = True
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                results.append((tool, time.perf_counter() - start, failed))
+
+
+async def _server_metrics(url: str):
+    async with streamablehttp_client(url) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            resource = await session.read_resource(AnyUrl("metrics://server"))
+            return json.loads(resource.contents[0].text)
+
+
+async def run_load(url: str, calls: list, concurrency: int, duration: float = None, requests: int = None, server_pid: int = None) -> dict:
+    """
+    Replay ``calls`` from ``concurrency`` clients until ``requests`` calls were
+    made or ``duration`` seconds passed, and return the report.
+    """
+    issued = 0
+
+    def next_call():
+        nonlocal issued
+        if requests is not None and issued >= requests:
+            return None
+        issued += 1
+        return issued - 1
+
+    results, errors, memory = [], {}, []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_memory(server_pid, memory, stop)) if server_pid else None
+    baseline_rss = tree_rss_mb(server_pid) if server_pid else None
+
+    start = time.perf_counter()
+    deadline = start + duration if duration else float("inf")
+    outcomes = await asyncio.gather(
+        *(_client(url, calls, next_call, deadline, results, errors) for _ in range(concurrency)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if sampler:
+        await sampler
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            errors[f"session {type(outcome).__name__}"] = errors.get(f"session {type(outcome).__name__}", 0) + 1
+
+    def summarize(rows):
+        latencies = [seconds for _, seconds, _ in rows]
+        return {
+            "calls": len(rows),
+            "errors": sum(1 for _, _, failed in rows if failed),
+            "throughput_per_second": round(len(rows) / elapsed, 2) if elapsed else None,
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+            **{
+                f"p{p}_ms": round(percentile(latencies, p) * 1000, 2) if latencies else None
+                for p in (50, 95, 99)
+            },
+            "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+        }
+
+    try:
+        server_metrics = await _server_metrics(url)
+    except Exception:
+        server_metrics = None
+
+    return {
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": summarize(results),
+        "tools": {tool: summarize([row for row in results if row[0] == tool]) for tool in sorted({row[0] for row in results})},
+        "exceptions": errors,
+        "memory": {
+            "baseline_rss_mb": round(baseline_rss, 1) if baseline_rss is not None else None,
+            "peak_rss_mb": round(max(memory), 1) if memory else None,
+            "final_rss_mb": round(memory[-1], 1) if memory else None,
+            "samples": len(memory),
+        },
+        "server_metrics": server_metrics,
+    }
+
+
+def _wait_for_port(host: str, port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before accepting connections")
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not listen on {host}:{port} within {timeout:.0f}s")
+
+
+def spawn_server(host: str, port: int, workers: int) -> subprocess.Popen:
+    """Start mcp/mcp_duckdb_http.py and wait until it accepts connections."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, "mcp", "mcp_duckdb_http.py"),
+         "--host", host, "--port", str(port), "--workers", str(workers)],
+        cwd=PROJECT_ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_for_port(host, port, process)
+    except BaseException:
+        process.terminate()
+        process.wait()
+        raise
+    return process
+
+
+def print_report(report: dict):
+    header = f"  {'tool':<14} {'calls':>7} {'errors':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    print(f"\nMCP load: {report['concurrency']} clients for {report['elapsed_seconds']:.1f}s")
+    print(header)
+    for tool, stats in [*report["tools"].items(), ("total", report["overall"])]:
+        if not stats["calls"]:
+            continue
+        print(
+            f"  {tool:<14} {stats['calls']:>7} {stats['errors']:>7} {stats['throughput_per_second']:>8.1f} "
+            f"{stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms {stats['max_ms']:>7.1f}ms"
+        )
+    if report["exceptions"]:
+        print(f"  exceptions: {', '.join(f'{name} x{count}' for name, count in report['exceptions'].items())}")
+    memory = report["memory"]
+    if memory["peak_rss_mb"] is not None:
+        print(f"  server RSS: {memory['baseline_rss_mb']:.0f}MB before, {memory['peak_rss_mb']:.0f}MB peak, {memory['final_rss_mb']:.0f}MB after")
+    server_tools = (report["server_metrics"] or {}).get("tools", {})
+    if server_tools:
+        print(f"  server cache hits: {', '.join(f'{tool} {stats['cache_hits']}/{stats['calls']}' for tool, stats in server_tools.items())}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000/mcp", help="Endpoint of a running server")
+    parser.add_argument("--spawn", action="store_true", help="Start mcp/mcp_duckdb_http.py for the run instead of using --url")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the spawned server")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes of the spawned server")
+    parser.add_argument("--server-pid", type=int, help="PID of a running server, to sample its memory")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client sessions")
+    parser.add_argument("--duration", type=float, help="Seconds to run for")
+    parser.add_argument("--requests", type=int, help="Total calls to make (default: 500 unless --duration is given)")
+    parser.add_argument("--recording", help="JSONL file written with MCP_RECORD_CALLS to replay")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Synthetic tool weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--distinct", type=int, default=200, help="Distinct parameter values per synthetic query shape")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Report path (default: data/benchmarks/reports/mcp-load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    requests = args.requests if args.requests or args.duration else 500
+    if args.recording:
+        calls = recorded_calls(args.recording, {"list_tables", "query_duckdb"})
+        workload = {"recording": args.recording}
+    else:
+        calls = synthetic_calls(requests or 10_000, parse_mix(args.mix), args.distinct, args.seed)
+        workload = {"mix": args.mix, "distinct": args.distinct, "seed": args.seed}
+
+    server, url, server_pid = None, args.url, args.server_pid
+    if args.spawn:
+        print(f"Starting MCP HTTP server on port {args.port} with {args.workers} worker(s)...")
+        server = spawn_server("127.0.0.1", args.port, args.workers)
+        url, server_pid = f"http://127.0.0.1:{args.port}/mcp", server.pid
+
+    try:
+        report = asyncio.run(run_load(url, calls, args.concurrency, args.duration, requests, server_pid))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "url": url,
+        "workers": args.workers if args.spawn else None,
+        "workload": workload,
+        **report,
+    }
+    print_report(report)
+
+    output = args.output or os.path.join(REPORTS_DIR, f"mcp-load-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Report written to {output}")
@@ -0,0 +1,181 @@
+"""
+Cold-start benchmark for the MCP servers.
+
+Each run starts a fresh server process and times what an agent waits for after
+launching it: the ``initialize`` handshake, ``list_tools``, then the first
+``list_tables`` call (catalog build) and the first ``query_duckdb`` call
+(connection, query guard and result rendering). Every phase is reported as the
+median over the runs, in seconds since the process was spawned, so the numbers
+include interpreter start and module imports:
+
+    uv run benchmarks/mcp_startup.py                          # stdio server
+    uv run benchmarks/mcp_startup.py --server http --runs 5
+    uv run benchmarks/mcp_startup.py --pause 1                # agent thinks for 1s before its first call
+    MCP_PREWARM=0 uv run benchmarks/mcp_startup.py            # without the background pre-warm
+
+``--pause`` waits between ``list_tools`` and the first call, like an agent
+reading the tool list; the server's background pre-warm runs during that time.
+Given a baseline report, the run exits non-zero if a phase regressed by more
+than the threshold, as with benchmarks/run.py.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+from run import DEFAULT_MIN_DELTA, DEFAULT_THRESHOLD, compare, print_comparison
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORTS_DIR = os.path.join(PROJECT_ROOT, "data", "benchmarks", "reports")
+SERVERS = {
+    "stdio": os.path.join(PROJECT_ROOT, "mcp", "mcp_duckdb_server.py"),
+    "http": os.path.join(PROJECT_ROOT, "mcp", "mcp_duckdb_http.py"),
+}
+PHASES = ("initialize", "list_tools", "first_list_tables", "first_query")
+FIRST_QUERY = "SELECT COUNT(*) AS crates FROM staging.stg_crates"
+PORT_POLL_SECONDS = 0.01
+
+
+async def _session_phases(session: ClientSession, spawned_at: float, pause: float) -> dict:
+    phases = {}
+    await session.initialize()
+    phases["initialize"] = time.perf_counter() - spawned_at
+    await session.list_tools()
+    phases["list_tools"] = time.perf_counter() - spawned_at
+    if pause:
+        await asyncio.sleep(pause)
+    for phase, tool, arguments in (
+        ("first_list_tables", "list_tables", {}),
+        ("first_query", "query_duckdb", {"sql": FIRST_QUERY}),
+    ):
+        result = await session.call_tool(tool, arguments)
+        text = result.content[0].text if result.content else ""
+        if result.isError or text.startswith("Error:"):
+            raise RuntimeError(f"{tool} failed: {text}")
+        phases[phase] = time.perf_counter() - spawned_at
+    return phases
+
+
+async def _stdio_run(env: dict, pause: float) -> dict:
+    params = StdioServerParameters(command=sys.executable, args=[SERVERS["stdio"]], env=env, cwd=PROJECT_ROOT)
+    spawned_at = time.perf_counter()
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            return await _session_phases(session, spawned_at, pause)
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before accepting connections")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(PORT_POLL_SECONDS)
+    raise RuntimeError(f"Server did not listen on port {port} within {timeout:.0f}s")
+
+
+async def _http_run(env: dict, pause: float, port: int) -> dict:
+    spawned_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, SERVERS["http"], "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        await asyncio.to_thread(_wait_for_port, port, process)
+        async with streamablehttp_client(f"http://127.0.0.1:{port}/mcp") as (read, write, _):
+            async with ClientSession(read, write) as session:
+                return await _session_phases(session, spawned_at, pause)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(server: str = "stdio", runs: int = 5, pause: float = 0.0, port: int = 8766) -> dict:
+    """Start the server ``runs`` times and return the report, with the median of every phase as metrics."""
+    env = dict(os.environ)
+    samples = {phase: [] for phase in PHASES}
+    for i in range(runs):
+        if server == "stdio":
+            phases = asyncio.run(_stdio_run(env, pause))
+        else:
+            phases = asyncio.run(_http_run(env, pause, port))
+        print(f"  run {i + 1}/{runs}: " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in phases.items()))
+        for phase, seconds in phases.items():
+            samples[phase].append(seconds)
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        # Compared by run.compare(), timings are only comparable for the same setup
+        "config": {"server": server, "pause_seconds": pause, "prewarm": os.environ.get("MCP_PREWARM", "1")},
+        "runs": runs,
+        "environment": {
+            "python": sys.version.split()[0],
+            "duckdb_path": os.environ.get("CRATES_DUCKDB_PATH", os.path.join(PROJECT_ROOT, "data", "crates.duckdb")),
+        },
+        "samples": {phase: [round(seconds, 6) for seconds in values] for phase, values in samples.items()},
+        "metrics": {f"startup.{server}.{phase}": round(statistics.median(values), 6) for phase, values in samples.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=sorted(SERVERS), default="stdio")
+    parser.add_argument("--runs", type=int, default=5, help="Server starts (median is reported)")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds between list_tools and the first tool call")
+    parser.add_argument("--port", type=int, default=8766, help="Port of the HTTP server")
+    parser.add_argument("--output", help="Report path (default: data/benchmarks/reports/mcp-startup-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown as a fraction of the baseline (default: 0.20)"
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=DEFAULT_MIN_DELTA,
+        help="Ignore slowdowns smaller than this many seconds (default: 0.005)"
+    )
+    args = parser.parse_args()
+
+    print(f"Starting the {args.server} MCP server {args.runs} times...")
+    report = run(args.server, args.runs, args.pause, args.port)
+
+    print(f"\n  {'phase':<20} {'median':>9} {'min':>9} {'max':>9}")
+    for phase in PHASES:
+        values = report["samples"][phase]
+        print(f"  {phase:<20} {statistics.median(values):>8.3f}s {min(values):>8.3f}s {max(values):>8.3f}s")
+
+    output = args.output or os.path.join(REPORTS_DIR, f"mcp-startup-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Report written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(report, json.load(f), args.threshold, args.min_delta)
+        print_comparison(rows)
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f"\n✗ {len(regressions)} phase(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n✓ No regressions beyond {args.threshold:.0%}")
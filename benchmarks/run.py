@@ -0,0 +1,310 @@
+"""
+Offline benchmark suite for the pipeline and query workloads.
+
+Generates a deterministic synthetic dataset (see synthetic.py), then times the
+real code paths against it in a scratch workspace under data/benchmarks/:
+
+  1. scripts/create_duckdb.py and scripts/load_duckdb.py on the synthetic dump
+  2. a full dbt build, then archive ingestion of the older days through the
+     same day-replace helper the backfill uses, then an incremental dbt build,
+     then the version downloads retention with the shortest daily window, so
+     presets longer than that window exercise the compaction
+  3. a fixed query workload: every named MCP analytics query and every
+     dashboard query, each repeated and reported as its median
+
+The results are written as a JSON report. Given a baseline report, every metric
+is compared and the run exits non-zero if one regressed by more than the
+threshold:
+
+    uv run benchmarks/run.py --preset small
+    uv run benchmarks/run.py --preset small --baseline data/benchmarks/reports/<earlier>.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from importlib import metadata
+from types import SimpleNamespace
+
+import duckdb
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for subdir in ("scripts", "mcp", "visualization"):
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, subdir))
+
+import runtime_config
+import synthetic
+from common import replace_version_downloads_day
+from compact_version_downloads import MIN_DAILY_RETENTION_DAYS
+import analytics
+import dashboard_data
+
+REPORT_FORMAT = 1
+BENCHMARKS_DIR = os.path.join(PROJECT_ROOT, "data", "benchmarks")
+DEFAULT_THRESHOLD = 0.20
+# Differences below this many seconds are noise, whatever the ratio
+DEFAULT_MIN_DELTA = 0.005
+
+
+def _timed(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def _run(cmd: list, cwd: str, env: dict = None):
+    result = subprocess.run(cmd, cwd=cwd, env={**os.environ, **(env or {})}, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stdout[-4000:])
+        print(result.stderr[-4000:])
+        raise RuntimeError(f"Benchmark step failed: {' '.join(cmd)}")
+
+
+def _dbt_build(workspace: str, db_path: str, dbt_vars: dict = None):
+    _run(
+        [
+            "dbt", "build", "--profiles-dir", ".",
+            "--target-path", os.path.join(workspace, "dbt_target"),
+            "--log-path", os.path.join(workspace, "dbt_logs"),
+            *(["--vars", json.dumps(dbt_vars)] if dbt_vars else []),
+        ],
+        cwd=os.path.join(PROJECT_ROOT, "transformations"),
+        env={**runtime_config.dbt_environment(), "CRATES_DUCKDB_PATH": db_path}
+    )
+
+
+def _ingest_archives(db_path: str, archive_dir: str) -> int:
+    """Insert every archive newest first, like a backfill does. Returns the number of days."""
+    archives = sorted(os.listdir(archive_dir), reverse=True)
+    con = runtime_config.connect("bulk_load", duckdb_path=db_path)
+    try:
+        for name in archives:
+            replace_version_downloads_day(con, os.path.join(archive_dir, name), name.removesuffix('.csv'))
+    finally:
+        con.close()
+    return len(archives)
+
+
+class _SingleConnectionPool:
+    """The pool interface AnalyticsQueries uses, over one connection, so queries run as in the MCP server."""
+
+    def __init__(self, con):
+        self.pooled = SimpleNamespace(conn=con, prepared=set())
+
+    @contextmanager
+    def connection(self):
+        yield self.pooled
+
+
+def _workload(con, config: synthetic.SyntheticConfig) -> dict:
+    """
+    Name -> callable of the fixed query workload.
+
+    The MCP queries go through ``analytics.AnalyticsQueries``, PREPAREd once and
+    EXECUTEd with literal arguments like the server does; the dashboard queries
+    run with bound parameters like the dashboard does.
+    """
+    to_date = config.end_date
+    from_date = to_date - timedelta(days=89)
+    popular, mid = "crate-1", f"crate-{max(1, config.crates // 100)}"
+    queries = analytics.AnalyticsQueries(_SingleConnectionPool(con))
+
+    workload = {
+        'mcp.crate_downloads': lambda: queries.crate_downloads(popular, from_date, to_date, 'day'),
+        'mcp.top_crates': lambda: queries.top_crates('month', 20),
+        'mcp.reverse_deps': lambda: queries.reverse_deps(popular, 50),
+        'mcp.version_breakdown': lambda: queries.version_breakdown(mid, 90),
+        'mcp.search_crates': lambda: queries.search_crates('async http parser', 20),
+        'mcp.filter_crates': lambda: queries.filter_crates(['category-1'], ['keyword-1'], 0, 'month', 50),
+    }
+
+    def dashboard_query(sql, params=None):
+        return lambda: con.execute(sql, params).fetchall()
+
+    default_window = dashboard_data.Filters(from_date=from_date, to_date=to_date)
+    all_history = dashboard_data.Filters(from_date=to_date - timedelta(days=100 * 365), to_date=to_date)
+    for name, sql in dashboard_data.QUERIES.items():
+        if name in dashboard_data.FILTERED_QUERIES:
+            workload[f'dashboard.{name}'] = dashboard_query(sql, default_window.params())
+        else:
+            workload[f'dashboard.{name}'] = dashboard_query(sql)
+    workload['dashboard.orphan_rollup.all_history'] = dashboard_query(dashboard_data.QUERIES['orphan_rollup'], all_history.params())
+    return workload
+
+
+def _run_workload(db_path: str, config: synthetic.SyntheticConfig, repeat: int) -> dict:
+    """Median seconds per workload query, after one warm-up execution."""
+    con = runtime_config.connect("interactive", read_only=True, duckdb_path=db_path)
+    results = {}
+    try:
+        for name, query in _workload(con, config).items():
+            query()
+            samples = [_timed(query) for _ in range(repeat)]
+            results[name] = statistics.median(samples)
+    finally:
+        con.close()
+    return results
+
+
+def _environment() -> dict:
+    def version(package):
+        try:
+            return metadata.version(package)
+        except metadata.PackageNotFoundError:
+            return None
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'memory_bytes': runtime_config.memory_bytes(),
+        'duckdb_presets': {
+            name: {key: value for key, value in runtime_config.settings(name).items() if key != 'temp_directory'}
+            for name in runtime_config.WORKLOADS
+        },
+        'duckdb': duckdb.__version__,
+        'dbt_core': version('dbt-core'),
+        'dbt_duckdb': version('dbt-duckdb'),
+        'git_commit': commit,
+    }
+
+
+def run(preset: str, repeat: int = 5, **overrides) -> dict:
+    """Run the whole suite for a preset and return the report."""
+    config = synthetic.preset(preset, **overrides)
+    workspace = os.path.join(BENCHMARKS_DIR, preset)
+    db_path = os.path.join(workspace, "data", "crates.duckdb")
+    for path in (db_path, f"{db_path}.wal", os.path.join(workspace, "dbt_target")):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    metrics = {}
+    print(f"Generating synthetic '{preset}' data in {workspace}...")
+    generate_start = time.perf_counter()
+    data = synthetic.generate(config, workspace)
+    generate_seconds = time.perf_counter() - generate_start
+
+    workspace_env = {"CRATES_DUCKDB_PATH": db_path}
+    archive_dir = os.path.join(workspace, "data", "archives")
+    steps = [
+        ('create_duckdb', lambda: _run([sys.executable, os.path.join(PROJECT_ROOT, "scripts", "create_duckdb.py")], cwd=workspace, env=workspace_env)),
+        ('load_duckdb', lambda: _run([sys.executable, os.path.join(PROJECT_ROOT, "scripts", "load_duckdb.py")], cwd=workspace, env=workspace_env)),
+        ('dbt_build_full', lambda: _dbt_build(workspace, db_path)),
+        ('ingest_archives', lambda: _ingest_archives(db_path, archive_dir)),
+        # The archive days are older than the first build's, like the backfilled days dbt_plan passes on
+        ('dbt_build_incremental', lambda: _dbt_build(
+            workspace, db_path, {'vd_rebuild_dates': sorted(name.removesuffix('.csv') for name in os.listdir(archive_dir))}
+        )),
+        ('compact_version_downloads', lambda: _run(
+            [sys.executable, os.path.join(PROJECT_ROOT, "scripts", "compact_version_downloads.py")],
+            cwd=workspace,
+            env={**workspace_env, "VD_DAILY_RETENTION_DAYS": str(MIN_DAILY_RETENTION_DAYS),
+                 "VD_WEEKLY_RETENTION_DAYS": str(2 * MIN_DAILY_RETENTION_DAYS)}
+        )),
+    ]
+    for name, step in steps:
+        metrics[name] = _timed(step)
+        print(f"  {name}: {metrics[name]:.2f}s")
+
+    for name, seconds in _run_workload(db_path, config, repeat).items():
+        metrics[f'query.{name}'] = seconds
+        print(f"  query.{name}: {seconds * 1000:.1f}ms")
+
+    data['db_bytes'] = os.path.getsize(db_path)
+    return {
+        'format': REPORT_FORMAT,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'preset': preset,
+        'config': config.as_dict(),
+        'repeat': repeat,
+        'environment': _environment(),
+        'data': {**data, 'generate_seconds': round(generate_seconds, 3)},
+        'metrics': {name: round(seconds, 6) for name, seconds in metrics.items()},
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD, min_delta: float = DEFAULT_MIN_DELTA) -> list:
+    """
+    Compare the metrics of two reports.
+
+    Returns (metric, baseline seconds, seconds, ratio, regressed) for every metric
+    in both reports. A metric regressed when it is more than ``threshold`` slower
+    and more than ``min_delta`` seconds slower.
+    """
+    if report['config'] != baseline['config']:
+        print("WARNING: baseline was produced with a different synthetic config, timings are not comparable")
+    rows = []
+    for name, seconds in report['metrics'].items():
+        base = baseline['metrics'].get(name)
+        if base is None:
+            continue
+        ratio = seconds / base if base else float('inf')
+        regressed = ratio > 1 + threshold and seconds - base > min_delta
+        rows.append((name, base, seconds, ratio, regressed))
+    return rows
+
+
+def print_comparison(rows: list):
+    print(f"\n  {'metric':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, base, seconds, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {name:<48} {base:>9.3f}s {seconds:>9.3f}s {(ratio - 1) * 100:>+7.1f}%{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preset", choices=sorted(synthetic.PRESETS), default="small")
+    parser.add_argument("--seed", type=int, help="Override the preset's random seed")
+    parser.add_argument("--repeat", type=int, default=5, help="Executions per workload query (median is reported)")
+    parser.add_argument("--output", help="Report path (default: data/benchmarks/reports/<preset>-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown as a fraction of the baseline (default: 0.20)"
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=DEFAULT_MIN_DELTA,
+        help="Ignore slowdowns smaller than this many seconds (default: 0.005)"
+    )
+    args = parser.parse_args()
+
+    overrides = {'seed': args.seed} if args.seed is not None else {}
+    report = run(args.preset, repeat=args.repeat, **overrides)
+
+    output = args.output or os.path.join(
+        BENCHMARKS_DIR, "reports", f"{args.preset}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Report written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(report, json.load(f), args.threshold, args.min_delta)
+        print_comparison(rows)
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f"\n✗ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n✓ No regressions beyond {args.threshold:.0%}")
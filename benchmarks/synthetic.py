@@ -0,0 +1,274 @@
+"""
+Deterministic synthetic crates.io data for benchmarks.
+
+Writes a database dump laid out like an extracted ``db-dump.tar.gz``
+(``data/raw/extracted/<dump>/data/<table>.csv``) plus one version-downloads
+archive per day before the dump window (``data/archives/<YYYY-MM-DD>.csv``,
+same columns as https://static.crates.io/archive/version-downloads/).
+
+The data is shaped like the real thing where it matters for performance:
+crate popularity is Zipfian, newer versions of a crate get most of its
+downloads, a version only appears on days it was downloaded (downloads are
+Poisson around its share of the daily total), and a configurable fraction of
+versions is missing from ``versions.csv`` so their downloads are orphans.
+The same config and seed always produce byte-identical files.
+"""
+
+import os
+import shutil
+from dataclasses import dataclass, asdict, replace
+from datetime import date, timedelta
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    crates: int = 2_000
+    versions_per_crate: int = 5
+    dump_days: int = 30
+    archive_days: int = 30
+    daily_downloads: int = 2_000_000
+    zipf_exponent: float = 1.1
+    orphan_fraction: float = 0.005
+    end_date: date = date(2025, 1, 31)
+    seed: int = 42
+
+    def as_dict(self) -> dict:
+        return {key: str(value) if isinstance(value, date) else value for key, value in asdict(self).items()}
+
+
+# Named sizes for the benchmark harness; override single fields with replace()
+PRESETS = {
+    'small': SyntheticConfig(),
+    'medium': SyntheticConfig(crates=20_000, versions_per_crate=6, dump_days=90, archive_days=90, daily_downloads=20_000_000),
+    'large': SyntheticConfig(crates=100_000, versions_per_crate=8, dump_days=90, archive_days=365, daily_downloads=100_000_000),
+}
+
+DUMP_NAME = "synthetic-dump"
+
+
+def preset(name: str, **overrides) -> SyntheticConfig:
+    return replace(PRESETS[name], **overrides)
+
+
+def _versions(config: SyntheticConfig, rng: np.random.Generator) -> pd.DataFrame:
+    """Every version ever published, with its crate, position in the crate and download weight."""
+    counts = rng.integers(1, 2 * config.versions_per_crate, size=config.crates, endpoint=True)
+    crate_id = np.repeat(np.arange(1, config.crates + 1), counts)
+    # Position within the crate, 0 for the oldest version
+    position = np.arange(len(crate_id)) - np.repeat(np.cumsum(counts) - counts, counts)
+    newest = np.repeat(counts - 1, counts)
+
+    # Zipfian crate popularity split over versions, halving with every newer release that followed
+    crate_weight = np.arange(1, config.crates + 1, dtype=float) ** -config.zipf_exponent
+    weight = crate_weight[crate_id - 1] * 0.5 ** (newest - position)
+    weight /= weight.sum()
+
+    orphan = rng.random(len(crate_id)) < config.orphan_fraction
+    # The newest version is the crate's default one and is never deleted
+    orphan &= position != newest
+    return pd.DataFrame({
+        'id': np.arange(1, len(crate_id) + 1),
+        'crate_id': crate_id,
+        'position': position,
+        'is_default': position == newest,
+        'weight': weight,
+        'orphan': orphan,
+    })
+
+
+def _daily_downloads(config: SyntheticConfig, versions: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    lam = versions['weight'].to_numpy() * config.daily_downloads
+    downloads = rng.poisson(lam)
+    downloaded = downloads > 0
+    return pd.DataFrame({
+        'version_id': versions['id'].to_numpy()[downloaded],
+        'downloads': downloads[downloaded],
+    })
+
+
+def _copy(con, select: str, path: str):
+    con.execute(f"COPY ({select}) TO '{path}' (HEADER)")
+
+
+def _write_dump(con, config: SyntheticConfig, versions: pd.DataFrame, data_dir: str):
+    n_crates = config.crates
+    epoch = "TIMESTAMPTZ '2015-01-01 00:00:00+00'"
+    con.register('versions_df', versions)
+
+    _copy(con, f"""
+        SELECT
+            i AS id,
+            'crate-' || i AS name,
+            {epoch} + to_seconds(i * 3600) AS created_at,
+            {epoch} + to_seconds(i * 3600 + 86400) AS updated_at,
+            'Synthetic crate ' || i || ' for ' || ['async', 'http', 'parser', 'serde', 'cli', 'macro'][i % 6 + 1] AS description,
+            CASE WHEN i % 3 = 0 THEN 'https://docs.rs/crate-' || i END AS documentation,
+            CASE WHEN i % 4 = 0 THEN 'https://example.com/' || i END AS homepage,
+            'https://github.com/synthetic/crate-' || i AS repository,
+            '# crate-' || i AS readme,
+            CASE WHEN i % 10 = 0 THEN 300 END AS max_features,
+            CASE WHEN i % 10 = 0 THEN 20971520 END AS max_upload_size
+        FROM range(1, {n_crates + 1}) t(i)
+    """, os.path.join(data_dir, 'crates.csv'))
+
+    _copy(con, f"""
+        SELECT
+            id,
+            crate_id,
+            '0.' || position || '.0' AS num,
+            '0.' || position || '.0' AS num_no_build,
+            id % 50 = 0 AS yanked,
+            {epoch} + to_seconds(crate_id * 3600 + position * 86400) AS created_at,
+            {epoch} + to_seconds(crate_id * 3600 + position * 86400) AS updated_at,
+            crate_id % 1000 + 1 AS published_by,
+            (weight * 1e12)::BIGINT AS downloads,
+            1000 + id % 100000 AS crate_size,
+            md5(id::VARCHAR) AS checksum,
+            'MIT OR Apache-2.0' AS license,
+            'Synthetic crate ' || crate_id AS description,
+            NULL AS homepage,
+            'https://github.com/synthetic/crate-' || crate_id AS repository,
+            NULL AS documentation,
+            CASE WHEN id % 5 = 0 THEN '1.70.0' END AS rust_version,
+            [2015, 2018, 2021][id % 3 + 1] AS edition,
+            id % 7 <> 0 AS has_lib,
+            '{{}}' AS bin_names,
+            NULL AS links,
+            '{{}}' AS features,
+            '{{}}' AS categories,
+            '{{}}' AS keywords
+        FROM versions_df
+        WHERE NOT orphan
+        ORDER BY id
+    """, os.path.join(data_dir, 'versions.csv'))
+
+    _copy(con, """
+        SELECT crate_id, COUNT(*) AS num_versions, MAX(id) FILTER (WHERE is_default) AS version_id
+        FROM versions_df
+        WHERE NOT orphan
+        GROUP BY crate_id
+        ORDER BY crate_id
+    """, os.path.join(data_dir, 'default_versions.csv'))
+
+    _copy(con, f"""
+        SELECT
+            crate_id,
+            SUM((weight * {config.daily_downloads} * 365)::BIGINT) AS downloads
+        FROM versions_df
+        GROUP BY crate_id
+        ORDER BY crate_id
+    """, os.path.join(data_dir, 'crate_downloads.csv'))
+
+    # Every version depends on up to three earlier (more popular) crates
+    _copy(con, f"""
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY v.id, d.k) AS id,
+            v.id AS version_id,
+            (v.crate_id * (d.k + 7)) % GREATEST(v.crate_id - 1, 1) + 1 AS crate_id,
+            '^' || (d.k + 1) || '.0' AS req,
+            d.k % 3 AS kind,
+            d.k = 2 AS optional,
+            true AS default_features,
+            '{{}}' AS features,
+            NULL AS target,
+            NULL AS explicit_name
+        FROM versions_df v, range(0, 3) d(k)
+        WHERE NOT v.orphan AND v.crate_id > 1 AND (v.id + d.k) % 2 = 0
+        ORDER BY id
+    """, os.path.join(data_dir, 'dependencies.csv'))
+
+    _copy(con, f"""
+        SELECT i AS id, 'category-' || i AS category, 'category-' || i AS slug, 'category-' || i AS path,
+            'Synthetic category ' || i AS description, 0 AS crates_cnt, {epoch} AS created_at
+        FROM range(1, 51) t(i)
+    """, os.path.join(data_dir, 'categories.csv'))
+    _copy(con, f"""
+        SELECT DISTINCT i AS crate_id, (i * k) % 50 + 1 AS category_id
+        FROM range(1, {n_crates + 1}) t(i), range(1, 3) c(k)
+        ORDER BY crate_id, category_id
+    """, os.path.join(data_dir, 'crates_categories.csv'))
+    _copy(con, f"""
+        SELECT i AS id, 'keyword-' || i AS keyword, 0 AS crates_cnt, {epoch} AS created_at
+        FROM range(1, 501) t(i)
+    """, os.path.join(data_dir, 'keywords.csv'))
+    _copy(con, f"""
+        SELECT DISTINCT i AS crate_id, (i * k) % 500 + 1 AS keyword_id
+        FROM range(1, {n_crates + 1}) t(i), range(1, 4) c(k)
+        ORDER BY crate_id, keyword_id
+    """, os.path.join(data_dir, 'crates_keywords.csv'))
+
+    _copy(con, f"""
+        SELECT i AS crate_id, {epoch} + to_seconds(i * 3600) AS created_at, i % 1000 + 1 AS created_by,
+            i % 1000 + 1 AS owner_id, CASE WHEN i % 20 = 0 THEN 1 ELSE 0 END AS owner_kind
+        FROM range(1, {n_crates + 1}) t(i)
+    """, os.path.join(data_dir, 'crate_owners.csv'))
+    _copy(con, """
+        SELECT i AS id, 'user' || i AS gh_login, 'User ' || i AS name,
+            'https://avatars.example.com/' || i AS gh_avatar, 100000 + i AS gh_id
+        FROM range(1, 1001) t(i)
+    """, os.path.join(data_dir, 'users.csv'))
+    _copy(con, """
+        SELECT i AS id, 'github:synthetic:team' || i AS login, 200000 + i AS github_id, 'team' || i AS name,
+            'https://avatars.example.com/t' || i AS avatar, 300000 + i AS org_id
+        FROM range(1, 21) t(i)
+    """, os.path.join(data_dir, 'teams.csv'))
+    _copy(con, "SELECT unnest(['std', 'core', 'alloc', 'proc_macro']) AS name", os.path.join(data_dir, 'reserved_crate_names.csv'))
+    _copy(con, f"SELECT {config.daily_downloads * 365}::BIGINT AS total_downloads", os.path.join(data_dir, 'metadata.csv'))
+
+
+def generate(config: SyntheticConfig, workspace: str) -> dict:
+    """
+    Write a synthetic dump and archives under ``workspace/data``, replacing earlier output.
+
+    Returns row and byte counts of what was written.
+    """
+    rng = np.random.default_rng(config.seed)
+    versions = _versions(config, rng)
+
+    extract_dir = os.path.join(workspace, 'data', 'raw', 'extracted')
+    archive_dir = os.path.join(workspace, 'data', 'archives')
+    for path in (extract_dir, archive_dir):
+        shutil.rmtree(path, ignore_errors=True)
+    data_dir = os.path.join(extract_dir, DUMP_NAME, 'data')
+    os.makedirs(data_dir)
+    os.makedirs(archive_dir)
+
+    con = duckdb.connect()
+    try:
+        _write_dump(con, config, versions, data_dir)
+
+        # Days are drawn oldest first so a date's rows don't depend on the window sizes
+        first_day = config.end_date - timedelta(days=config.dump_days + config.archive_days - 1)
+        dump_days = []
+        download_rows = 0
+        for offset in range(config.dump_days + config.archive_days):
+            day = first_day + timedelta(days=offset)
+            con.register('day_df', _daily_downloads(config, versions, rng))
+            download_rows += con.execute("SELECT COUNT(*) FROM day_df").fetchone()[0]
+            if offset < config.archive_days:
+                _copy(con, "SELECT version_id, downloads FROM day_df", os.path.join(archive_dir, f"{day}.csv"))
+            else:
+                con.execute(f"CREATE OR REPLACE TABLE dump_day_{len(dump_days)} AS SELECT version_id, downloads, DATE '{day}' AS date FROM day_df")
+                dump_days.append(day)
+
+        _copy(
+            con,
+            " UNION ALL ".join(f"SELECT * FROM dump_day_{i}" for i in range(len(dump_days))),
+            os.path.join(data_dir, 'version_downloads.csv')
+        )
+    finally:
+        con.close()
+
+    written = [os.path.join(root, name) for root, _, names in os.walk(os.path.join(workspace, 'data')) for name in names
+               if root.startswith((extract_dir, archive_dir))]
+    return {
+        'versions': len(versions),
+        'orphan_versions': int(versions['orphan'].sum()),
+        'version_download_rows': download_rows,
+        'files': len(written),
+        'bytes': sum(os.path.getsize(path) for path in written),
+    }
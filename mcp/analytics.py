@@ -0,0 +1,322 @@
+"""
+Named, parameterized analytical queries for the MCP servers.
+
+Common questions (downloads of a crate over time, top crates, reverse
+dependencies, per-version breakdown, crate search, crates by keyword and
+category) are answered from the marts with
+hand-tuned SQL that filters before it joins. Each query is PREPAREd once per
+connection and then EXECUTEd with validated, typed arguments, so DuckDB skips
+parsing and planning on repeated calls.
+
+DuckDB does not accept bound parameters inside EXECUTE (``EXECUTE q(?)`` fails
+with "Unexpected prepared parameter. This type of statement can't be prepared!"
+as of DuckDB 1.4), which is why arguments are validated against strict
+types/patterns and rendered as typed literals.
+
+Crate search ranks crates with BM25 over the inverted index in
+``marts.mart_crate_search_postings``. Queries are split into terms with the
+tokenizer that built the index (lowercase, split on anything but [a-z0-9]).
+"""
+
+import re
+from datetime import date
+
+GRANULARITIES = ('day', 'week', 'month', 'quarter', 'year')
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30, 'quarter': 90, 'year': 365}
+# Trailing download windows precomputed in mart_crate_facets
+FACET_PERIODS = ('week', 'month', 'quarter', 'year', 'all')
+MAX_FACET_VALUES = 10
+CRATE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Same split as mart_crate_search_postings
+SEARCH_TOKEN_SPLIT = re.compile(r'[^a-z0-9]+')
+MAX_SEARCH_TERMS = 16
+# BM25 term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+QUERIES = {
+    # Without dates, the window ends at the latest loaded date like top_crates, not today
+    'crate_downloads': """
+        WITH bounds AS (
+            SELECT COALESCE($3, (SELECT MAX(date) FROM marts.mart_crate_downloads_daily)) AS to_date
+        )
+        SELECT
+            date_trunc($4, d.date)::DATE AS period,
+            SUM(d.downloads)::BIGINT AS downloads
+        FROM marts.mart_crate_downloads_daily d
+        WHERE d.crate_id = (SELECT id FROM staging.stg_crates WHERE name = $1)
+          AND d.date BETWEEN COALESCE($2, (SELECT to_date FROM bounds) - 90) AND (SELECT to_date FROM bounds)
+        GROUP BY period
+        ORDER BY period
+    """,
+    'top_crates': """
+        WITH totals AS (
+            SELECT crate_id, SUM(downloads)::BIGINT AS downloads
+            FROM marts.mart_crate_downloads_daily
+            WHERE date > (SELECT MAX(date) FROM marts.mart_crate_downloads_daily) - $1
+            GROUP BY crate_id
+            ORDER BY downloads DESC
+            LIMIT $2
+        )
+        SELECT c.name AS crate, t.downloads
+        FROM totals t
+        JOIN staging.stg_crates c ON c.id = t.crate_id
+        ORDER BY t.downloads DESC
+    """,
+    'reverse_deps': """
+        WITH dependents AS (
+            SELECT dependent_crate_id, req, kind, optional
+            FROM marts.mart_reverse_dependencies
+            WHERE crate_id = (SELECT id FROM staging.stg_crates WHERE name = $1)
+        )
+        SELECT
+            c.name AS dependent,
+            d.req,
+            CASE d.kind WHEN 0 THEN 'normal' WHEN 1 THEN 'build' ELSE 'dev' END AS kind,
+            d.optional,
+            cd.downloads AS dependent_total_downloads
+        FROM dependents d
+        JOIN staging.stg_crates c ON c.id = d.dependent_crate_id
+        LEFT JOIN staging.stg_crate_downloads cd ON cd.crate_id = d.dependent_crate_id
+        ORDER BY dependent_total_downloads DESC NULLS LAST
+        LIMIT $2
+    """,
+    'version_breakdown': """
+        WITH crate_versions AS (
+            SELECT id, num, yanked, created_at
+            FROM staging.stg_versions
+            WHERE crate_id = (SELECT id FROM staging.stg_crates WHERE name = $1)
+        ),
+        recent AS (
+            SELECT version_id, SUM(downloads)::BIGINT AS downloads
+            FROM staging.stg_version_downloads_all
+            WHERE date > (SELECT MAX(date) FROM marts.mart_crate_downloads_daily) - $2
+              AND version_id IN (SELECT id FROM crate_versions)
+            GROUP BY version_id
+        )
+        SELECT
+            cv.num AS version,
+            cv.yanked,
+            cv.created_at,
+            COALESCE(r.downloads, 0) AS downloads
+        FROM crate_versions cv
+        LEFT JOIN recent r ON r.version_id = cv.id
+        ORDER BY downloads DESC, cv.created_at DESC
+    """,
+    # Facets are sorted arrays on one row per crate, so any combination is one scan without joins
+    'filter_crates': """
+        WITH matches AS (
+            SELECT
+                name,
+                categories,
+                keywords,
+                CASE $4
+                    WHEN 'week' THEN downloads_7d
+                    WHEN 'month' THEN downloads_30d
+                    WHEN 'quarter' THEN downloads_90d
+                    WHEN 'year' THEN downloads_365d
+                    ELSE downloads
+                END AS period_downloads,
+                downloads
+            FROM marts.mart_crate_facets
+            WHERE list_has_all(categories, $1) AND list_has_all(keywords, $2)
+        )
+        SELECT
+            name AS crate,
+            period_downloads,
+            downloads,
+            array_to_string(categories, ', ') AS categories,
+            array_to_string(keywords, ', ') AS keywords
+        FROM matches
+        WHERE period_downloads >= $3
+        ORDER BY period_downloads DESC, downloads DESC
+        LIMIT $5
+    """,
+    # Crates matching more of the terms first, then by BM25 score; only the top
+    # $2 are joined with the documents for display
+    'search_crates': f"""
+        WITH matches AS (
+            SELECT term, crate_id, tf, doc_length
+            FROM marts.mart_crate_search_postings
+            WHERE term IN (SELECT unnest($1::VARCHAR[]))
+        ),
+        corpus AS (
+            SELECT COUNT(*) AS documents, AVG(doc_length) AS avg_length
+            FROM marts.mart_crate_search_documents
+        ),
+        term_weights AS (
+            SELECT m.term, ln(1 + (c.documents - COUNT(*) + 0.5) / (COUNT(*) + 0.5)) AS idf
+            FROM matches m, corpus c
+            GROUP BY m.term, c.documents
+        ),
+        scores AS (
+            SELECT
+                m.crate_id,
+                SUM(
+                    w.idf * m.tf * ({BM25_K1} + 1)
+                    / (m.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * m.doc_length / c.avg_length))
+                ) AS score,
+                COUNT(*) AS matched_terms
+            FROM matches m
+            JOIN term_weights w USING (term)
+            CROSS JOIN corpus c
+            GROUP BY m.crate_id
+            ORDER BY matched_terms DESC, score DESC
+            LIMIT $2
+        )
+        SELECT
+            d.name AS crate,
+            round(s.score, 3) AS score,
+            d.description,
+            array_to_string(d.keywords, ', ') AS keywords,
+            array_to_string(d.categories, ', ') AS categories,
+            d.downloads,
+            d.recent_downloads AS downloads_90d
+        FROM scores s
+        JOIN marts.mart_crate_search_documents d ON d.crate_id = s.crate_id
+        ORDER BY s.matched_terms DESC, s.score DESC, d.downloads DESC
+    """,
+}
+
+
+def _crate_name(value: str) -> str:
+    if not isinstance(value, str) or not CRATE_NAME_PATTERN.match(value):
+        raise ValueError(f"Invalid crate name: {value!r}")
+    return f"'{value}'"
+
+
+def _date(value) -> str:
+    if value is None:
+        return "NULL::DATE"
+    try:
+        parsed = value if isinstance(value, date) else date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid date (expected YYYY-MM-DD): {value!r}")
+    return f"DATE '{parsed.isoformat()}'"
+
+
+def _positive_int(value, maximum: int) -> str:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Expected an integer, got {value!r}")
+    if not 1 <= number <= maximum:
+        raise ValueError(f"Expected an integer between 1 and {maximum}, got {number}")
+    return str(number)
+
+
+def search_terms(query: str) -> list[str]:
+    """Distinct index terms of a search query, in query order."""
+    if not isinstance(query, str):
+        raise ValueError(f"Expected a search query, got {query!r}")
+    terms = list(dict.fromkeys(term for term in SEARCH_TOKEN_SPLIT.split(query.lower()) if 0 < len(term) <= 64))
+    if not terms:
+        raise ValueError(f"Search query has no searchable terms (letters or digits): {query!r}")
+    if len(terms) > MAX_SEARCH_TERMS:
+        raise ValueError(f"Search query has {len(terms)} terms, at most {MAX_SEARCH_TERMS} are allowed")
+    return terms
+
+
+def _terms(terms: list[str]) -> str:
+    # Terms only contain [a-z0-9], so they can be inlined as string literals
+    return f"[{', '.join(f"'{term}'" for term in terms)}]::VARCHAR[]"
+
+
+def _strings(values, what: str) -> str:
+    """Keywords or category names as a VARCHAR[] literal; a single string is one value."""
+    if values is None:
+        values = []
+    elif isinstance(values, str):
+        values = [values]
+    if not isinstance(values, (list, tuple)) or not all(isinstance(value, str) and 0 < len(value) <= 100 for value in values):
+        raise ValueError(f"Expected a list of {what}, got {values!r}")
+    if len(values) > MAX_FACET_VALUES:
+        raise ValueError(f"At most {MAX_FACET_VALUES} {what} are allowed, got {len(values)}")
+    literals = ', '.join("'" + value.replace("'", "''") + "'" for value in values)
+    return f"[{literals}]::VARCHAR[]"
+
+
+def _non_negative_int(value) -> str:
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Expected an integer, got {value!r}")
+    if number < 0:
+        raise ValueError(f"Expected a non-negative integer, got {number}")
+    return str(number)
+
+
+def _choice(value: str, choices) -> str:
+    if value not in choices:
+        raise ValueError(f"Expected one of {', '.join(choices)}, got {value!r}")
+    return f"'{value}'"
+
+
+class AnalyticsQueries:
+    """Runs the named queries on pooled read-only connections, preparing each one once per connection."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @staticmethod
+    def _prepare(pooled, name: str):
+        if name not in pooled.prepared:
+            pooled.conn.execute(f"PREPARE {name} AS {QUERIES[name]}")
+            pooled.prepared.add(name)
+
+    def _execute(self, name: str, arguments: list[str]):
+        with self.pool.connection() as pooled:
+            self._prepare(pooled, name)
+            return pooled.conn.execute(f"EXECUTE {name}({', '.join(arguments)})").fetchdf()
+
+    def prepare_all(self, pooled) -> list[str]:
+        """PREPARE every named query on a pooled connection. Returns the names whose tables are missing."""
+        import duckdb
+
+        missing = []
+        for name in QUERIES:
+            try:
+                self._prepare(pooled, name)
+            except duckdb.CatalogException:
+                missing.append(name)
+        return missing
+
+    def crate_downloads(self, name: str, from_date=None, to_date=None, granularity: str = 'month'):
+        """
+        Downloads of one crate between two dates, bucketed by granularity. By default
+        the window ends at the latest loaded date and starts 90 days before the end.
+        """
+        return self._execute('crate_downloads', [
+            _crate_name(name), _date(from_date), _date(to_date), _choice(granularity, GRANULARITIES)
+        ])
+
+    def top_crates(self, period: str = 'month', n: int = 20):
+        """Most downloaded crates over the trailing period, ending at the latest loaded date."""
+        _choice(period, PERIOD_DAYS)
+        return self._execute('top_crates', [str(PERIOD_DAYS[period]), _positive_int(n, 1000)])
+
+    def reverse_deps(self, name: str, n: int = 50):
+        """Crates whose default version depends on the given crate, most downloaded first."""
+        return self._execute('reverse_deps', [_crate_name(name), _positive_int(n, 1000)])
+
+    def version_breakdown(self, name: str, days: int = 90):
+        """Downloads per version of a crate over the trailing number of days."""
+        return self._execute('version_breakdown', [_crate_name(name), _positive_int(days, 36500)])
+
+    def filter_crates(
+        self,
+        categories: list = None,
+        keywords: list = None,
+        min_downloads: int = 0,
+        period: str = 'month',
+        n: int = 50
+    ):
+        """Crates in every given category and with every given keyword, most downloaded over the period first."""
+        return self._execute('filter_crates', [
+            _strings(categories, 'categories'), _strings(keywords, 'keywords'), _non_negative_int(min_downloads),
+            _choice(period, FACET_PERIODS), _positive_int(n, 1000)
+        ])
+
+    def search_crates(self, query: str, n: int = 20):
+        """Crates ranked by BM25 relevance to a free-text query over name, description, keywords and categories."""
+        return self._execute('search_crates', [_terms(search_terms(query)), _positive_int(n, 100)])
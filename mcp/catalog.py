@@ -0,0 +1,196 @@
+"""
+In-memory catalog of the warehouse for the MCP servers.
+
+The snapshot combines the dbt model and snapshot YAML (descriptions, tests, relationships)
+with what DuckDB reports about the physical tables (``duckdb_columns()``,
+``duckdb_tables()`` row estimates, fact-table date range). Tables that dbt doesn't
+manage, such as the version downloads rollups, are described by their DuckDB
+comments. It is built once and only rebuilt when a model YAML file or the
+database file changes.
+"""
+
+import json
+import os
+import threading
+
+CATALOG_SCHEMAS = ('raw', 'staging', 'marts', 'snapshots')
+FACT_TABLE = 'staging.stg_version_downloads'
+# Daily rows plus the rollups of compacted days, see scripts/compact_version_downloads.py
+HISTORY_VIEW = 'staging.stg_version_downloads_all'
+
+
+def _column_tests(column: dict) -> list[str]:
+    """Flatten dbt test definitions into short labels, e.g. ``relationships -> stg_versions.id``."""
+    labels = []
+    for test in column.get('tests', column.get('data_tests', [])) or []:
+        if isinstance(test, str):
+            labels.append(test)
+            continue
+        for test_name, test_config in test.items():
+            test_config = test_config or {}
+            if test_name == 'relationships':
+                target = str(test_config.get('to', '')).replace("ref('", '').replace("')", '')
+                labels.append(f"relationships -> {target}.{test_config.get('field')}")
+            else:
+                labels.append(test_name)
+    return labels
+
+
+class Catalog:
+    """Cached schema snapshot, refreshed when model YAML or the DuckDB file changes."""
+
+    def __init__(self, pool, models_path: str, snapshots_path: str = None):
+        self.pool = pool
+        self.models_path = models_path
+        self.snapshots_path = snapshots_path
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._snapshot = None
+        self._text = None
+        self._json = None
+
+    def _yaml_files(self) -> list[str]:
+        files = []
+        for path in (self.models_path, self.snapshots_path):
+            for root, _, names in os.walk(path) if path else ():
+                files.extend(os.path.join(root, name) for name in names if name.endswith('.yml'))
+        return sorted(files)
+
+    def _current_fingerprint(self) -> tuple:
+        paths = self._yaml_files() + [self.pool.duckdb_path]
+        return tuple((path, os.stat(path).st_mtime_ns) for path in paths if os.path.exists(path))
+
+    def _load_models(self) -> dict:
+        # Only needed when the catalog is built, not to start the servers
+        import yaml
+
+        models = {}
+        for path in self._yaml_files():
+            with open(path, 'r') as f:
+                document = yaml.safe_load(f) or {}
+            for model in document.get('models', []) + document.get('snapshots', []):
+                models[model['name']] = {
+                    'description': ' '.join(str(model.get('description', '')).split()),
+                    'columns': {
+                        column['name']: {
+                            'description': ' '.join(str(column.get('description', '')).split()),
+                            'tests': _column_tests(column),
+                        }
+                        for column in model.get('columns', [])
+                    },
+                }
+        return models
+
+    def _build(self) -> dict:
+        models = self._load_models()
+        schemas = ", ".join(f"'{schema}'" for schema in CATALOG_SCHEMAS)
+
+        with self.pool.connection() as pooled:
+            conn = pooled.conn
+            tables = conn.execute(f"""
+                SELECT schema_name, table_name, estimated_size, comment
+                FROM duckdb_tables()
+                WHERE schema_name IN ({schemas})
+                UNION ALL
+                SELECT schema_name, view_name, NULL, comment
+                FROM duckdb_views()
+                WHERE schema_name IN ({schemas})
+                ORDER BY 1, 2
+            """).fetchall()
+            columns = conn.execute(f"""
+                SELECT schema_name, table_name, column_name, data_type, comment
+                FROM duckdb_columns()
+                WHERE schema_name IN ({schemas})
+                ORDER BY schema_name, table_name, column_index
+            """).fetchall()
+            names = {f"{schema}.{table}" for schema, table, _, _ in tables}
+            date_range = (None, None)
+            if FACT_TABLE in names:
+                date_range = conn.execute(f"SELECT MIN(date), MAX(date) FROM {FACT_TABLE}").fetchone()
+            history_from = None
+            if HISTORY_VIEW in names:
+                history_from = conn.execute(f"SELECT MIN(first_date) FROM {HISTORY_VIEW}").fetchone()[0]
+
+        snapshot = {'tables': {}, 'fact_table': {
+            'name': FACT_TABLE, 'min_date': date_range[0], 'max_date': date_range[1],
+            'history_view': HISTORY_VIEW if HISTORY_VIEW in names else None, 'history_min_date': history_from,
+        }}
+        for schema, table, rows, comment in tables:
+            model = models.get(table, {})
+            snapshot['tables'][f"{schema}.{table}"] = {
+                'rows': rows,
+                'description': model.get('description') or comment or '',
+                'columns': {},
+            }
+        for schema, table, column, data_type, comment in columns:
+            model_column = models.get(table, {}).get('columns', {}).get(column, {})
+            snapshot['tables'][f"{schema}.{table}"]['columns'][column] = {
+                'type': data_type,
+                'description': model_column.get('description') or comment or '',
+                'tests': model_column.get('tests', []),
+            }
+        return snapshot
+
+    @staticmethod
+    def _render_text(snapshot: dict) -> str:
+        fact = snapshot['fact_table']
+        lines = [f"Fact table {fact['name']} covers {fact['min_date']} to {fact['max_date']}."]
+        history_from, daily_from = fact['history_min_date'], fact['min_date']
+        if fact['history_view'] and history_from and daily_from and history_from < daily_from:
+            lines.append(
+                f"Older days are compacted into weekly/monthly rollups: {fact['history_view']} covers "
+                f"{history_from} to {fact['max_date']}."
+            )
+        lines.append("")
+        for name, table in snapshot['tables'].items():
+            if name.startswith('raw.'):
+                continue
+            rows = f"~{table['rows']:,} rows" if table['rows'] is not None else "view"
+            lines.append(f"## {name} ({rows})")
+            if table['description']:
+                lines.append(table['description'])
+            for column_name, column in table['columns'].items():
+                line = f"- {column_name} {column['type']}"
+                if column['description']:
+                    line += f": {column['description']}"
+                if column['tests']:
+                    line += f" [{', '.join(column['tests'])}]"
+                lines.append(line)
+            lines.append("")
+        return "\n".join(lines)
+
+    def _refresh(self):
+        fingerprint = self._current_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            snapshot = self._build()
+            self._text = self._render_text(snapshot)
+            self._json = json.dumps(snapshot, separators=(',', ':'), default=str)
+            self._snapshot = snapshot
+            self._fingerprint = fingerprint
+
+    def snapshot(self) -> dict:
+        self._refresh()
+        return self._snapshot
+
+    def as_text(self) -> str:
+        """Markdown-ish description of staging/marts/snapshots tables, columns, tests and relationships."""
+        self._refresh()
+        return self._text
+
+    def as_json(self) -> str:
+        """Compact JSON of the whole snapshot, including raw tables."""
+        self._refresh()
+        return self._json
+
+    def tables_markdown(self) -> str:
+        """Table listing with row estimates and column counts, as returned by ``list_tables``."""
+        rows = ["| table_schema | table_name | rows | columns |", "|:--|:--|--:|--:|"]
+        for name, table in self.snapshot()['tables'].items():
+            schema, table_name = name.split('.', 1)
+            estimated_rows = f"{table['rows']:,}" if table['rows'] is not None else "view"
+            rows.append(f"| {schema} | {table_name} | {estimated_rows} | {len(table['columns'])} |")
+        return "\n".join(rows)
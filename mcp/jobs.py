@@ -0,0 +1,205 @@
+"""
+Background query jobs for analytics that outlive an MCP request timeout.
+
+``submit`` validates the query with the same read-only/cost pre-flight as
+``query_duckdb``, then runs it on a dedicated connection pool and spills the
+full result to Parquet under ``data/mcp_jobs/``. Job state is written next to
+the result as JSON, so any server process (see ``--workers``) can report the
+status of a job and page through its result. Progress comes from DuckDB's
+``query_progress()`` while the owning process is running the job. A queued or
+running job whose owning process is gone, or that outlived the job timeout, is
+marked failed when its state is next read. Finished jobs and their files are
+removed after a TTL.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from query_guard import ensure_read_only, explain, MAX_ESTIMATED_ROWS, QueryRejected
+
+JOB_WORKERS = int(os.environ.get("MCP_JOB_WORKERS", 2))
+JOB_TIMEOUT_SECONDS = float(os.environ.get("MCP_JOB_TIMEOUT_SECONDS", 3600))
+JOB_TTL_SECONDS = float(os.environ.get("MCP_JOB_TTL_SECONDS", 24 * 3600))
+FETCH_MAX_ROWS = 1000
+# Slack over the job timeout before a job still marked running is considered abandoned
+STALE_GRACE_SECONDS = 300
+# Owner of the jobs submitted by this process, pids alone are reused
+PROCESS_ID = uuid.uuid4().hex
+
+
+def _process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) would send CTRL_C_EVENT there; rely on the timeout check
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    """In-process job queue whose state and results live on disk."""
+
+    def __init__(self, pool, job_pool, results_dir: str, ttl_seconds: float = JOB_TTL_SECONDS):
+        # ``pool`` serves the quick pre-flight and fetch calls, ``job_pool`` runs the jobs themselves
+        self.pool = pool
+        self.job_pool = job_pool
+        self.results_dir = results_dir
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="mcp-job")
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def _result_path(self, job_id: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}.parquet")
+
+    def _write_state(self, job: dict):
+        tmp_path = self._state_path(job['id']) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, self._state_path(job['id']))
+
+    def _read_state(self, job_id: str) -> dict:
+        if not job_id.isalnum() or not os.path.exists(self._state_path(job_id)):
+            raise ValueError(f"Unknown or expired job: {job_id}")
+        with open(self._state_path(job_id)) as f:
+            job = json.load(f)
+        if job['status'] in ('queued', 'running'):
+            reason = self._abandoned(job)
+            if reason:
+                tmp_path = self._result_path(job_id) + '.tmp'
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                job.update(status='failed', error=reason, finished_at=time.time())
+                self._write_state(job)
+        return job
+
+    @staticmethod
+    def _abandoned(job: dict):
+        """Why an unfinished job can no longer finish, or None while it still can."""
+        if job.get('owner') == PROCESS_ID:
+            return None
+        pid = job.get('pid')
+        # The same pid with another owner is a restarted server, e.g. PID 1 in a container
+        if pid == os.getpid() or (pid is not None and not _process_alive(pid)):
+            return f"The server process running the job ({pid}) exited before it finished"
+        if job['status'] == 'running' and time.time() - job['started_at'] > JOB_TIMEOUT_SECONDS + STALE_GRACE_SECONDS:
+            return f"The job did not finish within the time limit of {JOB_TIMEOUT_SECONDS:.0f}s"
+        return None
+
+    def cleanup(self):
+        """Fail abandoned jobs and delete state and result files of jobs that finished more than ``ttl_seconds`` ago."""
+        if not os.path.isdir(self.results_dir):
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.results_dir):
+            if not name.endswith('.json'):
+                continue
+            job_id = name[:-len('.json')]
+            try:
+                job = self._read_state(job_id)
+            except (ValueError, json.JSONDecodeError):
+                continue
+            if job.get('finished_at') and job['finished_at'] < cutoff:
+                for path in (self._state_path(job_id), self._result_path(job_id)):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def _run(self, job: dict):
+        job.update(status='running', started_at=time.time())
+        self._write_state(job)
+        result_path = self._result_path(job['id'])
+        tmp_path = result_path + '.tmp'
+
+        try:
+            with self.job_pool.connection(timeout=JOB_TIMEOUT_SECONDS) as pooled:
+                conn = pooled.conn
+                conn.execute("SET enable_progress_bar = true")
+                conn.execute("SET enable_progress_bar_print = false")
+                with self._lock:
+                    self._running[job['id']] = conn
+                try:
+                    conn.execute(f"COPY (\n{job['sql']}\n) TO '{tmp_path}' (FORMAT parquet, COMPRESSION zstd)")
+                    job['rows'] = conn.execute("SELECT COUNT(*) FROM read_parquet(?)", [tmp_path]).fetchone()[0]
+                finally:
+                    with self._lock:
+                        self._running.pop(job['id'], None)
+            os.replace(tmp_path, result_path)
+            job.update(status='done', bytes=os.path.getsize(result_path))
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            job.update(status='failed', error=str(e))
+        finally:
+            job['finished_at'] = time.time()
+            self._write_state(job)
+
+    def submit(self, sql: str) -> dict:
+        """Validate and queue a query; returns the initial job state."""
+        self.cleanup()
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        with self.pool.connection() as pooled:
+            sql = ensure_read_only(pooled.conn, sql)
+            plan = explain(pooled.conn, sql)
+        if plan.peak_operator_rows > MAX_ESTIMATED_ROWS:
+            raise QueryRejected(
+                f"Query rejected even for background execution: {plan.describe()}. "
+                "Add join conditions or filters before joining."
+            )
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'sql': sql,
+            'status': 'queued',
+            'owner': PROCESS_ID,
+            'pid': os.getpid(),
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'estimated_rows': plan.estimated_rows,
+            'rows': None,
+            'bytes': None,
+            'error': None,
+        }
+        self._write_state(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def status(self, job_id: str) -> dict:
+        """Current job state, with live progress (0-100) when this process is running it."""
+        job = self._read_state(job_id)
+        with self._lock:
+            conn = self._running.get(job_id)
+        if conn is not None:
+            progress = conn.query_progress()
+            job['progress'] = round(progress, 1) if progress >= 0 else None
+        elif job['status'] == 'done':
+            job['progress'] = 100.0
+        started = job['started_at'] or job['submitted_at']
+        job['elapsed_seconds'] = round((job['finished_at'] or time.time()) - started, 1)
+        return job
+
+    def fetch(self, job_id: str, offset: int = 0, limit: int = 100):
+        """Page through a finished job's result. Returns (job state, DataFrame)."""
+        job = self._read_state(job_id)
+        if job['status'] != 'done':
+            raise ValueError(f"Job {job_id} is {job['status']}" + (f": {job['error']}" if job['error'] else ""))
+
+        limit = max(1, min(int(limit), FETCH_MAX_ROWS))
+        offset = max(0, int(offset))
+        with self.pool.connection() as pooled:
+            result = pooled.conn.execute(
+                "SELECT * FROM read_parquet(?) LIMIT ? OFFSET ?",
+                [self._result_path(job_id), limit, offset]
+            ).fetchdf()
+        return job, result
@@ -1,134 +1,136 @@
-import logging
+import argparse
+import asyncio
 import os
-import duckdb
-from typing import Any
 from mcp.server.fastmcp import FastMCP
 from mcp.types import TextContent, GetPromptResult, PromptMessage
 
+import server_core
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'output.log'),
-    format='%(pathname)s - %(message)s'
-)
+# Set by the launcher below before uvicorn spawns workers; each worker re-imports this
+# module, so the server must be stateless when sessions can land on different processes
+WORKERS = int(os.environ.get("MCP_HTTP_WORKERS", 1))
 
-def get_crates_duckdb_path():
-    project_root_directory = os.path.dirname(os.path.dirname(__file__))
-    data_folder = "data"
-    duckdb_instance = "crates.duckdb"
+mcp = FastMCP("duckdb_crates_server", stateless_http=WORKERS > 1)
 
-    full_duckdb_path_instance = os.path.join(project_root_directory, data_folder, duckdb_instance)
 
-    return full_duckdb_path_instance
-
-mcp = FastMCP("duckdb_crates_server")
-
-@mcp.tool()
-async def list_tables():
-    """List all tables in the staging schema"""
-    crates_duckdb_path = get_crates_duckdb_path()
-    conn = duckdb.connect(crates_duckdb_path, read_only=True)
-
-    result = conn.execute("""
-        SELECT table_schema, table_name
-        FROM information_schema.tables t
-        LEFT JOIN (
-            SELECT table_schema, table_name
-            FROM information_schema.columns
-            GROUP BY table_schema, table_name
-        ) cols USING (table_schema, table_name)
-        WHERE table_schema IN ('raw', 'staging', 'marts')
-        GROUP BY table_schema, table_name
-        ORDER BY table_schema, table_name
-    """).fetchdf()
-    
+async def _call(name: str, **arguments):
+    # DuckDB calls block, run them off the event loop so requests can overlap
+    text = await asyncio.to_thread(server_core.call_tool, name, arguments)
     return [TextContent(
         type="text",
-        text=f"Available tables:\n\n{result.to_markdown(index=False)}"
+        text=text
     )]
 
-@mcp.tool()
+@mcp.tool(description=server_core.TOOLS["list_tables"]["description"])
+async def list_tables():
+    return await _call("list_tables")
+
+@mcp.tool(description=server_core.TOOLS["query_duckdb"]["description"])
 async def query_duckdb(sql: str):
-    """Execute a read-only SQL query against the crates.io DuckDB database"""
-    # Safety check
-    if not sql.strip().upper().startswith('SELECT'):
-        return [TextContent(
-            type="text",
-            text="Error: Only SELECT queries are allowed"
-        )]
-    
-    crates_duckdb_path = get_crates_duckdb_path()
-    conn = duckdb.connect(crates_duckdb_path, read_only=True)
-
-    result = conn.execute(sql).fetchdf()
-    
-    return [TextContent(
-        type="text",
-        text=f"{result.to_markdown(index=False)}"
-    )]
+    return await _call("query_duckdb", sql=sql)
 
+@mcp.tool(description=server_core.TOOLS["crate_downloads"]["description"])
+async def crate_downloads(name: str, from_date: str = None, to_date: str = None, granularity: str = "month"):
+    return await _call("crate_downloads", name=name, from_date=from_date, to_date=to_date, granularity=granularity)
 
-@mcp.resource("schema://staging/tables")
-async def get_available_dbt_models():
-    """Column definitions and relationships for all staging tables"""
-    
-    project_root = os.path.dirname(os.path.dirname(__file__))
-    schema_path = os.path.join(project_root, "transformations", "models", "staging")
-    
-    # Read all .yml files in staging folder
-    schema_content = []
-    for yml_file in os.listdir(schema_path):
-        if yml_file.endswith('.yml'):
-            with open(os.path.join(schema_path, yml_file), 'r') as f:
-                schema_content.append(f"# {yml_file}\n{f.read()}\n")
-    
-    return "\n".join(schema_content)
-
-@mcp.prompt()
-async def setup_crates_analytics_context():
-    """Load context about the Rust Crates Analytics project"""
-    return GetPromptResult(
-            messages=[
-                PromptMessage(
-                    role="user",
-                    content=TextContent(
-                        type="text",
-                        text="""You are exploring the Rust Crates Analytics data warehouse.
+@mcp.tool(description=server_core.TOOLS["top_crates"]["description"])
+async def top_crates(period: str = "month", n: int = 20):
+    return await _call("top_crates", period=period, n=n)
 
-**Available Data:**
-- Staging schema contains cleaned, validated data from crates.io
-- Date range: figure out from the query_duckdb tool, please
-- You can expect around ~200k crates, ~1.75M versions, billions of download records
+@mcp.tool(description=server_core.TOOLS["reverse_deps"]["description"])
+async def reverse_deps(name: str, n: int = 50):
+    return await _call("reverse_deps", name=name, n=n)
 
-**Key Tables:**
-- stg_crates: Rust packages
-- stg_versions: Specific releases
-- stg_version_downloads: Download history (fact table)
-- stg_dependencies: Version dependencies
-- stg_categories, stg_keywords: Metadata
+@mcp.tool(description=server_core.TOOLS["version_breakdown"]["description"])
+async def version_breakdown(name: str, days: int = 90):
+    return await _call("version_breakdown", name=name, days=days)
 
-**Available Tools:**
-- query_duckdb: Run SELECT queries
-- list_tables: See available tables
+@mcp.tool(description=server_core.TOOLS["search_crates"]["description"])
+async def search_crates(query: str, n: int = 20):
+    return await _call("search_crates", query=query, n=n)
 
-**Available Resources:**
-- schema://staging/tables: Full schema definitions
+@mcp.tool(description=server_core.TOOLS["filter_crates"]["description"])
+async def filter_crates(
+    categories: list[str] = None,
+    keywords: list[str] = None,
+    min_downloads: int = 0,
+    period: str = "month",
+    n: int = 50
+):
+    return await _call(
+        "filter_crates", categories=categories, keywords=keywords, min_downloads=min_downloads, period=period, n=n
+    )
 
-**Setup:**
-Please load the context using the Resources for schema to let you know of columns, types, data quality tests, relationships.
-That way, you already know about the Rust Crates DWH structure and you'll know how to create queries.
+@mcp.tool(description=server_core.TOOLS["submit_query"]["description"])
+async def submit_query(sql: str):
+    return await _call("submit_query", sql=sql)
 
-Know that you can only create SELECT queries, don't try creating any other queries like DESCRIBE, INSERT, etc.
+@mcp.tool(description=server_core.TOOLS["query_status"]["description"])
+async def query_status(job_id: str):
+    return await _call("query_status", job_id=job_id)
 
-DO NOT FORGET TO USE staging. schema for the tables that you get enlisted, please
+@mcp.tool(description=server_core.TOOLS["fetch_result"]["description"])
+async def fetch_result(job_id: str, offset: int = 0, limit: int = 100):
+    return await _call("fetch_result", job_id=job_id, offset=offset, limit=limit)
 
-**Your Task:**
-Help analyze the Rust ecosystem. Suggest interesting questions to explore, write efficient queries, and explain findings in context."""
+
+def _register_resource(uri: str, resource: dict):
+    async def read():
+        return await asyncio.to_thread(server_core.read_resource, uri)
+
+    mcp.resource(uri, name=resource["name"], description=resource["description"], mime_type=resource["mime_type"])(read)
+
+for uri, resource in server_core.RESOURCES.items():
+    _register_resource(uri, resource)
+
+
+@mcp.prompt(name=server_core.PROMPT_NAME, description=server_core.PROMPT_DESCRIPTION)
+async def setup_crates_analytics_context():
+    return GetPromptResult(
+            messages=[
+                PromptMessage(
+                    role="user",
+                    content=TextContent(
+                        type="text",
+                        text=server_core.PROMPT_TEXT
                     )
                 )
             ]
         )
 
 
+def create_app():
+    """ASGI app factory, imported by name in each uvicorn worker process."""
+    server_core.prewarm()
+    return mcp.streamable_http_app()
+
+
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="Number of server processes sharing the read-only database (sessions become stateless when > 1)"
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        import uvicorn
+
+        os.environ["MCP_HTTP_WORKERS"] = str(args.workers)
+        uvicorn.run(
+            "mcp_duckdb_http:create_app",
+            factory=True,
+            app_dir=os.path.dirname(os.path.abspath(__file__)),
+            host=args.host,
+            port=args.port,
+            workers=args.workers
+        )
+    else:
+        mcp.settings.host = args.host
+        mcp.settings.port = args.port
+        server_core.prewarm()
+        mcp.run(transport="streamable-http")
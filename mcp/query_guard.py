@@ -0,0 +1,142 @@
+"""
+Pre-flight checks for agent-submitted SQL.
+
+Every query goes through two steps before it is executed:
+
+1. DuckDB's own parser (``json_serialize_sql``) confirms the text is a single
+   read-only SELECT statement, so CTEs (``WITH ... SELECT``) pass while
+   INSERT/UPDATE/COPY/ATTACH and multi-statement payloads are refused.
+2. ``EXPLAIN (FORMAT JSON)`` gives the optimizer's cardinality estimates and the
+   scanned tables. Plans whose largest operator exceeds the cost budget are
+   rejected; plans returning more rows than the result budget get an automatic
+   LIMIT.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+
+# Largest estimated row count any single operator may produce (cross joins blow past this)
+MAX_ESTIMATED_ROWS = int(os.environ.get("MCP_MAX_ESTIMATED_ROWS", 10_000_000_000))
+# Queries estimated to return more rows than this are wrapped in a LIMIT
+MAX_RESULT_ROWS = int(os.environ.get("MCP_MAX_RESULT_ROWS", 10_000))
+
+
+class QueryRejected(Exception):
+    """Raised when a query fails the read-only check or exceeds the cost budget."""
+
+
+@dataclass
+class QueryPlan:
+    """Outcome of the pre-flight step for a single query."""
+    sql: str
+    estimated_rows: int
+    peak_operator_rows: int
+    scanned_tables: dict[str, int] = field(default_factory=dict)
+    limited: bool = False
+
+    def describe(self) -> str:
+        tables = ", ".join(f"{name} (~{rows:,} rows)" for name, rows in self.scanned_tables.items())
+        notes = [
+            f"estimated result rows: ~{self.estimated_rows:,}",
+            f"largest intermediate result: ~{self.peak_operator_rows:,} rows",
+            f"scanned tables: {tables or 'none'}",
+        ]
+        if self.limited:
+            notes.append(f"result truncated to {MAX_RESULT_ROWS:,} rows (add your own LIMIT or aggregate further)")
+        return "; ".join(notes)
+
+
+def ensure_read_only(conn, sql: str) -> str:
+    """
+    Parse the statement with DuckDB and make sure it is a single SELECT.
+
+    Returns:
+        The statement without trailing semicolons, ready to be wrapped or explained
+    """
+    serialized = json.loads(conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+
+    if serialized.get("error"):
+        message = serialized.get("error_message", "unable to parse query")
+        if "Only SELECT" in message:
+            message = "Only read-only SELECT queries (including WITH ... SELECT) are allowed"
+        raise QueryRejected(message)
+
+    if len(serialized.get("statements", [])) != 1:
+        raise QueryRejected("Exactly one SELECT statement per call is allowed")
+
+    return sql.strip().rstrip(";").strip()
+
+
+def _node_rows(node: dict) -> int:
+    """Optimizer estimate for a plan node, derived from its children when DuckDB omits it."""
+    extra_info = node.get("extra_info") or {}
+    estimate = extra_info.get("Estimated Cardinality") if isinstance(extra_info, dict) else None
+    if estimate is not None:
+        return int(estimate)
+
+    child_rows = [_node_rows(child) for child in node.get("children", [])]
+    if not child_rows:
+        return 0
+    if node.get("name", "").strip() == "CROSS_PRODUCT":
+        product = 1
+        for rows in child_rows:
+            product *= max(rows, 1)
+        return product
+    return max(child_rows)
+
+
+def _walk(node: dict, plan: QueryPlan):
+    rows = _node_rows(node)
+    plan.peak_operator_rows = max(plan.peak_operator_rows, rows)
+
+    extra_info = node.get("extra_info") or {}
+    if isinstance(extra_info, dict) and "Table" in extra_info:
+        table = extra_info["Table"]
+        plan.scanned_tables[table] = max(plan.scanned_tables.get(table, 0), rows)
+
+    for child in node.get("children", []):
+        _walk(child, plan)
+
+
+def explain(conn, sql: str) -> QueryPlan:
+    """Run EXPLAIN and collect cardinality estimates and scanned tables."""
+    rows = conn.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()
+    roots = json.loads(rows[0][1])
+
+    plan = QueryPlan(sql=sql, estimated_rows=sum(_node_rows(root) for root in roots), peak_operator_rows=0)
+    for root in roots:
+        _walk(root, plan)
+
+    return plan
+
+
+def guard_query(conn, sql: str) -> QueryPlan:
+    """
+    Validate and budget a query before execution.
+
+    Args:
+        conn: Open DuckDB connection used for parsing and EXPLAIN
+        sql: Query text as submitted by the agent
+
+    Returns:
+        QueryPlan whose ``sql`` is the statement to execute (possibly with an added LIMIT)
+
+    Raises:
+        QueryRejected: If the query is not read-only or exceeds the cost budget
+    """
+    sql = ensure_read_only(conn, sql)
+    plan = explain(conn, sql)
+
+    if plan.peak_operator_rows > MAX_ESTIMATED_ROWS:
+        raise QueryRejected(
+            f"Query rejected: estimated ~{plan.peak_operator_rows:,} intermediate rows exceeds the budget of "
+            f"{MAX_ESTIMATED_ROWS:,} ({plan.describe()}). Add join conditions, filter "
+            "staging.stg_version_downloads by date or version_id, or aggregate before joining."
+        )
+
+    if plan.estimated_rows > MAX_RESULT_ROWS:
+        plan.sql = f"SELECT * FROM (\n{sql}\n) AS guarded_query LIMIT {MAX_RESULT_ROWS}"
+        plan.limited = True
+
+    return plan
@@ -0,0 +1,595 @@
+"""
+Transport-independent core of the crates.io DuckDB MCP servers.
+
+Both ``mcp_duckdb_server.py`` (stdio) and ``mcp_duckdb_http.py`` (streamable
+HTTP) are thin adapters over this module, which owns:
+
+- a pool of read-only DuckDB connections (bounded concurrency, idle close so
+  ``update.py`` can take the write lock, per-query timeout)
+- the tool, resource and prompt definitions
+- background query jobs for long-running analytics (see ``jobs.py``)
+- a small result cache keyed by the database file version
+- per-tool latency/error metrics
+- a background pre-warm started with the server (see ``prewarm()``)
+
+Heavy modules (DuckDB, pandas, tabulate, PyYAML) are not imported here: they
+are loaded by the pre-warm or the first call that needs them, so the servers
+answer the MCP handshake as soon as the protocol stack is up.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The warehouse path and DuckDB resource presets are shared with the scripts
+sys.path.append(os.path.join(PROJECT_ROOT, "scripts"))
+
+import runtime_config
+from analytics import AnalyticsQueries, FACET_PERIODS, GRANULARITIES, PERIOD_DAYS
+from catalog import Catalog
+from jobs import JobManager, JOB_WORKERS
+from query_guard import guard_query
+
+POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", 4))
+IDLE_CLOSE_SECONDS = float(os.environ.get("MCP_IDLE_CLOSE_SECONDS", 60))
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("MCP_QUERY_TIMEOUT_SECONDS", 120))
+CACHE_ENTRIES = int(os.environ.get("MCP_CACHE_ENTRIES", 256))
+CACHE_TTL_SECONDS = float(os.environ.get("MCP_CACHE_TTL_SECONDS", 300))
+# Append every tool call to this JSONL file, for replay with benchmarks/mcp_load.py
+RECORD_CALLS_PATH = os.environ.get("MCP_RECORD_CALLS")
+PREWARM = os.environ.get("MCP_PREWARM", "1") != "0"
+
+logging.basicConfig(
+    level=logging.DEBUG,
+    filename=os.path.join(PROJECT_ROOT, 'output.log'),
+    format='%(pathname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def get_crates_duckdb_path():
+    return runtime_config.DUCKDB_PATH
+
+
+class PooledConnection:
+    """A read-only connection plus the names of statements already PREPAREd on it."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of read-only DuckDB connections, opened with the ``interactive``
+    resource preset of ``runtime_config``.
+
+    Idle connections are closed after ``idle_seconds`` so the database file lock
+    is released between bursts of agent activity.
+    """
+
+    def __init__(self, duckdb_path: str, size: int = POOL_SIZE, idle_seconds: float = IDLE_CLOSE_SECONDS):
+        self.duckdb_path = duckdb_path
+        self.idle_seconds = idle_seconds
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._free = []
+        self._reaper = None
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_idle, name="duckdb-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_idle(self):
+        while True:
+            time.sleep(max(self.idle_seconds / 2, 1))
+            now = time.monotonic()
+            with self._lock:
+                idle = [pooled for pooled in self._free if now - pooled.last_used > self.idle_seconds]
+                self._free = [pooled for pooled in self._free if pooled not in idle]
+            for pooled in idle:
+                pooled.conn.close()
+
+    @contextmanager
+    def connection(self, timeout: float = QUERY_TIMEOUT_SECONDS):
+        """
+        Borrow a connection; queries running longer than ``timeout`` seconds are interrupted.
+
+        Yields:
+            PooledConnection
+        """
+        import duckdb
+
+        self._slots.acquire()
+        with self._lock:
+            pooled = self._free.pop() if self._free else None
+        if pooled is None:
+            try:
+                pooled = PooledConnection(runtime_config.connect("interactive", read_only=True, duckdb_path=self.duckdb_path))
+            except BaseException:
+                # e.g. update.py holds the write lock; the slot must not leak with the failed connect
+                self._slots.release()
+                raise
+            self._start_reaper()
+
+        timer = threading.Timer(timeout, pooled.conn.interrupt) if timeout else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            yield pooled
+        except duckdb.InterruptException:
+            raise TimeoutError(f"Query exceeded the time limit of {timeout:.0f}s and was cancelled")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            pooled.last_used = time.monotonic()
+            with self._lock:
+                self._free.append(pooled)
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            free, self._free = self._free, []
+        for pooled in free:
+            pooled.conn.close()
+
+
+class ResultCache:
+    """LRU cache of rendered tool results, invalidated when the database file or its WAL changes."""
+
+    def __init__(self, duckdb_path: str, max_entries: int = CACHE_ENTRIES, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.duckdb_path = duckdb_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version(self) -> tuple:
+        # Commits not yet checkpointed only touch the .wal file, so it is part of the version too
+        version = ()
+        for path in (self.duckdb_path, self.duckdb_path + '.wal'):
+            try:
+                stat = os.stat(path)
+                version += (stat.st_size, stat.st_mtime_ns)
+            except FileNotFoundError:
+                version += (0, 0)
+        return version
+
+    def _key(self, name: str, arguments: dict):
+        return (name, json.dumps(arguments, sort_keys=True, default=str), self._version())
+
+    def get(self, name: str, arguments: dict):
+        key = self._key(name, arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, name: str, arguments: dict, text: str):
+        key = self._key(name, arguments)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class Metrics:
+    """Per-tool call counts, errors, cache hits and latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tools = {}
+        self.started_at = time.time()
+
+    def record(self, name: str, seconds: float, ok: bool, cached: bool):
+        with self._lock:
+            tool = self._tools.setdefault(name, {
+                'calls': 0, 'errors': 0, 'cache_hits': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            tool['calls'] += 1
+            tool['errors'] += 0 if ok else 1
+            tool['cache_hits'] += 1 if cached else 0
+            tool['total_seconds'] += seconds
+            tool['max_seconds'] = max(tool['max_seconds'], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tools = {
+                name: {**tool, 'avg_seconds': tool['total_seconds'] / tool['calls']}
+                for name, tool in self._tools.items()
+            }
+        return {'pid': os.getpid(), 'uptime_seconds': time.time() - self.started_at, 'tools': tools}
+
+
+pool = ConnectionPool(get_crates_duckdb_path())
+cache = ResultCache(get_crates_duckdb_path())
+metrics = Metrics()
+catalog = Catalog(
+    pool,
+    os.path.join(PROJECT_ROOT, "transformations", "models"),
+    os.path.join(PROJECT_ROOT, "transformations", "snapshots"),
+)
+analytics = AnalyticsQueries(pool)
+jobs = JobManager(
+    pool,
+    ConnectionPool(get_crates_duckdb_path(), size=JOB_WORKERS),
+    os.path.join(PROJECT_ROOT, "data", "mcp_jobs")
+)
+
+
+def _markdown(df) -> str:
+    return df.to_markdown(index=False)
+
+
+def _prewarm():
+    start = time.perf_counter()
+    try:
+        # Agents usually list the tables first; the catalog opens the first pooled connection
+        catalog.snapshot()
+        with pool.connection() as pooled:
+            missing = analytics.prepare_all(pooled)
+            # fetchdf() and to_markdown() import pandas and tabulate on first use
+            _markdown(pooled.conn.execute("SELECT 1 AS ready").fetchdf())
+    except Exception:
+        logger.exception("Pre-warm failed, the first calls will open the database themselves")
+        return
+    if missing:
+        logger.info("Pre-warm could not prepare %s, their tables are missing", ", ".join(missing))
+    logger.info("Pre-warmed in %.3fs", time.perf_counter() - start)
+
+
+def prewarm():
+    """
+    Load the query stack in a background thread: build the catalog (which
+    opens a pooled connection), PREPARE the analytics queries on it and import
+    pandas and tabulate, so the first tool calls don't pay for it. Calls that
+    arrive meanwhile share the module imports and the catalog lock, so the work
+    isn't done twice.
+
+    Transports call this once the server is about to serve. Disabled with
+    ``MCP_PREWARM=0``.
+
+    Returns:
+        The started thread, or None when disabled
+    """
+    if not PREWARM:
+        return None
+    thread = threading.Thread(target=_prewarm, name="mcp-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def list_tables() -> str:
+    return f"Available tables:\n\n{catalog.tables_markdown()}"
+
+
+def query_duckdb(sql: str) -> str:
+    with pool.connection() as pooled:
+        # Safety check: read-only parse + EXPLAIN cost budget
+        plan = guard_query(pooled.conn, sql)
+        result = pooled.conn.execute(plan.sql).fetchdf()
+
+    text = _markdown(result)
+    if plan.limited:
+        text = f"{text}\n\nNote: {plan.describe()}"
+    return text
+
+
+def crate_downloads(name: str, from_date: str = None, to_date: str = None, granularity: str = "month") -> str:
+    return _markdown(analytics.crate_downloads(name, from_date, to_date, granularity))
+
+
+def top_crates(period: str = "month", n: int = 20) -> str:
+    return _markdown(analytics.top_crates(period, n))
+
+
+def reverse_deps(name: str, n: int = 50) -> str:
+    return _markdown(analytics.reverse_deps(name, n))
+
+
+def version_breakdown(name: str, days: int = 90) -> str:
+    return _markdown(analytics.version_breakdown(name, days))
+
+
+def search_crates(query: str, n: int = 20) -> str:
+    return _markdown(analytics.search_crates(query, n))
+
+
+def filter_crates(
+    categories: list = None,
+    keywords: list = None,
+    min_downloads: int = 0,
+    period: str = "month",
+    n: int = 50
+) -> str:
+    return _markdown(analytics.filter_crates(categories, keywords, min_downloads, period, n))
+
+
+def submit_query(sql: str) -> str:
+    job = jobs.submit(sql)
+    return (
+        f"Submitted job {job['id']} (estimated ~{job['estimated_rows']:,} result rows). "
+        "Poll query_status with this job_id, then page through the result with fetch_result."
+    )
+
+
+def query_status(job_id: str) -> str:
+    job = jobs.status(job_id)
+    lines = [f"Job {job['id']}: {job['status']}", f"Elapsed: {job['elapsed_seconds']}s"]
+    if job.get('progress') is not None:
+        lines.append(f"Progress: {job['progress']}%")
+    if job['status'] == 'done':
+        lines.append(f"Result: {job['rows']:,} rows ({job['bytes']:,} bytes of Parquet)")
+    if job['error']:
+        lines.append(f"Error: {job['error']}")
+    return "\n".join(lines)
+
+
+def fetch_result(job_id: str, offset: int = 0, limit: int = 100) -> str:
+    job, result = jobs.fetch(job_id, offset, limit)
+    return f"{_markdown(result)}\n\nRows {offset + 1}-{offset + len(result)} of {job['rows']:,}"
+
+
+CRATE_NAME_PROPERTY = {"type": "string", "description": "Crate name"}
+
+TOOLS = {
+    "query_duckdb": {
+        "handler": query_duckdb,
+        # Free-form SQL may call now(), random() and the like, so its result is never reused
+        "cacheable": False,
+        "description": "Execute a read-only SQL query against the crates.io DuckDB database",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "sql": {
+                    "type": "string",
+                    "description": "SELECT query to execute (WITH ... SELECT allowed; large results are truncated)"
+                }
+            },
+            "required": ["sql"]
+        },
+    },
+    "list_tables": {
+        "handler": list_tables,
+        "cacheable": False,
+        "description": "List all tables in the staging schema",
+        "input_schema": {"type": "object", "properties": {}},
+    },
+    "crate_downloads": {
+        "handler": crate_downloads,
+        "cacheable": True,
+        "description": "Downloads of a crate between two dates (YYYY-MM-DD, default last 90 days), bucketed by day/week/month/quarter/year",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "name": CRATE_NAME_PROPERTY,
+                "from_date": {"type": "string", "description": "Start date YYYY-MM-DD (default: 90 days before to_date)"},
+                "to_date": {"type": "string", "description": "End date YYYY-MM-DD (default: latest loaded date)"},
+                "granularity": {"type": "string", "enum": list(GRANULARITIES), "default": "month"}
+            },
+            "required": ["name"]
+        },
+    },
+    "top_crates": {
+        "handler": top_crates,
+        "cacheable": True,
+        "description": "Most downloaded crates over the trailing period ending at the latest loaded date",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "period": {"type": "string", "enum": list(PERIOD_DAYS), "default": "month"},
+                "n": {"type": "integer", "default": 20}
+            }
+        },
+    },
+    "reverse_deps": {
+        "handler": reverse_deps,
+        "cacheable": True,
+        "description": "Crates whose default version depends on the given crate, most downloaded first",
+        "input_schema": {
+            "type": "object",
+            "properties": {"name": CRATE_NAME_PROPERTY, "n": {"type": "integer", "default": 50}},
+            "required": ["name"]
+        },
+    },
+    "version_breakdown": {
+        "handler": version_breakdown,
+        "cacheable": True,
+        "description": "Downloads per version of a crate over the trailing number of days",
+        "input_schema": {
+            "type": "object",
+            "properties": {"name": CRATE_NAME_PROPERTY, "days": {"type": "integer", "default": 90}},
+            "required": ["name"]
+        },
+    },
+    "search_crates": {
+        "handler": search_crates,
+        "cacheable": True,
+        "description": "Find crates by free text (e.g. 'async http client'), ranked by relevance of name, keywords, categories and description, with total and last-90-days downloads",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Words to search for"},
+                "n": {"type": "integer", "default": 20}
+            },
+            "required": ["query"]
+        },
+    },
+    "filter_crates": {
+        "handler": filter_crates,
+        "cacheable": True,
+        "description": "Crates in all the given categories and with all the given keywords, with at least min_downloads over the period, most downloaded first",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "categories": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Category names (e.g. 'Web programming::HTTP client'); a parent category also matches its subcategories"
+                },
+                "keywords": {"type": "array", "items": {"type": "string"}, "description": "Keywords (e.g. 'async')"},
+                "min_downloads": {"type": "integer", "default": 0, "description": "Minimum downloads over the period"},
+                "period": {"type": "string", "enum": list(FACET_PERIODS), "default": "month"},
+                "n": {"type": "integer", "default": 50}
+            }
+        },
+    },
+    "submit_query": {
+        "handler": submit_query,
+        "cacheable": False,
+        "description": "Run a long read-only SELECT (e.g. multi-year trends) in the background and return a job_id",
+        "input_schema": {
+            "type": "object",
+            "properties": {"sql": {"type": "string", "description": "SELECT query to run in the background"}},
+            "required": ["sql"]
+        },
+    },
+    "query_status": {
+        "handler": query_status,
+        "cacheable": False,
+        "description": "Status, progress and result size of a background query job",
+        "input_schema": {
+            "type": "object",
+            "properties": {"job_id": {"type": "string"}},
+            "required": ["job_id"]
+        },
+    },
+    "fetch_result": {
+        "handler": fetch_result,
+        "cacheable": False,
+        "description": "Page through the result of a finished background query job (up to 1000 rows per call)",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "job_id": {"type": "string"},
+                "offset": {"type": "integer", "default": 0},
+                "limit": {"type": "integer", "default": 100}
+            },
+            "required": ["job_id"]
+        },
+    },
+}
+
+
+_record_lock = threading.Lock()
+
+
+def _record_call(name: str, arguments: dict):
+    line = json.dumps({"tool": name, "arguments": arguments, "ts": time.time()}, default=str)
+    with _record_lock, open(RECORD_CALLS_PATH, "a") as f:
+        f.write(line + "\n")
+
+
+def call_tool(name: str, arguments: dict) -> str:
+    """
+    Run a tool by name, with caching and metrics. Errors are returned as text for the agent.
+
+    Blocking: transports should call this from a worker thread.
+    """
+    if name not in TOOLS:
+        return f"Error: Unknown tool: {name}"
+
+    tool = TOOLS[name]
+    arguments = {key: value for key, value in (arguments or {}).items() if value is not None}
+    if RECORD_CALLS_PATH:
+        _record_call(name, arguments)
+    start = time.perf_counter()
+
+    if tool["cacheable"]:
+        cached = cache.get(name, arguments)
+        if cached is not None:
+            metrics.record(name, time.perf_counter() - start, ok=True, cached=True)
+            return cached
+
+    try:
+        text = tool["handler"](**arguments)
+    except Exception as e:
+        logger.exception("Tool %s failed", name)
+        metrics.record(name, time.perf_counter() - start, ok=False, cached=False)
+        return f"Error: {str(e)}"
+
+    if tool["cacheable"]:
+        cache.put(name, arguments, text)
+    metrics.record(name, time.perf_counter() - start, ok=True, cached=False)
+    return text
+
+
+RESOURCES = {
+    "schema://staging/tables": {
+        "name": "Staging Schema Definition",
+        "mime_type": "text/plain",
+        "description": "Column definitions and relationships for all staging tables",
+        "read": catalog.as_text,
+    },
+    "schema://catalog.json": {
+        "name": "Warehouse Catalog (JSON)",
+        "mime_type": "application/json",
+        "description": "Compact JSON snapshot of all tables: columns, types, tests, row estimates and fact table date range",
+        "read": catalog.as_json,
+    },
+    "metrics://server": {
+        "name": "Server Metrics",
+        "mime_type": "application/json",
+        "description": "Per-tool call counts, errors, cache hits and latency for this server process",
+        "read": lambda: json.dumps(metrics.snapshot()),
+    },
+}
+
+
+def read_resource(uri: str) -> str:
+    if str(uri) not in RESOURCES:
+        raise ValueError(f"Unknown resource: {uri}")
+    return RESOURCES[str(uri)]["read"]()
+
+
+PROMPT_NAME = "setup_crates_analytics_context"
+PROMPT_DESCRIPTION = "Load context about the Rust Crates Analytics project"
+PROMPT_TEXT = """You are exploring the Rust Crates Analytics data warehouse.
+
+**Available Data:**
+- Staging schema contains cleaned, validated data from crates.io
+- Date range: figure out from the query_duckdb tool, please
+- You can expect around ~200k crates, ~1.75M versions, billions of download records
+
+**Key Tables:**
+- stg_crates: Rust packages
+- stg_versions: Specific releases
+- stg_version_downloads: Daily download history (fact table), for the recent retention window
+- stg_version_downloads_all: Full download history, older days as weekly/monthly rollups (filter and group by month or coarser there)
+- stg_dependencies: Version dependencies
+- stg_categories, stg_keywords: Metadata
+
+**Available Tools:**
+- query_duckdb: Run SELECT queries
+- list_tables: See available tables
+- search_crates: Find crates by topic or name fragment
+- filter_crates: Crates by exact category and keyword combination and download threshold
+- crate_downloads, top_crates, reverse_deps, version_breakdown: Fast answers to common questions, prefer these over hand-written SQL
+- submit_query, query_status, fetch_result: Run slow queries (e.g. multi-year trends) in the background instead of query_duckdb
+
+**Available Resources:**
+- schema://staging/tables: Full schema definitions
+- schema://catalog.json: Same catalog as compact JSON, with row estimates and the fact table date range
+
+**Setup:**
+Please load the context using the Resources for schema to let you know of columns, types, data quality tests, relationships.
+That way, you already know about the Rust Crates DWH structure and you'll know how to create queries.
+
+Know that you can only create read-only SELECT queries (CTEs with WITH ... SELECT are fine), don't try creating any other queries like INSERT, UPDATE, etc. Queries are cost-checked with EXPLAIN first: cross joins and other very expensive plans are rejected with an explanation, and very large results are truncated automatically.
+
+DO NOT FORGET TO USE staging. schema for the tables that you get enlisted, please
+
+**Your Task:**
+Help analyze the Rust ecosystem. Suggest interesting questions to explore, write efficient queries, and explain findings in context."""
@@ -0,0 +1,175 @@
+"""
+Fetching and inserting version-download archive days, shared by the backfill
+(``ingest_vd_archives.py``) and the gap catch-up (``fill_gaps.py``).
+
+Days are downloaded concurrently through the shared ``HttpClient``, running a
+bounded number of days ahead of the inserts, and inserted one at a time in the
+given order (DuckDB has a single writer). Days in the local archive mirror are
+inserted from its Parquet files without a download. Inserted days are recorded
+for the next dbt build, which re-aggregates them in the daily crate mart (see
+``dbt_plan.add_rebuild_dates``).
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import duckdb
+import requests
+
+from common import CompactedDayError, replace_version_downloads_day
+from compact_version_downloads import compacted_days_sql
+from dbt_plan import add_rebuild_dates
+from http_client import HttpClient
+from run_metrics import stage
+from runtime_config import DUCKDB_PATH
+
+ARCHIVE_URI = 'https://static.crates.io/archive/version-downloads/{date}.csv'
+ARCHIVE_DIR = 'data/temp'
+
+# Days crates.io never published an archive for
+KNOWN_MISSING_DATES = {
+    '2014-11-15',
+}
+
+
+def download_archive(client, curr_date_str, csv_path):
+    """
+    Download one day's archive CSV. Returns its size in bytes.
+    """
+    print(f"Downloading {curr_date_str}.csv...")
+    file_size = client.download(ARCHIVE_URI.format(date=curr_date_str), csv_path)
+    print(f"Downloaded {curr_date_str}.csv")
+    return file_size
+
+
+def insert_archive(duckdb_con, curr_date_str, csv_path, mirror=None):
+    """
+    Insert a downloaded archive CSV into DuckDB and remove it from the filesystem.
+    With a mirror, the day is kept there as Parquet first.
+    """
+    if mirror is not None:
+        entry = mirror.add_csv(duckdb_con, curr_date_str, csv_path)
+        print(f"Mirrored {curr_date_str} ({entry['bytes'] / 1024:.0f}KB)")
+
+    print(f"Ingesting {curr_date_str}.csv...")
+
+    replace_version_downloads_day(duckdb_con, csv_path, curr_date_str)
+
+    print(f"Inserted data for {curr_date_str}! Removing from filesystem....\n\n")
+    os.remove(csv_path)
+
+
+def ingest_archive_days(
+    duckdb_con,
+    dates: list,
+    concurrency: int = 4,
+    mirror=None,
+    read_mirror: bool = True,
+    write_mirror: bool = False,
+    stop_on_error: bool = True,
+    stage_prefix: str = "backfill",
+) -> tuple:
+    """
+    Download and insert archive days, in the order given.
+
+    Args:
+        duckdb_con: Open read-write DuckDB connection
+        dates: Days to ingest (YYYY-MM-DD)
+        concurrency: Days downloaded in parallel
+        mirror: Local ArchiveMirror, None to download every day
+        read_mirror: Insert days found in ``mirror`` from it instead of downloading them
+        write_mirror: Also keep every downloaded day in ``mirror``
+        stop_on_error: Stop at the first failed day instead of moving on to the next one
+        stage_prefix: Run stage name of each day, followed by the date
+
+    Returns:
+        (days that failed, bytes downloaded)
+    """
+    Path(ARCHIVE_DIR).mkdir(parents=True, exist_ok=True)
+    concurrency = max(1, concurrency)
+    # Compacted days only exist as rollups now, reloading them would double count
+    compacted = {day.isoformat() for (day,) in duckdb_con.execute(compacted_days_sql(duckdb_con)).fetchall()}
+    skipped = [curr_date_str for curr_date_str in dates if curr_date_str in compacted]
+    if skipped:
+        print(f"Skipping {len(skipped)} days compacted into the version downloads rollups")
+        dates = [curr_date_str for curr_date_str in dates if curr_date_str not in compacted]
+    mirrored = {curr_date_str for curr_date_str in dates if mirror is not None and read_mirror and mirror.has(curr_date_str)}
+    if mirrored:
+        print(f"{len(mirrored)} of {len(dates)} days will be read from the archive mirror")
+
+    def csv_path_for(curr_date_str):
+        return os.path.join(ARCHIVE_DIR, f'{curr_date_str}.csv')
+
+    # Downloads run ahead of the inserts, at most two rounds of workers, to bound the disk used by pending CSVs
+    prefetch = concurrency * 2
+    client = HttpClient(max_concurrency=concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    downloads = {}
+    failed = []
+    inserted = []
+    total_size = 0
+    prev_duckdb_size = os.path.getsize(DUCKDB_PATH) if os.path.exists(DUCKDB_PATH) else 0
+    start = time.time()
+
+    try:
+        for i, curr_date_str in enumerate(dates):
+            for ahead in dates[i:i + prefetch]:
+                if ahead not in downloads and ahead not in mirrored:
+                    downloads[ahead] = executor.submit(download_archive, client, ahead, csv_path_for(ahead))
+
+            with stage(f"{stage_prefix} {curr_date_str}") as record:
+                try:
+                    if curr_date_str in mirrored:
+                        print(f"Ingesting {curr_date_str} from the archive mirror...")
+                        replace_version_downloads_day(duckdb_con, mirror.path(curr_date_str), curr_date_str)
+                        file_size = 0
+                        record['source'] = 'mirror'
+                    else:
+                        file_size = downloads.pop(curr_date_str).result()
+                        insert_archive(duckdb_con, curr_date_str, csv_path_for(curr_date_str), mirror if write_mirror else None)
+                        record['source'] = 'download'
+                    record['csv_bytes'] = file_size
+                except CompactedDayError as e:
+                    # Compacted while this run was going
+                    print(f"Skipping: {e}")
+                    record['status'] = 'skipped'
+                    file_size = None
+                except (requests.RequestException, OSError, duckdb.Error) as e:
+                    print(f"Error: {e}")
+                    record['status'] = 'failed'
+                    file_size = None
+
+            if record['status'] == 'skipped':
+                if os.path.exists(csv_path_for(curr_date_str)):
+                    os.remove(csv_path_for(curr_date_str))
+                continue
+            if file_size is None:
+                failed.append(curr_date_str)
+                if os.path.exists(csv_path_for(curr_date_str)):
+                    os.remove(csv_path_for(curr_date_str))
+                if stop_on_error:
+                    break
+                continue
+
+            inserted.append(curr_date_str)
+            total_size += file_size
+            duckdb_size = os.path.getsize(DUCKDB_PATH) if os.path.exists(DUCKDB_PATH) else 0
+
+            print(f"Total download size: {total_size / (1024 ** 2)}MB")
+            print(f"DuckDB size: {duckdb_size / (1024 ** 2)}, previous: {prev_duckdb_size / (1024 ** 2)}")
+            print(f"Time elapsed: {time.time() - start}\n")
+            prev_duckdb_size = duckdb_size
+    finally:
+        for future in downloads.values():
+            future.cancel()
+        executor.shutdown(wait=True)
+        client.close()
+        add_rebuild_dates(inserted)
+        # Days downloaded ahead of a failure
+        for pending in downloads:
+            if os.path.exists(csv_path_for(pending)):
+                os.remove(csv_path_for(pending))
+
+    return failed, total_size
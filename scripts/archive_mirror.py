@@ -0,0 +1,165 @@
+"""
+Local mirror of the crates.io version-downloads archives.
+
+Each day is kept as ``data/archive_mirror/<YYYY-MM-DD>.parquet`` (version_id,
+downloads; zstd-compressed, typically a fraction of the CSV size), and
+``manifest.json`` next to them lists every mirrored day with its row count and
+sizes. Backfills read mirrored days from here instead of static.crates.io, so
+rebuilding the database or changing the fact-table layout is local I/O.
+
+Days get into the mirror when a backfill runs with ``--mirror``, or by
+exporting what the warehouse already holds:
+
+    uv run scripts/archive_mirror.py export --from-date 2024-01-01 --to-date 2024-12-31
+    uv run scripts/archive_mirror.py status
+    uv run scripts/archive_mirror.py verify
+"""
+
+import argparse
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import duckdb
+
+import runtime_config
+
+MIRROR_DIR = 'data/archive_mirror'
+COMPRESSION = 'zstd'
+
+
+class ArchiveMirror:
+    """Per-day Parquet files plus a JSON manifest under ``mirror_dir``."""
+
+    def __init__(self, mirror_dir: str = MIRROR_DIR):
+        self.mirror_dir = mirror_dir
+        self.manifest_path = os.path.join(mirror_dir, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+
+    def path(self, date_str: str) -> str:
+        return os.path.join(self.mirror_dir, f'{date_str}.parquet')
+
+    def has(self, date_str: str) -> bool:
+        return date_str in self.manifest.get('days', {}) and os.path.exists(self.path(date_str))
+
+    def _save_manifest(self):
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _write(self, duckdb_con, date_str: str, select_sql: str, source_bytes: int = None) -> dict:
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        path = self.path(date_str)
+        tmp_path = f'{path}.tmp'
+        duckdb_con.execute(f"COPY ({select_sql}) TO '{tmp_path}' (FORMAT parquet, COMPRESSION {COMPRESSION})")
+        rows = duckdb_con.execute(f"SELECT COUNT(*) FROM read_parquet('{tmp_path}')").fetchone()[0]
+        os.replace(tmp_path, path)
+
+        entry = {
+            'rows': rows,
+            'bytes': os.path.getsize(path),
+            'source_bytes': source_bytes,
+            'mirrored_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self.manifest.setdefault('days', {})[date_str] = entry
+            self._save_manifest()
+        return entry
+
+    def add_csv(self, duckdb_con, date_str: str, csv_path: str) -> dict:
+        """Mirror a downloaded archive CSV."""
+        return self._write(
+            duckdb_con,
+            date_str,
+            f"SELECT version_id::BIGINT AS version_id, downloads::BIGINT AS downloads FROM read_csv_auto('{csv_path}')",
+            os.path.getsize(csv_path)
+        )
+
+    def export_day(self, duckdb_con, date_str: str) -> dict:
+        """Mirror one day that is already in staging.stg_version_downloads."""
+        return self._write(
+            duckdb_con,
+            date_str,
+            f"SELECT version_id, downloads FROM staging.stg_version_downloads WHERE date = '{date_str}'::DATE"
+        )
+
+    def days(self) -> dict:
+        return dict(sorted(self.manifest.get('days', {}).items()))
+
+
+def status(mirror: ArchiveMirror):
+    days = mirror.days()
+    if not days:
+        print(f"No days mirrored in {mirror.mirror_dir}")
+        return
+    total_bytes = sum(entry['bytes'] for entry in days.values())
+    source_bytes = [entry['source_bytes'] for entry in days.values() if entry.get('source_bytes')]
+    print(f"Mirror: {mirror.mirror_dir}")
+    print(f"  Days: {len(days)} ({min(days)} to {max(days)})")
+    print(f"  Rows: {sum(entry['rows'] for entry in days.values()):,}")
+    print(f"  Size: {total_bytes / (1024 ** 2):.1f}MB")
+    if source_bytes:
+        mirrored = sum(entry['bytes'] for entry in days.values() if entry.get('source_bytes'))
+        print(f"  Compression vs downloaded CSV: {sum(source_bytes) / mirrored:.1f}x")
+
+
+def verify(mirror: ArchiveMirror) -> list:
+    """Days whose Parquet file is missing or has a different row count than the manifest."""
+    con = duckdb.connect()
+    broken = []
+    try:
+        for date_str, entry in mirror.days().items():
+            path = mirror.path(date_str)
+            try:
+                rows = con.execute(f"SELECT COUNT(*) FROM read_parquet('{path}')").fetchone()[0]
+            except duckdb.Error:
+                rows = None
+            if rows != entry['rows']:
+                broken.append(date_str)
+                print(f"  {date_str}: expected {entry['rows']} rows, found {'no readable file' if rows is None else rows}")
+    finally:
+        con.close()
+    return broken
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Mirror days already loaded into stg_version_downloads")
+    export_parser.add_argument("--from-date", help="First day to export (YYYY-MM-DD, default: oldest loaded)")
+    export_parser.add_argument("--to-date", help="Last day to export (YYYY-MM-DD, default: newest loaded)")
+    export_parser.add_argument("--overwrite", action="store_true", help="Export days that are already mirrored again")
+    subparsers.add_parser("status", help="Summarize the mirror")
+    subparsers.add_parser("verify", help="Check every mirrored file against the manifest")
+    args = parser.parse_args()
+
+    mirror = ArchiveMirror()
+    if args.command == "export":
+        con = runtime_config.connect("bulk_load", read_only=True)
+        try:
+            dates = [row[0].isoformat() for row in con.execute("""
+                SELECT DISTINCT date FROM staging.stg_version_downloads
+                WHERE date BETWEEN COALESCE(?::DATE, '0001-01-01'::DATE) AND COALESCE(?::DATE, '9999-12-31'::DATE)
+                ORDER BY date
+            """, [args.from_date, args.to_date]).fetchall()]
+            dates = [date_str for date_str in dates if args.overwrite or not mirror.has(date_str)]
+            print(f"Exporting {len(dates)} days to {mirror.mirror_dir}...")
+            for date_str in dates:
+                entry = mirror.export_day(con, date_str)
+                print(f"  {date_str}: {entry['rows']:,} rows, {entry['bytes'] / 1024:.0f}KB")
+        finally:
+            con.close()
+        status(mirror)
+    elif args.command == "status":
+        status(mirror)
+    else:
+        broken = verify(mirror)
+        print(f"✓ {len(mirror.days())} days verified" if not broken else f"✗ {len(broken)} broken days")
+        if broken:
+            raise SystemExit(1)
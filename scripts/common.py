@@ -2,53 +2,47 @@
 Common utilities for data ingestion scripts.
 """
 
-import time
-import requests
-import duckdb
-from typing import Callable, Tuple, Any
-from functools import wraps
+from compact_version_downloads import compacted_days_sql
 
 
-def retry(max_retries: int = 5, backoff: int = 5):
+class CompactedDayError(ValueError):
+    """The day is compacted into the version downloads rollups, its daily rows can't be replaced."""
+
+
+def replace_version_downloads_day(duckdb_con, csv_path: str, date_str: str):
     """
-    Decorator that adds retry logic to functions returning (bool, Any).
-    
+    Load one day of a version-downloads archive into staging.stg_version_downloads,
+    replacing any rows the day already has.
+
+    This is the date_partitions strategy of the dbt model (see
+    transformations/macros/date_partitions_strategy.sql): delete the day, then
+    append it, in one transaction. Loading a day again is idempotent and only
+    touches that day's rows. Days already compacted into the weekly/monthly
+    rollups (see compact_version_downloads.py) can't be replaced and raise
+    CompactedDayError.
+
     Args:
-        max_retries: Maximum retry attempts (default: 5)
-        backoff: Base seconds for linear backoff (default: 5)
-    
-    Returns:
-        Decorated function that retries on failure
-    
-    Example:
-        @retry(max_retries=3, backoff=5)
-        def download_and_insert(date_str, path, uri):
-            # ... your logic ...
-            return True, file_size
+        duckdb_con: Open read-write DuckDB connection
+        csv_path: Archive CSV, or its Parquet copy from the archive mirror, with version_id and downloads columns
+        date_str: Day the archive covers (YYYY-MM-DD)
     """
-    def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        def wrapper(*args, **kwargs) -> Tuple[bool, Any]:
-            for attempt in range(1, max_retries + 1):
-                try:
-                    success, result = func(*args, **kwargs)
-                    if success:
-                        return True, result
-                    return False, result
-                    
-                except (requests.RequestException, duckdb.Error) as e:
-                    print(f"Error on attempt {attempt}/{max_retries}: {e}")
-                    if attempt == max_retries:
-                        print(f"Failed after {max_retries} attempts")
-                        return False, None
-                    wait_time = backoff * attempt
-                    print(f"Retrying in {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    
-                except Exception as e:
-                    print(f"Unexpected error (no retry): {e}")
-                    return False, None
-            
-            return False, None
-        return wrapper
-    return decorator
\ No newline at end of file
+    compacted = duckdb_con.execute(
+        f"SELECT COUNT(*) > 0 FROM ({compacted_days_sql(duckdb_con)}) WHERE date = '{date_str}'::DATE"
+    ).fetchone()[0]
+    if compacted:
+        raise CompactedDayError(f"{date_str} is compacted into the version downloads rollups and can't be replaced")
+
+    reader = 'read_parquet' if csv_path.endswith('.parquet') else 'read_csv_auto'
+    duckdb_con.execute("BEGIN TRANSACTION")
+    try:
+        duckdb_con.execute(f"DELETE FROM staging.stg_version_downloads WHERE date = '{date_str}'::DATE")
+        duckdb_con.execute(f"""
+            INSERT INTO staging.stg_version_downloads(version_id, downloads, date)
+            SELECT version_id, downloads, '{date_str}'::DATE as date
+            FROM {reader}('{csv_path}')
+        """)
+        duckdb_con.execute("COMMIT")
+    except BaseException:
+        duckdb_con.execute("ROLLBACK")
+        raise
+    duckdb_con.execute("CHECKPOINT")
@@ -0,0 +1,282 @@
+"""
+Age-based retention for staging.stg_version_downloads.
+
+Daily rows are kept for a recent window. Older days are compacted into
+per-version rollups in staging.stg_version_downloads_rollup: weekly up to a
+second age, monthly beyond it. Weeks are cut at month boundaries, so a week
+folds exactly into its month once it ages into the monthly tier. A run only
+touches the days that left the daily window since the last run, the weeks that
+became months, and the rollup periods those fall into. Everything happens in
+one transaction, and every compacted day is recorded in
+staging.stg_version_downloads_compacted_days.
+
+staging.stg_version_downloads_all is the union of the tiers. It has one row
+per version and day, week or month: ``date`` is the first day of the period,
+``days`` the number of daily rows it stands for, and ``first_date`` and
+``last_date`` the first and last day with downloads. Sums over whole months
+are exact whatever the tier; sums over day ranges inside a compacted period
+count the whole period.
+
+Compacted days count as loaded for the gap catch-up and the backfill, and can
+no longer be replaced (see ``common.replace_version_downloads_day``), so a day
+is never counted twice. Dump days are never compacted: the daily window is at
+least MIN_DAILY_RETENTION_DAYS.
+
+Policy, in days counted back from the latest loaded day:
+    VD_DAILY_RETENTION_DAYS: Days kept at daily grain (default 730)
+    VD_WEEKLY_RETENTION_DAYS: Days kept at weekly grain or finer (default 1825);
+        a value not above the daily window rolls days straight into months
+
+    uv run scripts/compact_version_downloads.py                # compact and report
+    uv run scripts/compact_version_downloads.py --report-only  # tier sizes, nothing compacted
+"""
+
+import argparse
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import runtime_config
+from run_metrics import stage
+
+DAILY_TABLE = 'staging.stg_version_downloads'
+ROLLUP_TABLE = 'staging.stg_version_downloads_rollup'
+COMPACTED_DAYS_TABLE = 'staging.stg_version_downloads_compacted_days'
+TIERED_VIEW = 'staging.stg_version_downloads_all'
+
+# The dump carries ~90 days, which must stay reloadable day by day
+MIN_DAILY_RETENTION_DAYS = 120
+
+CREATE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        version_id BIGINT NOT NULL,
+        date DATE NOT NULL,
+        grain VARCHAR NOT NULL,
+        downloads BIGINT NOT NULL,
+        days INTEGER NOT NULL,
+        first_date DATE NOT NULL,
+        last_date DATE NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS {COMPACTED_DAYS_TABLE} (
+        date DATE PRIMARY KEY,
+        daily_rows BIGINT NOT NULL,
+        downloads BIGINT NOT NULL,
+        compacted_at TIMESTAMP WITH TIME ZONE NOT NULL
+    );
+    CREATE OR REPLACE VIEW {TIERED_VIEW} AS
+    SELECT version_id, date, 'day' AS grain, downloads, 1 AS days, date AS first_date, date AS last_date
+    FROM {DAILY_TABLE}
+    UNION ALL
+    SELECT version_id, date, grain, downloads, days, first_date, last_date
+    FROM {ROLLUP_TABLE};
+
+    COMMENT ON TABLE {ROLLUP_TABLE} IS 'Version downloads older than the daily retention window, one row per version and week (cut at month boundaries) or month. Written by scripts/compact_version_downloads.py';
+    COMMENT ON COLUMN {ROLLUP_TABLE}.date IS 'First day of the period';
+    COMMENT ON COLUMN {ROLLUP_TABLE}.grain IS 'week or month';
+    COMMENT ON COLUMN {ROLLUP_TABLE}.days IS 'Daily rows compacted into this row';
+    COMMENT ON COLUMN {ROLLUP_TABLE}.first_date IS 'First day of the period with downloads';
+    COMMENT ON COLUMN {ROLLUP_TABLE}.last_date IS 'Last day of the period with downloads';
+    COMMENT ON TABLE {COMPACTED_DAYS_TABLE} IS 'Days moved from stg_version_downloads into stg_version_downloads_rollup, with their row count and downloads at compaction time';
+    COMMENT ON VIEW {TIERED_VIEW} IS 'Full version download history: daily rows of stg_version_downloads plus the weekly and monthly rollups of older days. date is the first day of the period; filter and group by month or coarser for exact totals over compacted history';
+"""
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    daily_days: int
+    weekly_days: int
+
+    @classmethod
+    def from_environment(cls) -> 'RetentionPolicy':
+        return cls(
+            daily_days=int(os.environ.get("VD_DAILY_RETENTION_DAYS") or 730),
+            weekly_days=int(os.environ.get("VD_WEEKLY_RETENTION_DAYS") or 1825),
+        )
+
+    def validate(self):
+        if self.daily_days < MIN_DAILY_RETENTION_DAYS:
+            raise ValueError(
+                f"The daily retention window must be at least {MIN_DAILY_RETENTION_DAYS} days (dump days stay daily), "
+                f"got {self.daily_days}"
+            )
+
+    def cutoffs(self, latest: date) -> tuple:
+        """
+        (first day kept daily, first day kept weekly) for the latest loaded day.
+        Days before the second one are monthly; both equal when there is no weekly tier.
+        Cutoffs are rounded down to period starts, so no period straddles two tiers.
+        """
+        oldest_daily = latest - timedelta(days=self.daily_days - 1)
+        if self.weekly_days <= self.daily_days:
+            monthly_before = oldest_daily.replace(day=1)
+            return monthly_before, monthly_before
+        week_start = oldest_daily - timedelta(days=oldest_daily.weekday())
+        daily_from = max(week_start, oldest_daily.replace(day=1))
+        monthly_before = (latest - timedelta(days=self.weekly_days - 1)).replace(day=1)
+        return daily_from, monthly_before
+
+
+def ensure_tables(duckdb_con):
+    """Create the rollup and compacted days tables if needed and (re)create the tiered view."""
+    duckdb_con.execute(CREATE_SQL)
+
+
+def _exists(duckdb_con, qualified_name: str) -> bool:
+    schema, table = qualified_name.split('.')
+    return duckdb_con.execute(
+        "SELECT COUNT(*) > 0 FROM duckdb_tables() WHERE schema_name = ? AND table_name = ?", [schema, table]
+    ).fetchone()[0]
+
+
+def compacted_days_sql(duckdb_con) -> str:
+    """SELECT of the compacted days as ``date``, empty before the first compaction."""
+    if _exists(duckdb_con, COMPACTED_DAYS_TABLE):
+        return f"SELECT date FROM {COMPACTED_DAYS_TABLE}"
+    return "SELECT NULL::DATE AS date WHERE false"
+
+
+def _used_bytes(duckdb_con) -> int:
+    _, block_size, total_blocks, free_blocks = duckdb_con.execute(
+        "SELECT database_name, block_size, total_blocks, free_blocks FROM pragma_database_size()"
+    ).fetchone()
+    return (total_blocks - free_blocks) * block_size
+
+
+def tier_sizes(duckdb_con) -> dict:
+    """Rows and covered date range of each tier."""
+    sizes = {}
+    for name, table, first, last in (
+        ('daily', DAILY_TABLE, 'MIN(date)', 'MAX(date)'),
+        ('rollup', ROLLUP_TABLE, 'MIN(first_date)', 'MAX(last_date)'),
+    ):
+        if not _exists(duckdb_con, table):
+            continue
+        rows, first_day, last_day = duckdb_con.execute(f"SELECT COUNT(*), {first}, {last} FROM {table}").fetchone()
+        sizes[name] = {'rows': rows, 'first_day': first_day, 'last_day': last_day}
+    return sizes
+
+
+def compact(duckdb_con, policy: RetentionPolicy) -> dict:
+    """
+    Move the days older than the daily window into the rollup, and weeks older than the
+    weekly window into months, in one transaction. Returns what was compacted.
+    """
+    policy.validate()
+    latest = duckdb_con.execute(f"SELECT MAX(date) FROM {DAILY_TABLE}").fetchone()[0]
+    if latest is None:
+        return {'compacted_days': 0}
+    daily_from, monthly_before = policy.cutoffs(latest)
+    bucket = f"""
+        CASE WHEN date < DATE '{monthly_before}' THEN date_trunc('month', date)
+             ELSE greatest(date_trunc('week', date), date_trunc('month', date)) END
+    """
+    promoted_weeks = f"grain = 'week' AND date < DATE '{monthly_before}'"
+
+    duckdb_con.execute("BEGIN TRANSACTION")
+    try:
+        # New daily rows and promoted weeks, merged with the rollup rows already in their periods
+        # (days backfilled after an earlier compaction); the periods are then replaced as a whole
+        duckdb_con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE compaction_batch AS
+            WITH incoming AS (
+                SELECT version_id, {bucket} AS date, downloads, 1 AS days, date AS first_date, date AS last_date
+                FROM {DAILY_TABLE}
+                WHERE date < DATE '{daily_from}'
+                UNION ALL
+                SELECT version_id, date_trunc('month', date), downloads, days, first_date, last_date
+                FROM {ROLLUP_TABLE}
+                WHERE {promoted_weeks}
+            ),
+            merged AS (
+                SELECT * FROM incoming
+                UNION ALL
+                SELECT version_id, date, downloads, days, first_date, last_date
+                FROM {ROLLUP_TABLE}
+                WHERE date IN (SELECT DISTINCT date FROM incoming) AND NOT ({promoted_weeks})
+            )
+            SELECT
+                version_id,
+                date,
+                CASE WHEN date < DATE '{monthly_before}' THEN 'month' ELSE 'week' END AS grain,
+                SUM(downloads)::BIGINT AS downloads,
+                SUM(days)::INTEGER AS days,
+                MIN(first_date) AS first_date,
+                MAX(last_date) AS last_date
+            FROM merged
+            GROUP BY version_id, date
+            ORDER BY date, version_id
+        """)
+        batch_rows = duckdb_con.execute("SELECT COUNT(*) FROM compaction_batch").fetchone()[0]
+        days = duckdb_con.execute(f"""
+            INSERT INTO {COMPACTED_DAYS_TABLE}
+            SELECT date, COUNT(*), COALESCE(SUM(downloads), 0), now()
+            FROM {DAILY_TABLE}
+            WHERE date < DATE '{daily_from}'
+            GROUP BY date
+        """).fetchone()[0]
+        replaced_rows = duckdb_con.execute(f"""
+            DELETE FROM {ROLLUP_TABLE}
+            WHERE date IN (SELECT DISTINCT date FROM compaction_batch) OR ({promoted_weeks})
+        """).fetchone()[0]
+        duckdb_con.execute(f"INSERT INTO {ROLLUP_TABLE} SELECT * FROM compaction_batch")
+        daily_rows = duckdb_con.execute(f"DELETE FROM {DAILY_TABLE} WHERE date < DATE '{daily_from}'").fetchone()[0]
+        duckdb_con.execute("DROP TABLE compaction_batch")
+        duckdb_con.execute("COMMIT")
+    except BaseException:
+        duckdb_con.execute("ROLLBACK")
+        raise
+
+    return {
+        'latest_day': latest.isoformat(),
+        'daily_from': daily_from.isoformat(),
+        'monthly_before': monthly_before.isoformat(),
+        'compacted_days': days,
+        'compacted_daily_rows': daily_rows,
+        'rollup_rows_replaced': replaced_rows,
+        'rollup_rows_written': batch_rows,
+    }
+
+
+def print_report(result: dict, sizes: dict, used_before: int = None, used_after: int = None):
+    print("\nVersion downloads tiers:")
+    for name, size in sizes.items():
+        covered = f", {size['first_day']} to {size['last_day']}" if size['first_day'] else ""
+        print(f"  {name}: {size['rows']:,} rows{covered}")
+    if result.get('compacted_days'):
+        print(
+            f"  Compacted {result['compacted_days']} days ({result['compacted_daily_rows']:,} daily rows) before "
+            f"{result['daily_from']}, weekly from {result['monthly_before']} on, monthly before"
+        )
+        print(f"  Rollup: {result['rollup_rows_replaced']:,} rows replaced by {result['rollup_rows_written']:,}")
+    elif result:
+        print("  Nothing to compact")
+    if used_before is not None:
+        print(
+            f"  Storage in use: {used_before / 1024 ** 2:,.1f}MB -> {used_after / 1024 ** 2:,.1f}MB "
+            f"({(used_after - used_before) / 1024 ** 2:+,.1f}MB)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--report-only", action="store_true", help="Only print the size of each tier")
+    args = parser.parse_args()
+
+    policy = RetentionPolicy.from_environment()
+    policy.validate()
+    con = runtime_config.connect("bulk_load", read_only=args.report_only)
+    try:
+        if args.report_only:
+            print_report({}, tier_sizes(con))
+        else:
+            with stage("compact version downloads") as record:
+                ensure_tables(con)
+                used_before = _used_bytes(con)
+                result = compact(con, policy)
+                # Deleted row groups are only released by a checkpoint
+                con.execute("CHECKPOINT")
+                used_after = _used_bytes(con)
+                record.update(result, used_bytes_before=used_before, used_bytes_after=used_after)
+            print_report(result, tier_sizes(con), used_before, used_after)
+    finally:
+        con.close()
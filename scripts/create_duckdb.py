@@ -1,8 +1,7 @@
-import duckdb
+import runtime_config
+from runtime_config import DUCKDB_PATH
 
-DUCKDB_PATH = 'data/crates.duckdb'
-
-con = duckdb.connect(DUCKDB_PATH)
+con = runtime_config.connect("bulk_load")
 
 con.execute('CREATE SCHEMA IF NOT EXISTS raw')
 con.execute('CREATE SCHEMA IF NOT EXISTS staging')
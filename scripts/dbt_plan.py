@@ -0,0 +1,222 @@
+"""
+Plans the dbt invocations of an update: build slice and test schedule.
+
+- Resources: ``dag_width()`` gives the widest level of the model DAG, which
+  ``runtime_config.dbt_environment()`` caps the dbt threads at.
+- Slicing: every raw table is fingerprinted (row count and XOR of row hashes)
+  and compared with the fingerprints of the last successful build. Only the
+  changed sources and everything downstream of them (``source:raw.<table>+``)
+  are rebuilt. Without a previous state, or when the dbt project itself
+  changed, everything is built.
+- Relationship tests join against whole parent tables and are the most
+  expensive tests. They are excluded from the regular build and run on their
+  own every ``DBT_RELATIONSHIP_TESTS_EVERY_DAYS`` days (default 7).
+- Tests on the version downloads fact tables only check the days the build
+  can add (the ``vd_validate_from`` var), except on the runs where the
+  relationship tests are due, which validate every row.
+- Archive days inserted behind the last built day (backfills and gap fills)
+  are recorded with ``add_rebuild_dates()`` and passed to the next build as
+  the ``vd_rebuild_dates`` var, so the daily crate mart only re-aggregates
+  those days instead of searching the fact table for unseen ones.
+
+The state of the last successful build is kept in ``data/dbt_state.json``.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import duckdb
+
+try:
+    from scripts import runtime_config  # Imported from setup.py/update.py
+except ImportError:
+    import runtime_config
+
+DUCKDB_PATH = runtime_config.DUCKDB_PATH
+STATE_PATH = 'data/dbt_state.json'
+PROJECT_DIR = 'transformations'
+MANIFEST_PATH = os.path.join(PROJECT_DIR, 'target', 'manifest.json')
+
+# Project files whose changes require a full build
+PROJECT_PATHS = ('models', 'macros', 'snapshots', 'tests', 'dbt_project.yml')
+
+# Incremental models pick up new days by the clock as well as by the data, so
+# these sources are always built; fingerprinting them would also scan the fact table
+ALWAYS_BUILD_SOURCES = ('version_downloads',)
+
+RELATIONSHIP_TESTS = 'test_name:relationships'
+RELATIONSHIP_TESTS_EVERY_DAYS = float(os.environ.get("DBT_RELATIONSHIP_TESTS_EVERY_DAYS", 7))
+
+
+@dataclass
+class BuildPlan:
+    select: list = None  # None builds everything
+    changed_sources: list = field(default_factory=list)
+    fingerprints: dict = field(default_factory=dict)
+    project_hash: str = None
+    run_relationship_tests: bool = False
+    validate_from: str = None  # None validates every row
+    rebuild_dates: list = field(default_factory=list)
+    reason: str = ''
+
+    def build_args(self) -> list:
+        """Arguments for ``dbt build``."""
+        args = ["--exclude", RELATIONSHIP_TESTS]
+        dbt_vars = {}
+        if self.validate_from:
+            dbt_vars['vd_validate_from'] = self.validate_from
+        if self.rebuild_dates:
+            dbt_vars['vd_rebuild_dates'] = self.rebuild_dates
+        if dbt_vars:
+            args += ["--vars", json.dumps(dbt_vars)]
+        if self.select:
+            args = ["--select", *self.select] + args
+        return args
+
+
+def dag_width(manifest_path: str = MANIFEST_PATH):
+    """Largest number of models at the same depth of the DAG, or None without a manifest."""
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        nodes = json.load(f)['nodes']
+    models = {unique_id: node for unique_id, node in nodes.items() if node['resource_type'] in ('model', 'snapshot')}
+
+    depths = {}
+
+    def depth(unique_id):
+        if unique_id not in depths:
+            parents = [parent for parent in models[unique_id]['depends_on']['nodes'] if parent in models]
+            depths[unique_id] = 1 + max((depth(parent) for parent in parents), default=-1)
+        return depths[unique_id]
+
+    levels = {}
+    for unique_id in models:
+        levels[depth(unique_id)] = levels.get(depth(unique_id), 0) + 1
+    return max(levels.values(), default=None)
+
+
+def project_hash(project_dir: str = PROJECT_DIR) -> str:
+    digest = hashlib.sha1()
+    for name in PROJECT_PATHS:
+        path = os.path.join(project_dir, name)
+        files = [path] if os.path.isfile(path) else sorted(
+            os.path.join(root, file) for root, _, files in os.walk(path) for file in files
+        )
+        for file in files:
+            digest.update(os.path.relpath(file, project_dir).encode())
+            with open(file, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def source_fingerprints(duckdb_path: str = DUCKDB_PATH) -> dict:
+    """Table -> [row count, XOR of row hashes] for every raw table that isn't always built."""
+    con = runtime_config.connect("dbt_build", read_only=True, duckdb_path=duckdb_path)
+    try:
+        tables = [row[0] for row in con.execute("""
+            SELECT table_name FROM information_schema.tables WHERE table_schema = 'raw' ORDER BY table_name
+        """).fetchall()]
+        fingerprints = {}
+        for table in tables:
+            if table in ALWAYS_BUILD_SOURCES:
+                continue
+            rows, row_hash = con.execute(f'SELECT COUNT(*), bit_xor(hash(t)) FROM raw."{table}" t').fetchone()
+            fingerprints[table] = [rows, str(row_hash)]
+        return fingerprints
+    finally:
+        con.close()
+
+
+def first_unbuilt_date(duckdb_path: str = DUCKDB_PATH):
+    """Day after the last one in stg_version_downloads (ISO format), or None before the first build."""
+    con = runtime_config.connect("dbt_build", read_only=True, duckdb_path=duckdb_path)
+    try:
+        last_date = con.execute("SELECT MAX(date) FROM staging.stg_version_downloads").fetchone()[0]
+    except duckdb.CatalogException:
+        return None
+    finally:
+        con.close()
+    return (last_date + timedelta(days=1)).isoformat() if last_date else None
+
+
+def load_state(state_path: str = STATE_PATH) -> dict:
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def plan_build(
+    full: bool = False,
+    validate_from: str = None,
+    duckdb_path: str = DUCKDB_PATH,
+    state_path: str = STATE_PATH
+) -> BuildPlan:
+    """
+    Decide what the next ``dbt build`` has to rebuild and whether relationship tests are due.
+
+    Args:
+        full: Build everything and run the relationship tests regardless of the state
+        validate_from: First day to test in the version downloads tables, by default the day after the last loaded one
+    """
+    state = load_state(state_path)
+    plan = BuildPlan(
+        fingerprints=source_fingerprints(duckdb_path),
+        project_hash=project_hash(),
+        rebuild_dates=sorted(state.get('rebuild_dates', [])),
+    )
+
+    last_tests = state.get('relationship_tests_at')
+    plan.run_relationship_tests = full or last_tests is None or (
+        datetime.now(timezone.utc) - datetime.fromisoformat(last_tests) >= timedelta(days=RELATIONSHIP_TESTS_EVERY_DAYS)
+    )
+
+    if not plan.run_relationship_tests:
+        plan.validate_from = validate_from or first_unbuilt_date(duckdb_path)
+
+    if full:
+        plan.reason = "full build requested"
+    elif not state.get('sources'):
+        plan.reason = "no previous build state"
+    elif state.get('project_hash') != plan.project_hash:
+        plan.reason = "dbt project changed"
+    else:
+        previous = state['sources']
+        plan.changed_sources = sorted(
+            table for table, fingerprint in plan.fingerprints.items() if previous.get(table) != fingerprint
+        )
+        plan.select = [f"source:raw.{table}+" for table in plan.changed_sources + list(ALWAYS_BUILD_SOURCES)]
+        plan.reason = f"{len(plan.changed_sources)} of {len(plan.fingerprints)} fingerprinted sources changed"
+    return plan
+
+
+def _write_state(state: dict, state_path: str):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def add_rebuild_dates(dates: list, state_path: str = STATE_PATH):
+    """Record days (YYYY-MM-DD) inserted into stg_version_downloads outside dbt, for the next build to aggregate."""
+    if not dates:
+        return
+    state = load_state(state_path)
+    state['rebuild_dates'] = sorted(set(state.get('rebuild_dates', [])) | set(dates))
+    _write_state(state, state_path)
+
+
+def save_state(plan: BuildPlan, relationship_tests_ran: bool, state_path: str = STATE_PATH):
+    """Record a successful build, so the next plan only rebuilds what changed after it."""
+    state = load_state(state_path)
+    # Days recorded while the build ran stay pending for the next one
+    state['rebuild_dates'] = sorted(set(state.get('rebuild_dates', [])) - set(plan.rebuild_dates))
+    state['sources'] = plan.fingerprints
+    state['project_hash'] = plan.project_hash
+    state['built_at'] = datetime.now(timezone.utc).isoformat()
+    if relationship_tests_ran:
+        state['relationship_tests_at'] = state['built_at']
+    _write_state(state, state_path)
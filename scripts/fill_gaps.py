@@ -0,0 +1,148 @@
+"""
+Finds and fills missing days in staging.stg_version_downloads.
+
+The dump only carries the last ~90 days and the incremental model only adds
+days after MAX(date), so a pause between updates longer than the dump window,
+or a failed backfill day, leaves holes that nothing else revisits. Missing days
+are found with a calendar anti-join over the covered range: every day between
+the first loaded day and the last loaded or incoming dump day (raw days the
+next incremental build adds) that has no rows. Days compacted into the
+weekly/monthly rollups count as loaded. They are then fetched from the
+archives concurrently, or read from the local archive mirror, and inserted.
+
+A coverage report is printed and written to data/version_downloads_coverage.json:
+
+    uv run scripts/fill_gaps.py                 # detect, fill, report
+    uv run scripts/fill_gaps.py --report-only   # detect and report
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import runtime_config
+from archive_ingest import KNOWN_MISSING_DATES, ingest_archive_days
+from archive_mirror import ArchiveMirror
+from compact_version_downloads import compacted_days_sql
+from run_metrics import stage
+
+COVERAGE_PATH = 'data/version_downloads_coverage.json'
+
+MISSING_DATES_SQL = """
+    WITH loaded AS (
+        SELECT DISTINCT date FROM staging.stg_version_downloads
+        UNION
+        {compacted_days}
+    ),
+    incoming AS (
+        -- Dump days the incremental model adds on the next dbt build
+        SELECT DISTINCT date::DATE AS date FROM raw.version_downloads
+        WHERE date::DATE > (SELECT MAX(date) FROM loaded) AND date < date_trunc('day', now())
+    ),
+    covered AS (
+        SELECT date FROM loaded UNION SELECT date FROM incoming
+    ),
+    calendar AS (
+        SELECT range::DATE AS date
+        FROM range((SELECT MIN(date) FROM covered), (SELECT MAX(date) FROM covered) + INTERVAL 1 DAY, INTERVAL 1 DAY)
+    )
+    SELECT
+        (SELECT MIN(date) FROM covered) AS first_day,
+        (SELECT MAX(date) FROM covered) AS last_day,
+        list(c.date ORDER BY c.date) FILTER (WHERE c.date IS NOT NULL) AS missing
+    FROM calendar c
+    ANTI JOIN covered USING (date)
+"""
+
+
+def find_missing_dates(duckdb_con) -> tuple:
+    """(first covered day, last covered day, missing days as YYYY-MM-DD), days crates.io never published excluded."""
+    sql = MISSING_DATES_SQL.format(compacted_days=compacted_days_sql(duckdb_con))
+    first_day, last_day, missing = duckdb_con.execute(sql).fetchone()
+    missing = [day.isoformat() for day in missing or [] if day.isoformat() not in KNOWN_MISSING_DATES]
+    return first_day, last_day, missing
+
+
+def _ranges(days: list) -> list:
+    """Consecutive days collapsed into [first, last] pairs."""
+    ranges = []
+    for day in days:
+        current = datetime.strptime(day, '%Y-%m-%d').date()
+        if ranges and datetime.strptime(ranges[-1][1], '%Y-%m-%d').date() + timedelta(days=1) == current:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+def coverage_report(first_day, last_day, missing: list, filled: list = (), failed: list = ()) -> dict:
+    expected = (last_day - first_day).days + 1 - sum(
+        1 for day in KNOWN_MISSING_DATES if first_day.isoformat() <= day <= last_day.isoformat()
+    ) if first_day else 0
+    still_missing = [day for day in missing if day not in filled]
+    return {
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'first_day': first_day.isoformat() if first_day else None,
+        'last_day': last_day.isoformat() if last_day else None,
+        'expected_days': expected,
+        'covered_days': expected - len(still_missing),
+        'coverage': round((expected - len(still_missing)) / expected, 6) if expected else None,
+        'filled_days': list(filled),
+        'failed_days': list(failed),
+        'missing_days': still_missing,
+        'missing_ranges': _ranges(still_missing),
+    }
+
+
+def print_report(report: dict):
+    if not report['first_day']:
+        print("No version downloads loaded yet")
+        return
+    print(f"\nVersion downloads coverage: {report['first_day']} to {report['last_day']} ({report['expected_days']} days)")
+    print(f"  Covered: {report['covered_days']} days ({report['coverage']:.2%})")
+    if report['filled_days']:
+        print(f"  Filled now: {len(report['filled_days'])} days")
+    if report['missing_ranges']:
+        ranges = ', '.join(first if first == last else f"{first}..{last}" for first, last in report['missing_ranges'])
+        print(f"  Missing: {len(report['missing_days'])} days ({ranges})")
+    else:
+        print("  ✓ No missing days")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--report-only", action="store_true", help="Only detect missing days and write the coverage report")
+    parser.add_argument("--concurrency", type=int, default=4, help="Archive days downloaded in parallel")
+    parser.add_argument("--mirror", action="store_true", help="Keep downloaded days in the local archive mirror")
+    args = parser.parse_args()
+
+    con = runtime_config.connect("bulk_load", read_only=args.report_only)
+    try:
+        with stage("detect version downloads gaps") as record:
+            first_day, last_day, missing = find_missing_dates(con)
+            record['missing_days'] = len(missing)
+
+        filled, failed = [], []
+        if missing and not args.report_only:
+            print(f"Filling {len(missing)} missing days...")
+            # A day that can't be fetched stays missing and is retried on the next run
+            failed, _ = ingest_archive_days(
+                con,
+                missing,
+                concurrency=args.concurrency,
+                mirror=ArchiveMirror(),
+                write_mirror=args.mirror,
+                stop_on_error=False,
+                stage_prefix="fill gap",
+            )
+            filled = [day for day in missing if day not in failed]
+    finally:
+        con.close()
+
+    report = coverage_report(first_day, last_day, missing, filled, failed)
+    os.makedirs(os.path.dirname(COVERAGE_PATH), exist_ok=True)
+    with open(COVERAGE_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nCoverage report written to {COVERAGE_PATH}")
@@ -0,0 +1,272 @@
+"""
+Shared HTTP client for the downloaders (crates.io dump and version-download archives).
+
+One ``HttpClient`` per process holds a keep-alive ``requests.Session``, so
+consecutive and concurrent fetches from static.crates.io reuse TCP/TLS
+connections. Around every request it applies:
+
+- retries with exponential backoff and full jitter on connection errors,
+  timeouts and 429/5xx responses, honouring ``Retry-After`` when the server sends it
+- a concurrency limit and an optional request rate limit shared by all threads
+- a circuit breaker: after ``failure_threshold`` consecutive failed requests,
+  calls fail fast with ``CircuitOpenError`` for ``reset_seconds``, then a single
+  trial request decides whether to close it again
+
+4xx responses other than 429 are not retried (a missing archive day stays missing).
+
+Example:
+    client = HttpClient(max_concurrency=4)
+    size = client.download("https://static.crates.io/archive/version-downloads/2024-01-01.csv", path)
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "rust-packages-analytics (https://github.com/saidsalihefendic/rust-packages-analytics)"
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` requests per second with bursts of ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets one trial through after ``reset_seconds``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> bool:
+        """Raise CircuitOpenError while open; True when this request is the half-open trial."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_seconds - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_running:
+                raise CircuitOpenError(
+                    f"Circuit open after {self._failures} consecutive failures, retry in {max(remaining, 0):.0f}s"
+                )
+            # Half-open: this request is the trial
+            self._trial_running = True
+            return True
+
+    def end_trial(self):
+        """Let another trial through when the trial request ended without recording a result."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def _retry_after(response) -> float:
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    """
+    Pooled, retrying, rate-limited HTTP client.
+
+    Args:
+        max_retries: Attempts after the first one for retryable failures
+        backoff: Base seconds of the exponential backoff
+        max_backoff: Cap of a single backoff sleep (also caps Retry-After)
+        timeout: (connect, read) timeout in seconds
+        max_concurrency: Requests in flight at once across threads, also the connection pool size
+        rate_per_second: Request starts per second, None for no limit
+        failure_threshold: Consecutive failed requests that open the circuit breaker
+        reset_seconds: How long the circuit stays open before a trial request
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: tuple = (10, 60),
+        max_concurrency: int = 4,
+        rate_per_second: float = None,
+        failure_threshold: int = 5,
+        reset_seconds: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._rate_limiter = RateLimiter(rate_per_second) if rate_per_second else None
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+
+    def _sleep_before_retry(self, attempt: int, response=None):
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        print(f"Retrying in {delay:.1f} seconds...")
+        time.sleep(delay)
+
+    def _attempt(self, method: str, url: str, handle, **kwargs):
+        """Run one attempt, returning (retryable failure response or None, result)."""
+        trial = self.breaker.before_request()
+        try:
+            if self._rate_limiter:
+                self._rate_limiter.acquire()
+            with self._slots:
+                try:
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    self.breaker.record_failure()
+                    raise
+                with response:
+                    if response.status_code in RETRY_STATUSES:
+                        self.breaker.record_failure()
+                        return response, None
+                    # Other client errors are answers, not outages
+                    self.breaker.record_success()
+                    response.raise_for_status()
+                    try:
+                        return None, handle(response)
+                    except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                        self.breaker.record_failure()
+                        raise
+        finally:
+            # Any other exception (e.g. an OSError writing the body) must not leave the breaker open for good
+            if trial:
+                self.breaker.end_trial()
+
+    def request(self, method: str, url: str, handle=None, **kwargs):
+        """
+        Send a request with retries and return ``handle(response)``.
+
+        ``handle`` runs while the connection is held (e.g. to stream the body)
+        and is retried with the request; by default the body is read and the
+        response returned.
+        """
+        if handle is None:
+            def handle(response):
+                response.content  # Read the body before the connection is released
+                return response
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                failed, result = self._attempt(method, url, handle, **kwargs)
+            except CircuitOpenError:
+                raise
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                print(f"Error on attempt {attempt + 1}/{self.max_retries + 1} for {url}: {e}")
+                if attempt == self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            if failed is None:
+                return result
+            print(f"HTTP {failed.status_code} on attempt {attempt + 1}/{self.max_retries + 1} for {url}")
+            if attempt == self.max_retries:
+                failed.raise_for_status()
+            self._sleep_before_retry(attempt, failed)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def download(self, url: str, path, chunk_size: int = 1024 * 1024, progress=None) -> int:
+        """
+        Stream ``url`` to ``path`` and return its size in bytes.
+
+        The body goes to ``<path>.part`` first, so an interrupted download never
+        leaves a truncated file behind.
+
+        Args:
+            progress: Optional callable receiving (bytes written so far, total bytes or 0) after every chunk
+        """
+        part_path = f"{path}.part"
+
+        def write(response):
+            total = int(response.headers.get('content-length', 0))
+            written = 0
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+                    if progress:
+                        progress(written, total)
+            return written
+
+        try:
+            size = self.request("GET", url, handle=write, stream=True)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, path)
+        return size
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,11 +1,13 @@
 # scripts/download_dump.py
-import requests
 from pathlib import Path
 from tqdm import tqdm
 import time
 import tarfile
 import argparse
 
+from http_client import HttpClient
+from run_metrics import stage
+
 def download_dump(url: str, output_file: Path) -> Path:
     data_dir = Path("data/raw")
     data_dir.mkdir(parents=True, exist_ok=True)
@@ -16,18 +18,16 @@ def download_dump(url: str, output_file: Path) -> Path:
     print(f"Downloading: {url}")
     print(f"Output: {output_file.absolute()}\n")
     
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    total_size = int(response.headers.get('content-length', 0))
     start_time = time.time()
     
-    # Progress bar with tqdm
-    with open(output_file, 'wb') as f:
-        with tqdm(total=total_size, unit='B', unit_scale=True, unit_divisor=1024) as pbar:
-            for chunk in response.iter_content(chunk_size=1024*1024):
-                f.write(chunk)
-                pbar.update(len(chunk))
+    # Progress bar with tqdm, restarted from zero if the download is retried
+    with HttpClient(max_concurrency=1, timeout=(10, 300)) as client:
+        with tqdm(unit='B', unit_scale=True, unit_divisor=1024) as pbar:
+            def progress(written, total):
+                pbar.total = total or None
+                pbar.update(written - pbar.n)
+
+            client.download(url, output_file, progress=progress)
     
     elapsed = time.time() - start_time
     size_gb = output_file.stat().st_size / (1024**3)
@@ -81,7 +81,9 @@ if __name__ == "__main__":
     
     # Download unless skipped
     if not args.skip_download:
-        download_dump(url, args.dump_file)
+        with stage("download db-dump.tar.gz") as record:
+            record['bytes'] = download_dump(url, args.dump_file).stat().st_size
     
     # Always extract
-    extract_dump(args.dump_file, args.extract_dir)
+    with stage("extract db-dump.tar.gz"):
+        extract_dump(args.dump_file, args.extract_dir)
@@ -1,51 +1,18 @@
-import duckdb
 import os
-import requests
 from datetime import datetime, timedelta, date
 from pprint import pprint
 import time
-from pathlib import Path
 import argparse
 import sys
 
-from common import retry
+from archive_ingest import KNOWN_MISSING_DATES, ingest_archive_days
+from archive_mirror import ArchiveMirror
+from compact_version_downloads import compacted_days_sql
+import run_metrics
+import runtime_config
+from runtime_config import DUCKDB_PATH
 
-@retry(max_retries=3, backoff=5)
-def download_and_insert(duckdb_con, curr_date_str, csv_path, uri):
-    """
-    Download CSV and insert into DuckDB for a single date
-    Returns (success: bool, file_size: int)
-    """
-
-    print(f"Downloading {curr_date_str}.csv...")
-
-    with requests.get(uri, stream=True) as r:
-        r.raise_for_status()
-        with open(csv_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-    
-    print(f"Downloaded {curr_date_str}.csv, ingesting...")
-
-    query = f"""
-        INSERT INTO staging.stg_version_downloads(version_id, downloads, date)
-        SELECT version_id, downloads, '{curr_date_str}'::DATE as date
-        FROM read_csv_auto('{csv_path}')
-    """
-
-    duckdb_con.execute(query)
-    duckdb_con.execute("CHECKPOINT")
-
-    print(f"Inserted data for {curr_date_str}! Removing from filesystem....\n\n")
-
-    file_size = os.path.getsize(csv_path)
-    os.remove(csv_path)
-
-    return True, file_size
-
-
-DUCKDB_PATH = 'data/crates.duckdb'
-con = duckdb.connect(DUCKDB_PATH)
+con = runtime_config.connect("bulk_load")
 
 # TODO: Storage requirements for the 2019-today analytics
 
@@ -54,17 +21,36 @@ parser = argparse.ArgumentParser()
 parser.add_argument(
         "--backfill-days",
         type=int,
-        help="Backfill for N days starting from min(date) in stg_version_downloads",
+        help="Backfill for N days before the first loaded day (daily or compacted)",
         default=None
 )
 
 parser.add_argument(
         "--backfill-to-date",
         type=str,
-        help="Backfill up to this date starting from min(date) in stg_version_downloads (YYYY-MM-DD format)",
+        help="Backfill up to this date from the first loaded day (daily or compacted) back (YYYY-MM-DD format)",
         default=None
 )
 
+parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Archive days downloaded in parallel (inserts stay sequential, newest day first)",
+        default=4
+)
+
+parser.add_argument(
+        "--mirror",
+        action="store_true",
+        help="Keep every downloaded day in the local archive mirror (data/archive_mirror)"
+)
+
+parser.add_argument(
+        "--no-mirror-read",
+        action="store_true",
+        help="Download every day, even those already in the local archive mirror"
+)
+
 args = parser.parse_args()
 
 # Validate: can't use both
@@ -73,7 +59,14 @@ if args.backfill_days is not None and args.backfill_to_date is not None:
     sys.exit(1)
 
 
-start_date = con.execute("SELECT min(date) FROM staging.stg_version_downloads").fetchone()[0] - timedelta(days=1)
+# Days compacted into the rollups are loaded too, the backfill continues before them
+start_date = con.execute(f"""
+    SELECT MIN(date) FROM (
+        SELECT MIN(date) AS date FROM staging.stg_version_downloads
+        UNION ALL
+        SELECT MIN(date) FROM ({compacted_days_sql(con)})
+    )
+""").fetchone()[0] - timedelta(days=1)
 end_date = start_date - timedelta(days=30)
 
 if args.backfill_to_date is not None:
@@ -87,54 +80,44 @@ elif args.backfill_days is not None:
 
 
 
-ARCHIVE_DIR = 'data/temp'
-
-# Create if not exists dumps folder
-data_dir = Path(ARCHIVE_DIR)
-data_dir.mkdir(parents=True, exist_ok=True)
+# Standalone backfills get their own run report, under setup/update the stages join theirs
+own_run = run_metrics.RUN_ID_ENV not in os.environ
+if own_run:
+    run_metrics.start_run("backfill")
 
 print(f"Backfilling from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
 
-curr_date = start_date
-total_size = 0 # Calculates total size
 first_duckdb_size = os.path.getsize(DUCKDB_PATH)
-prev_duckdb_size = os.path.getsize(DUCKDB_PATH)
 
 start = time.time()
 
-# Exceptions: 2014-11-15 not existing
-exception_dates = [
-    '20141115'
-]
-
+dates = []
+curr_date = start_date
 while curr_date >= end_date:
-    if curr_date.strftime('%Y%m%d') in exception_dates:
-        curr_date -= timedelta(days=1)
-        continue
-        
-    curr_date_str = curr_date.strftime('%Y-%m-%d')
-    csv_path = os.path.join(ARCHIVE_DIR, f'{curr_date_str}.csv')
-    uri = f'https://static.crates.io/archive/version-downloads/{curr_date_str}.csv'
-
-    success, file_size = download_and_insert(con, curr_date_str, csv_path, uri)
-
-    if not success:
-        print(f"BACKFILL ABORTED: Failed to process {curr_date_str}!")
-        con.close()
-        sys.exit(1)
-    
-    # Calculate size and remove the file from the FS
-    total_size += file_size
-    duckdb_size = os.path.getsize(DUCKDB_PATH)
-
+    if curr_date.strftime('%Y-%m-%d') not in KNOWN_MISSING_DATES:
+        dates.append(curr_date.strftime('%Y-%m-%d'))
     curr_date -= timedelta(days=1)
 
-    print(f"Total download size: {total_size / (1024 ** 2)}MB")
-    print(f"DuckDB size: {duckdb_size / (1024 ** 2)}, previous: {prev_duckdb_size / (1024 ** 2)}")
-    print(f"Time elapsed: {time.time() - start}\n")
-    prev_duckdb_size = duckdb_size
+failed, total_size = ingest_archive_days(
+    con,
+    dates,
+    concurrency=args.concurrency,
+    mirror=ArchiveMirror(),
+    read_mirror=not args.no_mirror_read,
+    write_mirror=args.mirror,
+)
+
+if failed:
+    print(f"BACKFILL ABORTED: Failed to process {failed[0]}!")
+    con.close()
+    if own_run:
+        run_metrics.finish_run("failed")
+    sys.exit(1)
 
 con.close()
 
-print(f"Starting DuckDB size: {first_duckdb_size / (1024 ** 2)} -> {prev_duckdb_size / (1024 ** 2)}, total downloaded: {total_size / (1024 ** 2)}")
-print(f"Finished in {time.time() - start}")
\ No newline at end of file
+print(f"Starting DuckDB size: {first_duckdb_size / (1024 ** 2)} -> {os.path.getsize(DUCKDB_PATH) / (1024 ** 2)}, total downloaded: {total_size / (1024 ** 2)}")
+print(f"Finished in {time.time() - start}")
+
+if own_run:
+    run_metrics.finish_run()
\ No newline at end of file
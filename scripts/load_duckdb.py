@@ -1,8 +1,10 @@
-import duckdb
 from pprint import pprint
 import os
 import shutil
 
+import runtime_config
+from run_metrics import stage
+
 def ingest_to_duckdb(duckdb_con, data_dir, csv_file):
     table_name = csv_file.split('.')[0]
 
@@ -17,6 +19,7 @@ def ingest_to_duckdb(duckdb_con, data_dir, csv_file):
     # Verify creation
     result = con.execute(f'SELECT COUNT(*) FROM raw.{table_name}').fetchone()
     pprint(result)
+    return result[0]
 
 # Extracted data dir changes depending on the date fron ingest_dump script
 EXTRACTED_DATA_DIR = "data/raw/extracted"
@@ -31,13 +34,12 @@ csv_files = [path for path in os.listdir(DATA_DIR_PATH) if '.csv' in path]
 
 pprint(csv_files)
 
-DUCKDB_PATH = 'data/crates.duckdb'
-
-con = duckdb.connect(DUCKDB_PATH)
+con = runtime_config.connect("bulk_load")
 
 # Ingest each csv_file into raw_duckdb 
 for csv_file in csv_files:
-    ingest_to_duckdb(con, DATA_DIR_PATH, csv_file)
+    with stage(f"load raw.{csv_file.split('.')[0]}", csv_bytes=os.path.getsize(os.path.join(DATA_DIR_PATH, csv_file))) as record:
+        record['rows'] = ingest_to_duckdb(con, DATA_DIR_PATH, csv_file)
 
 con.close()
 
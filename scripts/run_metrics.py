@@ -0,0 +1,307 @@
+"""
+Stage timing and resource instrumentation for setup/update runs.
+
+Wrap a unit of work in ``stage()`` to record its wall time, CPU time, peak RSS,
+bytes read and written, and how much the DuckDB warehouse file grew:
+
+    with stage("load raw.crates") as record:
+        ...
+        record["rows"] = row_count
+
+Records are appended as JSON lines to the file named by ``RUN_METRICS_FILE``.
+``setup.py`` and ``update.py`` start a run, which sets that variable for every
+script they launch, so per-table, per-day and per-model stages end up in the
+same run. Nested stages name their enclosing stage in ``parent``, including
+across processes. At the end of a run the records are stored in
+``ops.run_stages`` of ``data/run_history.duckdb`` and summarized. The history
+lives in its own file so that writing it doesn't change the warehouse file
+(which would invalidate the dashboard cache) and doesn't need the warehouse
+write lock. When no run is active, stages are measured but not recorded.
+
+CPU, RSS and I/O come from getrusage. They are unavailable on Windows and are
+left empty there. Bytes read and written are block I/O that reached the
+storage layer, so reads served from the page cache don't count.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import duckdb
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from scripts.runtime_config import DUCKDB_PATH  # Imported from setup.py/update.py
+except ImportError:
+    from runtime_config import DUCKDB_PATH
+
+HISTORY_PATH = 'data/run_history.duckdb'
+RUNS_DIR = 'data/runs'
+
+# Set by start_run() and inherited by every script it launches
+RUN_ID_ENV = "RUN_ID"
+RUN_METRICS_FILE_ENV = "RUN_METRICS_FILE"
+RUN_STAGE_ENV = "RUN_STAGE"
+
+# Records of the stages currently open in this process, innermost last
+_open_stages = []
+
+
+def _usage() -> dict:
+    if resource is None:
+        return {}
+    usage = {}
+    for who, prefix in ((resource.RUSAGE_SELF, 'self'), (resource.RUSAGE_CHILDREN, 'children')):
+        ru = resource.getrusage(who)
+        usage[f'{prefix}_cpu'] = ru.ru_utime + ru.ru_stime
+        usage[f'{prefix}_blocks_in'] = ru.ru_inblock
+        usage[f'{prefix}_blocks_out'] = ru.ru_oublock
+        usage[f'{prefix}_maxrss'] = ru.ru_maxrss
+    return usage
+
+
+def _rss_mb(maxrss: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def _warehouse_size(duckdb_path: str) -> int:
+    return sum(os.path.getsize(path) for path in (duckdb_path, f"{duckdb_path}.wal") if os.path.exists(path))
+
+
+def _append(record: dict):
+    metrics_file = os.environ.get(RUN_METRICS_FILE_ENV)
+    if not metrics_file:
+        return
+    with open(metrics_file, 'a') as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def stage(name: str, duckdb_path: str = DUCKDB_PATH, **attrs):
+    """
+    Measure a block of work and record it in the active run.
+
+    Args:
+        name: Stage name, e.g. "load raw.crates"
+        duckdb_path: Warehouse file whose growth is recorded
+        **attrs: Extra values stored with the stage; more can be added to the yielded dict
+    """
+    record = {
+        'run_id': os.environ.get(RUN_ID_ENV),
+        'stage': name,
+        'parent': os.environ.get(RUN_STAGE_ENV),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'status': 'ok',
+        **attrs,
+    }
+    before = _usage()
+    size_before = _warehouse_size(duckdb_path)
+    start = time.perf_counter()
+
+    os.environ[RUN_STAGE_ENV] = name
+    _open_stages.append(record)
+    try:
+        yield record
+    except BaseException:
+        record['status'] = 'failed'
+        raise
+    finally:
+        _open_stages.pop()
+        if record['parent'] is None:
+            os.environ.pop(RUN_STAGE_ENV, None)
+        else:
+            os.environ[RUN_STAGE_ENV] = record['parent']
+
+        after = _usage()
+        record['wall_seconds'] = round(time.perf_counter() - start, 3)
+        record['duckdb_growth_bytes'] = _warehouse_size(duckdb_path) - size_before
+        if after:
+            delta = {key: after[key] - before[key] for key in after if not key.endswith('maxrss')}
+            record['cpu_seconds'] = round(delta['self_cpu'] + delta['children_cpu'], 3)
+            record['read_bytes'] = (delta['self_blocks_in'] + delta['children_blocks_in']) * 512
+            record['write_bytes'] = (delta['self_blocks_out'] + delta['children_blocks_out']) * 512
+            # Process-wide high-water mark, or the exact peak of the subprocesses this stage ran
+            record['peak_rss_mb'] = round(_rss_mb(max(after['self_maxrss'], record.pop('child_maxrss', 0))), 1)
+        _append(record)
+
+
+def run_process(cmd: list, cwd: str = None, env: dict = None) -> int:
+    """
+    Run a command to completion and return its exit code.
+
+    ``env`` adds to (or overrides) this process's environment for the command.
+    Inside a stage the command's own peak RSS is recorded. The ``RUSAGE_CHILDREN``
+    high-water mark can't give this, because it covers every child so far.
+    """
+    process = subprocess.Popen(cmd, cwd=cwd, env={**os.environ, **env} if env else None)
+    if not hasattr(os, 'wait4'):
+        return process.wait()
+
+    try:
+        _, status, ru = os.wait4(process.pid, 0)
+    except KeyboardInterrupt:
+        process.kill()
+        process.wait()
+        raise
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if _open_stages:
+        _open_stages[-1]['child_maxrss'] = max(_open_stages[-1].get('child_maxrss', 0), ru.ru_maxrss)
+    return process.returncode
+
+
+def record_dbt_results(run_results_path: str = "transformations/target/run_results.json"):
+    """Add one stage per model, test and snapshot from dbt's run_results.json to the active run."""
+    if not os.path.exists(run_results_path):
+        return
+    # A failed invocation may leave the previous run's results behind
+    if _open_stages:
+        modified = datetime.fromtimestamp(os.path.getmtime(run_results_path), timezone.utc)
+        if modified < datetime.fromisoformat(_open_stages[-1]['started_at']):
+            return
+    with open(run_results_path) as f:
+        run_results = json.load(f)
+
+    parent = os.environ.get(RUN_STAGE_ENV) or f"dbt {run_results.get('args', {}).get('which', 'run')}"
+    for result in run_results.get('results', []):
+        # model.<project>.<name>, test.<project>.<name>.<hash>, ...
+        resource_type, _, node_name = result['unique_id'].split('.')[:3]
+        started_at = next((timing['started_at'] for timing in result.get('timing', []) if timing['name'] == 'execute'), None)
+        _append({
+            'run_id': os.environ.get(RUN_ID_ENV),
+            'stage': f"dbt {resource_type} {node_name}",
+            'parent': parent,
+            'started_at': started_at,
+            'status': result['status'],
+            'wall_seconds': round(result['execution_time'], 3),
+            'rows_affected': (result.get('adapter_response') or {}).get('rows_affected'),
+            'thread_id': result.get('thread_id'),
+        })
+
+
+def start_run(kind: str) -> str:
+    """Start a run whose stages, in this process and every child, go to a fresh metrics file."""
+    run_id = f"{kind}-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+    Path(RUNS_DIR).mkdir(parents=True, exist_ok=True)
+    os.environ[RUN_ID_ENV] = run_id
+    os.environ[RUN_METRICS_FILE_ENV] = os.path.abspath(os.path.join(RUNS_DIR, f"{run_id}.jsonl"))
+    os.environ.pop(RUN_STAGE_ENV, None)
+    return run_id
+
+
+STAGE_COLUMNS = {
+    'run_id': 'VARCHAR',
+    'stage': 'VARCHAR',
+    'parent': 'VARCHAR',
+    'started_at': 'TIMESTAMPTZ',
+    'status': 'VARCHAR',
+    'wall_seconds': 'DOUBLE',
+    'cpu_seconds': 'DOUBLE',
+    'peak_rss_mb': 'DOUBLE',
+    'read_bytes': 'BIGINT',
+    'write_bytes': 'BIGINT',
+    'duckdb_growth_bytes': 'BIGINT',
+    'attrs': 'JSON',
+}
+
+
+def finish_run(status: str = 'ok', history_path: str = HISTORY_PATH) -> list:
+    """Store the active run's stages in ``ops.run_stages``, print a summary and return the records."""
+    metrics_file = os.environ.get(RUN_METRICS_FILE_ENV)
+    if not metrics_file or not os.path.exists(metrics_file):
+        return []
+    run_id = os.environ[RUN_ID_ENV]
+    with open(metrics_file) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    rows = []
+    for record in records:
+        attrs = {key: value for key, value in record.items() if key not in STAGE_COLUMNS}
+        rows.append([record.get(column) for column in STAGE_COLUMNS if column != 'attrs'] + [json.dumps(attrs, default=str)])
+
+    con = duckdb.connect(history_path)
+    try:
+        con.execute("CREATE SCHEMA IF NOT EXISTS ops")
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS ops.run_stages (
+                {', '.join(f'{column} {data_type}' for column, data_type in STAGE_COLUMNS.items())}
+            )
+        """)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS ops.runs (
+                run_id VARCHAR PRIMARY KEY,
+                status VARCHAR,
+                finished_at TIMESTAMPTZ,
+                wall_seconds DOUBLE
+            )
+        """)
+        if rows:
+            con.executemany(f"INSERT INTO ops.run_stages VALUES ({', '.join('?' * len(STAGE_COLUMNS))})", rows)
+        wall_seconds = sum(record.get('wall_seconds') or 0 for record in records if record.get('parent') is None)
+        con.execute("INSERT OR REPLACE INTO ops.runs VALUES (?, ?, ?, ?)", [run_id, status, datetime.now(timezone.utc), wall_seconds])
+        previous = con.execute("""
+            SELECT run_id, wall_seconds FROM ops.runs
+            WHERE run_id < ? AND split_part(run_id, '-', 1) = split_part(?, '-', 1) AND status = 'ok'
+            ORDER BY run_id DESC LIMIT 1
+        """, [run_id, run_id]).fetchone()
+    finally:
+        con.close()
+
+    print_summary(run_id, records, previous)
+    return records
+
+
+def _fmt_bytes(value) -> str:
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024:
+            return f"{value:.0f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TB"
+
+
+def print_summary(run_id: str, records: list, previous: tuple = None, slowest: int = 10):
+    """Print the top-level stages of a run and its slowest nested stages."""
+    def row(record):
+        cpu = record.get('cpu_seconds')
+        rss = record.get('peak_rss_mb')
+        return (
+            f"  {record['stage'][:44]:<44} {record.get('status', ''):<7} {record.get('wall_seconds') or 0:>9.1f}s "
+            f"{'-' if cpu is None else f'{cpu:.1f}s':>9} {'-' if rss is None else f'{rss:.0f}MB':>8} "
+            f"{_fmt_bytes(record.get('read_bytes')):>8} {_fmt_bytes(record.get('write_bytes')):>8} "
+            f"{_fmt_bytes(record.get('duckdb_growth_bytes')):>8}"
+        )
+
+    header = f"  {'stage':<44} {'status':<7} {'wall':>10} {'cpu':>9} {'rss':>8} {'read':>8} {'written':>8} {'db +/-':>8}"
+    top_level = [record for record in records if record.get('parent') is None]
+    nested = sorted(
+        (record for record in records if record.get('parent') is not None),
+        key=lambda record: record.get('wall_seconds') or 0,
+        reverse=True
+    )
+
+    print(f"\nRun report {run_id}")
+    print(header)
+    for record in top_level:
+        print(row(record))
+    total = sum(record.get('wall_seconds') or 0 for record in top_level)
+    print(f"  {'total':<52} {total:>9.1f}s")
+    if previous:
+        print(f"  previous run {previous[0]}: {previous[1]:.1f}s ({total - previous[1]:+.1f}s)")
+
+    if nested:
+        print(f"\nSlowest {min(slowest, len(nested))} of {len(nested)} nested stages")
+        print(header)
+        for record in nested[:slowest]:
+            print(row(record))
+    print(f"\nStored in ops.run_stages of {HISTORY_PATH}\n")
@@ -0,0 +1,151 @@
+"""
+Runtime configuration shared by every entry point: where the warehouse is and
+how much of the machine DuckDB may use for each kind of work.
+
+Connections are opened with ``connect(workload)``, which applies one of the
+workload presets below, sized from the cores and memory available to the
+process (CPU affinity and a cgroup memory limit count, so a container is sized
+by its own limits, not the host's):
+
+- ``bulk_load``: raw dump loads, archive backfills and gap fills. Every core and
+  75% of memory; insertion order is not preserved, so large CREATE TABLE AS and
+  INSERT ... SELECT statements run in parallel without buffering rows to keep
+  their order (ORDER BY is still honoured).
+- ``dbt_build``: the same sizing for dbt, which reads it from the environment
+  variables returned by ``dbt_environment()`` (see ``transformations/profiles.yml``).
+- ``interactive``: the MCP servers and the dashboard. They are read-only and
+  often run next to each other or to an update, so they get half the cores and
+  25% of memory, and keep insertion order for stable unordered results.
+
+Every connection spills to its own directory under ``data/tmp/duckdb`` (DuckDB
+removes it on close), so concurrent processes never share temp files.
+
+Environment overrides, applied to every workload:
+    CRATES_DUCKDB_PATH: Warehouse file (absolute path), default data/crates.duckdb
+    DUCKDB_THREADS, DUCKDB_MEMORY_LIMIT: e.g. 8 and 16GB
+    DUCKDB_TEMP_DIRECTORY: Parent directory of the spill directories
+    DBT_THREADS: dbt threads, by default the widest level of the model DAG
+
+Example:
+    con = runtime_config.connect("bulk_load")
+    uv run scripts/runtime_config.py   # print every preset for this machine
+"""
+
+import os
+from dataclasses import dataclass
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUCKDB_PATH = os.environ.get("CRATES_DUCKDB_PATH", os.path.join(PROJECT_ROOT, "data", "crates.duckdb"))
+TEMP_DIRECTORY = os.environ.get("DUCKDB_TEMP_DIRECTORY", os.path.join(PROJECT_ROOT, "data", "tmp", "duckdb"))
+
+DEFAULT_DBT_THREADS = 4
+# Below this DuckDB can't hold the hash tables of the larger joins, even when spilling
+MIN_MEMORY_MB = 256
+
+
+@dataclass(frozen=True)
+class Workload:
+    memory_fraction: float  # Share of available memory for DuckDB's buffer pool
+    cpu_fraction: float  # Share of available cores for DuckDB threads
+    preserve_insertion_order: bool
+
+
+WORKLOADS = {
+    'bulk_load': Workload(memory_fraction=0.75, cpu_fraction=1.0, preserve_insertion_order=False),
+    'dbt_build': Workload(memory_fraction=0.75, cpu_fraction=1.0, preserve_insertion_order=False),
+    'interactive': Workload(memory_fraction=0.25, cpu_fraction=0.5, preserve_insertion_order=True),
+}
+
+
+def cpu_count() -> int:
+    """Cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS, Windows
+        return os.cpu_count() or 1
+
+
+def memory_bytes():
+    """Physical memory, or the cgroup memory limit when it is lower; None if unknown."""
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):  # Windows
+        memory = None
+    # cgroup v2, then v1; "max" or an unset v1 limit (a huge number) means no limit
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit() and (memory is None or int(limit) < memory):
+            memory = int(limit)
+        break
+    return memory
+
+
+def temp_directory(workload: str) -> str:
+    return os.path.join(TEMP_DIRECTORY, f"{workload}-{os.getpid()}")
+
+
+def settings(workload: str) -> dict:
+    """DuckDB configuration of a workload preset, overrides from the environment included."""
+    preset = WORKLOADS[workload]
+    config = {
+        'threads': int(os.environ.get("DUCKDB_THREADS") or max(1, int(cpu_count() * preset.cpu_fraction))),
+        'temp_directory': temp_directory(workload),
+        'preserve_insertion_order': preset.preserve_insertion_order,
+    }
+    memory = memory_bytes()
+    if os.environ.get("DUCKDB_MEMORY_LIMIT"):
+        config['memory_limit'] = os.environ["DUCKDB_MEMORY_LIMIT"]
+    elif memory:
+        config['memory_limit'] = f"{max(MIN_MEMORY_MB, int(memory * preset.memory_fraction / 1024 ** 2))}MB"
+    return config
+
+
+def connect(workload: str, read_only: bool = False, duckdb_path: str = None) -> "duckdb.DuckDBPyConnection":
+    """
+    Open the warehouse with a workload preset.
+
+    DuckDB refuses a second connection to the same file with a different
+    configuration, so one process uses one workload per database file.
+    """
+    # Imported here so the MCP servers can answer their handshake before DuckDB is loaded
+    import duckdb
+
+    os.makedirs(TEMP_DIRECTORY, exist_ok=True)
+    return duckdb.connect(duckdb_path or DUCKDB_PATH, read_only=read_only, config=settings(workload))
+
+
+def dbt_environment(dag_width: int = None) -> dict:
+    """
+    Environment for dbt invocations, read by ``transformations/profiles.yml``.
+
+    dbt threads are capped at ``dag_width``, the widest level of the model DAG:
+    more threads than models that can run at once only add contention.
+    """
+    config = settings('dbt_build')
+    environment = {
+        "CRATES_DUCKDB_PATH": os.path.abspath(DUCKDB_PATH),
+        "DBT_THREADS": os.environ.get("DBT_THREADS") or str(max(1, min(cpu_count(), dag_width or DEFAULT_DBT_THREADS))),
+        "DUCKDB_THREADS": str(config['threads']),
+        "DUCKDB_TEMP_DIRECTORY": config['temp_directory'],
+        "DUCKDB_PRESERVE_INSERTION_ORDER": str(config['preserve_insertion_order']).lower(),
+    }
+    if 'memory_limit' in config:
+        environment["DUCKDB_MEMORY_LIMIT"] = config['memory_limit']
+    return environment
+
+
+if __name__ == "__main__":
+    memory = memory_bytes()
+    print(f"Warehouse: {DUCKDB_PATH}")
+    print(f"Cores: {cpu_count()}, memory: {f'{memory / 1024 ** 3:.1f}GB' if memory else 'unknown'}")
+    for name in WORKLOADS:
+        config = settings(name)
+        print(
+            f"  {name}: threads={config['threads']}, memory_limit={config.get('memory_limit', 'DuckDB default')}, "
+            f"preserve_insertion_order={config['preserve_insertion_order']}"
+        )
+    print(f"Spill directories under {TEMP_DIRECTORY}")
@@ -7,6 +7,9 @@ import shutil
 import platform
 from pathlib import Path
 
+from scripts import dbt_plan, run_metrics, runtime_config
+from scripts.run_metrics import stage
+
 VERSION = "1.0"
 LAST_UPDATED = "2025-12-02"
 
@@ -56,10 +59,10 @@ def check_prerequisites():
     
     log_info("All prerequisites satisfied")
 
-def run_command(cmd, cwd=None):
+def run_command(cmd, cwd=None, env=None):
     """Run command and exit on failure"""
-    result = subprocess.run(cmd, cwd=cwd, shell=False)
-    if result.returncode != 0:
+    returncode = run_metrics.run_process(cmd, cwd=cwd, env=env)
+    if returncode != 0:
         log_error(f"Command failed: {' '.join(cmd)}")
         sys.exit(1)
 
@@ -79,6 +82,7 @@ def main():
     print("  2. Create DuckDB schemas")
     print("  3. Load 3 months of data (will take ~6GB of storage)")
     print("  4. Run dbt transformations and tests")
+    print("  5. Create the tiered version downloads view (older days are compacted by updates)")
     print("\nEstimated time: 5-15 minutes with crates.io dump db download\n")
     
     # Check if we should skip download
@@ -92,32 +96,54 @@ def main():
     
     check_prerequisites()
     
-    print()
-    log_info("[1/4] Downloading and extracting crates.io database dump...")
-    cmd = ["uv", "run", "scripts/ingest_dump.py"]
-    if skip_download:
-        cmd.append("--skip-download")
-    run_command(cmd)
-    
-    print()
-    log_info("[2/4] Creating DuckDB database with schemas...")
-    run_command(["uv", "run", "scripts/create_duckdb.py"])
-    
-    print()
-    log_info("[3/4] Loading data into DuckDB...")
-    run_command(["uv", "run", "scripts/load_duckdb.py"])
-    
-    print()
-    log_info("[4/4] Running dbt transformations and tests...")
-    run_command(["uv", "run", "dbt", "build", "--profiles-dir", "."], cwd="transformations")
-    
+    # Every stage below, and the stages inside each script, go into one run report
+    run_metrics.start_run("setup")
+    status = "failed"
+    try:
+        print()
+        log_info("[1/5] Downloading and extracting crates.io database dump...")
+        cmd = ["uv", "run", "scripts/ingest_dump.py"]
+        if skip_download:
+            cmd.append("--skip-download")
+        with stage("download dump"):
+            run_command(cmd)
+
+        print()
+        log_info("[2/5] Creating DuckDB database with schemas...")
+        with stage("create database"):
+            run_command(["uv", "run", "scripts/create_duckdb.py"])
+
+        print()
+        log_info("[3/5] Loading data into DuckDB...")
+        with stage("load raw tables"):
+            run_command(["uv", "run", "scripts/load_duckdb.py"])
+
+        print()
+        log_info("[4/5] Running dbt transformations and tests...")
+        # Everything is built, the plan only supplies resource settings and the state for updates
+        plan = dbt_plan.plan_build(full=True)
+        dbt_env = runtime_config.dbt_environment(dbt_plan.dag_width())
+        with stage("dbt build"):
+            try:
+                run_command(["uv", "run", "dbt", "build", "--profiles-dir", "."], cwd="transformations", env=dbt_env)
+            finally:
+                run_metrics.record_dbt_results()
+        dbt_plan.save_state(plan, relationship_tests_ran=True)
+
+        print()
+        log_info("[5/5] Creating the version downloads rollups and tiered view...")
+        with stage("version downloads retention"):
+            run_command(["uv", "run", "scripts/compact_version_downloads.py"])
+        status = "ok"
+    finally:
+        run_metrics.finish_run(status)
+
     print("\n" + "="*40)
     print(f"{Colors.GREEN}Setup Complete!{Colors.NC}")
     print("="*40 + "\n")
     
-    db_path = Path.cwd() / "crates.duckdb"
     print(f"Your database is ready with 3 months of data.")
-    print(f"Location of DuckDB path: {db_path}\n")
+    print(f"Location of DuckDB path: {runtime_config.DUCKDB_PATH}\n")
     print("Next steps:")
     print("  - Query data:    use DuckDB CLI or any database tool (DBeaver, DataGrip, etc.)")
     print()
@@ -0,0 +1,25 @@
+-- macros/date_partitions_strategy.sql
+-- Custom incremental strategy `date_partitions`: every day (the `partition_by`
+-- column, default `date`) present in the new batch is deleted from the target
+-- and the batch is appended. Reloading a day costs O(rows in that day) and is
+-- idempotent, without the full-key join of unique_key merges. The day bounds
+-- are inlined as literals so DuckDB prunes the delete with its zonemaps.
+-- scripts/common.py replaces archive days the same way.
+
+{% macro get_incremental_date_partitions_sql(arg_dict) -%}
+    {%- set target = arg_dict['target_relation'] -%}
+    {%- set source = arg_dict['temp_relation'] -%}
+    {%- set partition_by = config.get('partition_by', 'date') -%}
+    {%- set dest_cols_csv = get_quoted_csv(arg_dict['dest_columns'] | map(attribute='name')) -%}
+    {%- set bounds = run_query('SELECT MIN(' ~ partition_by ~ ')::VARCHAR, MAX(' ~ partition_by ~ ')::VARCHAR FROM ' ~ source) -%}
+    {%- set first_day, last_day = bounds.rows[0][0], bounds.rows[0][1] -%}
+
+    {% if first_day is not none %}
+    DELETE FROM {{ target }}
+    WHERE {{ partition_by }} BETWEEN '{{ first_day }}'::DATE AND '{{ last_day }}'::DATE
+        AND {{ partition_by }} IN (SELECT DISTINCT {{ partition_by }} FROM {{ source }});
+    {% endif %}
+
+    INSERT INTO {{ target }} ({{ dest_cols_csv }})
+    SELECT {{ dest_cols_csv }} FROM {{ source }}
+{%- endmacro %}
@@ -0,0 +1,10 @@
+-- macros/generate_schema_name.sql
+-- Use custom schemas as-is (marts models land in `marts`, not `staging_marts`)
+
+{% macro generate_schema_name(custom_schema_name, node) -%}
+    {%- if custom_schema_name is none -%}
+        {{ target.schema }}
+    {%- else -%}
+        {{ custom_schema_name | trim }}
+    {%- endif -%}
+{%- endmacro %}
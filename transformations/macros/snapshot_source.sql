@@ -0,0 +1,33 @@
+-- macros/snapshot_source.sql
+-- Source query of the raw table snapshots: the table without its `exclude`d
+-- columns, plus `row_hash`, an MD5 (UHUGEINT, from md5_number) of every kept column. Snapshots
+-- use the check strategy on `row_hash` alone, so detecting a change compares
+-- one 16-byte value per row instead of every column. Columns are hashed as
+-- text joined by a unit separator, NULLs as '\0' and timestamps as epoch
+-- microseconds (independent of the session time zone); this is several times
+-- faster than hashing the row cast to a struct string. DuckDB's own hash() is
+-- faster still but not stable across DuckDB versions, and a changed hash would
+-- store a new copy of every row.
+
+{% macro snapshot_source(relation, exclude=[]) -%}
+    {%- set hashed = [] -%}
+    {%- if execute -%}
+        {%- for column in adapter.get_columns_in_relation(relation) if column.name not in exclude -%}
+            {%- set name = adapter.quote(column.name) -%}
+            {%- if 'TIME ZONE' in column.dtype | upper -%}
+                {%- do hashed.append('coalesce(epoch_us(' ~ name ~ ')::VARCHAR, chr(0))') -%}
+            {%- else -%}
+                {%- do hashed.append('coalesce(' ~ name ~ '::VARCHAR, chr(0))') -%}
+            {%- endif -%}
+        {%- endfor -%}
+    {%- endif -%}
+
+    SELECT
+        *{% if exclude %} EXCLUDE ({{ exclude | join(', ') }}){% endif %},
+        {% if hashed -%}
+        md5_number(concat_ws(chr(31), {{ hashed | join(', ') }}))
+        {%- else -%}
+        NULL::UHUGEINT
+        {%- endif %} AS row_hash
+    FROM {{ relation }}
+{%- endmacro %}
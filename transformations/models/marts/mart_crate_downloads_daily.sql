@@ -0,0 +1,40 @@
+{{ config(
+    materialized='incremental',
+    on_schema_change='fail',
+    incremental_strategy='date_partitions',
+    partition_by='date'
+) }}
+
+-- Daily downloads rolled up from versions to crates. Aggregating first keeps the
+-- join against stg_versions on the reduced (version_id, date) set instead of raw rows.
+-- Orphan version IDs (no matching stg_versions row) are dropped here.
+
+WITH daily AS (
+    SELECT
+        version_id,
+        date,
+        downloads
+    FROM {{ ref('stg_version_downloads') }}
+    {% if is_incremental() %}
+    -- Only days after the last one in the mart, plus days loaded behind it since the last
+    -- build (backfilled or gap-filled archive days, see scripts/dbt_plan.py) and reloaded days.
+    -- Range and literal predicates prune with zonemaps instead of scanning the fact table.
+    WHERE date > COALESCE((SELECT MAX(date) FROM {{ this }}), '1970-01-01'::DATE)
+    {% if var('vd_rebuild_dates', []) %}
+        OR date IN ({% for day in var('vd_rebuild_dates') %}'{{ day }}'::DATE{{ ', ' if not loop.last }}{% endfor %})
+    {% endif %}
+    {% if var('vd_reload_from', none) %}
+        OR date BETWEEN '{{ var('vd_reload_from') }}' AND '{{ var('vd_reload_to', var('vd_reload_from')) }}'
+    {% endif %}
+    {% endif %}
+)
+
+SELECT
+    v.crate_id,
+    d.date,
+    SUM(d.downloads)::BIGINT AS downloads,
+    COUNT(*)::BIGINT AS versions_downloaded
+FROM daily d
+JOIN {{ ref('stg_versions') }} v ON v.id = d.version_id
+GROUP BY v.crate_id, d.date
+ORDER BY d.date, v.crate_id
@@ -0,0 +1,62 @@
+{{ config(materialized='table') }}
+
+-- One row per crate with its keyword and category memberships as sorted arrays
+-- and its downloads over fixed trailing windows, so filters over any
+-- combination of facets are a single scan with list_has_all/list_has_any and
+-- no joins. A crate is also a member of the parents of its categories
+-- ("Web programming::HTTP client" adds "Web programming"), as on crates.io.
+-- Windows end at the latest loaded day, like the top_crates MCP tool.
+
+WITH keywords AS (
+    SELECT ck.crate_id, list(DISTINCT k.keyword ORDER BY k.keyword) AS keywords
+    FROM {{ ref('stg_crates_keywords') }} ck
+    JOIN {{ ref('stg_keywords') }} k ON k.id = ck.keyword_id
+    GROUP BY ck.crate_id
+),
+
+category_paths AS (
+    SELECT
+        cc.crate_id,
+        unnest(list_transform(
+            range(1, len(string_split(c.category, '::')) + 1),
+            depth -> array_to_string(string_split(c.category, '::')[1:depth], '::')
+        )) AS category
+    FROM {{ ref('stg_crates_categories') }} cc
+    JOIN {{ ref('stg_categories') }} c ON c.id = cc.category_id
+),
+
+categories AS (
+    SELECT crate_id, list(DISTINCT category ORDER BY category) AS categories
+    FROM category_paths
+    GROUP BY crate_id
+),
+
+recent AS (
+    SELECT
+        crate_id,
+        SUM(downloads) FILTER (WHERE date > latest - 7)::BIGINT AS downloads_7d,
+        SUM(downloads) FILTER (WHERE date > latest - 30)::BIGINT AS downloads_30d,
+        SUM(downloads) FILTER (WHERE date > latest - 90)::BIGINT AS downloads_90d,
+        SUM(downloads)::BIGINT AS downloads_365d
+    FROM {{ ref('mart_crate_downloads_daily') }},
+        (SELECT MAX(date) AS latest FROM {{ ref('mart_crate_downloads_daily') }})
+    WHERE date > latest - 365
+    GROUP BY crate_id
+)
+
+SELECT
+    c.id AS crate_id,
+    c.name,
+    COALESCE(kw.keywords, []::VARCHAR[]) AS keywords,
+    COALESCE(cat.categories, []::VARCHAR[]) AS categories,
+    COALESCE(cd.downloads, 0)::BIGINT AS downloads,
+    COALESCE(r.downloads_7d, 0) AS downloads_7d,
+    COALESCE(r.downloads_30d, 0) AS downloads_30d,
+    COALESCE(r.downloads_90d, 0) AS downloads_90d,
+    COALESCE(r.downloads_365d, 0) AS downloads_365d
+FROM {{ ref('stg_crates') }} c
+LEFT JOIN keywords kw ON kw.crate_id = c.id
+LEFT JOIN categories cat ON cat.crate_id = c.id
+LEFT JOIN {{ ref('stg_crate_downloads') }} cd ON cd.crate_id = c.id
+LEFT JOIN recent r ON r.crate_id = c.id
+ORDER BY c.id
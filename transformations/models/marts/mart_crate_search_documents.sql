@@ -0,0 +1,27 @@
+{{ config(materialized='table') }}
+
+-- One row per crate with what a search needs besides the postings: the
+-- field-weighted document length for BM25 length normalization, and what a
+-- result shows (description, keywords, categories, download stats). Download
+-- stats live here, not in the postings, so the index itself is only rebuilt
+-- when crate text changes.
+
+WITH lengths AS (
+    SELECT crate_id, SUM(tf)::INTEGER AS doc_length
+    FROM {{ ref('mart_crate_search_postings') }}
+    GROUP BY crate_id
+)
+
+SELECT
+    c.id AS crate_id,
+    c.name,
+    c.description,
+    f.keywords,
+    f.categories,
+    COALESCE(l.doc_length, 0) AS doc_length,
+    f.downloads,
+    f.downloads_90d AS recent_downloads
+FROM {{ ref('stg_crates') }} c
+JOIN {{ ref('mart_crate_facets') }} f ON f.crate_id = c.id
+LEFT JOIN lengths l ON l.crate_id = c.id
+ORDER BY c.id
@@ -0,0 +1,45 @@
+{{ config(materialized='table') }}
+
+-- Inverted index for crate search: one row per (term, crate) with the term's
+-- field-weighted frequency (name x3, keywords and categories x2, description x1)
+-- and the crate's weighted length, so BM25 scores are computed from the
+-- matching postings alone. Text is lowercased and split on anything that isn't
+-- [a-z0-9], the same tokenizer mcp/analytics.py applies to queries. Sorted by
+-- term so a search only reads the row groups of its terms.
+
+WITH fields AS (
+    SELECT id AS crate_id, name AS text, 3 AS weight
+    FROM {{ ref('stg_crates') }}
+    UNION ALL
+    SELECT id, description, 1
+    FROM {{ ref('stg_crates') }}
+    UNION ALL
+    SELECT ck.crate_id, k.keyword, 2
+    FROM {{ ref('stg_crates_keywords') }} ck
+    JOIN {{ ref('stg_keywords') }} k ON k.id = ck.keyword_id
+    UNION ALL
+    SELECT cc.crate_id, c.category, 2
+    FROM {{ ref('stg_crates_categories') }} cc
+    JOIN {{ ref('stg_categories') }} c ON c.id = cc.category_id
+),
+
+tokens AS (
+    SELECT crate_id, weight, unnest(regexp_split_to_array(lower(text), '[^a-z0-9]+')) AS term
+    FROM fields
+    WHERE text IS NOT NULL
+),
+
+postings AS (
+    SELECT term, crate_id, SUM(weight)::INTEGER AS tf
+    FROM tokens
+    WHERE term <> '' AND length(term) <= 64
+    GROUP BY term, crate_id
+)
+
+SELECT
+    term,
+    crate_id,
+    tf,
+    SUM(tf) OVER (PARTITION BY crate_id)::INTEGER AS doc_length
+FROM postings
+ORDER BY term, crate_id
@@ -0,0 +1,15 @@
+{{ config(materialized='table') }}
+
+-- Who depends on a crate: dependencies declared by each crate's default version.
+-- Sorted by crate_id so lookups for a single crate only touch a few row groups.
+
+SELECT
+    d.crate_id,
+    dv.crate_id AS dependent_crate_id,
+    d.version_id AS dependent_version_id,
+    d.req,
+    d.kind,
+    d.optional
+FROM {{ ref('stg_dependencies') }} d
+JOIN {{ ref('stg_default_versions') }} dv ON dv.version_id = d.version_id
+ORDER BY d.crate_id, dv.crate_id
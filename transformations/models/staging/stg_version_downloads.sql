@@ -1,7 +1,8 @@
 {{ config(
     materialized='incremental',
     on_schema_change='fail',
-    unique_key=['version_id', 'date']
+    incremental_strategy='date_partitions',
+    partition_by='date'
 ) }}
 
 SELECT
@@ -12,6 +13,11 @@ FROM {{ source('raw', 'version_downloads') }}
 WHERE downloads >= 0
 
 {% if is_incremental() %}
+  {% if var('vd_reload_from', none) %}
+  -- Reload days still in the dump; date_partitions replaces them as a whole
+  AND date::date BETWEEN '{{ var('vd_reload_from') }}' AND '{{ var('vd_reload_to', var('vd_reload_from')) }}'
+  {% else %}
   AND date > (SELECT MAX(date) FROM {{ this }})
+  {% endif %}
   AND date < date_trunc('day', now())
 {% endif %}
\ No newline at end of file
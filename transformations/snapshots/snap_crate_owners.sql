@@ -0,0 +1,15 @@
+{% snapshot snap_crate_owners %}
+
+{{
+    config(
+        schema='snapshots',
+        unique_key=['crate_id', 'owner_id', 'owner_kind'],
+        strategy='check',
+        check_cols=['row_hash'],
+        hard_deletes='invalidate',
+    )
+}}
+
+{{ snapshot_source(source('raw', 'crate_owners')) }}
+
+{% endsnapshot %}
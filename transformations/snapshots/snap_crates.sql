@@ -0,0 +1,18 @@
+-- readme is the bulk of the crates table and updated_at moves with every
+-- published version (already recorded in snap_versions); both are left out so
+-- only metadata changes create a new row.
+{% snapshot snap_crates %}
+
+{{
+    config(
+        schema='snapshots',
+        unique_key='id',
+        strategy='check',
+        check_cols=['row_hash'],
+        hard_deletes='invalidate',
+    )
+}}
+
+{{ snapshot_source(source('raw', 'crates'), exclude=['readme', 'updated_at']) }}
+
+{% endsnapshot %}
@@ -0,0 +1,15 @@
+{% snapshot snap_default_versions %}
+
+{{
+    config(
+        schema='snapshots',
+        unique_key='crate_id',
+        strategy='check',
+        check_cols=['row_hash'],
+        hard_deletes='invalidate',
+    )
+}}
+
+{{ snapshot_source(source('raw', 'default_versions')) }}
+
+{% endsnapshot %}
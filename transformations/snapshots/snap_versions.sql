@@ -0,0 +1,17 @@
+-- downloads changes on every dump without the version changing, so it is left
+-- out of the snapshot (daily downloads are in stg_version_downloads).
+{% snapshot snap_versions %}
+
+{{
+    config(
+        schema='snapshots',
+        unique_key='id',
+        strategy='check',
+        check_cols=['row_hash'],
+        hard_deletes='invalidate',
+    )
+}}
+
+{{ snapshot_source(source('raw', 'versions'), exclude=['downloads']) }}
+
+{% endsnapshot %}
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """update_duckdb.py - Update Crates.io DuckDB with latest data"""
 
-import subprocess
+import argparse
+import json
 import sys
 from pathlib import Path
 
+from scripts import dbt_plan, run_metrics, runtime_config
+from scripts.run_metrics import stage
+
+COVERAGE_PATH = "data/version_downloads_coverage.json"
+
 VERSION = "0.1.0"
 LAST_UPDATED = "2025-12-02"
 
@@ -32,14 +38,22 @@ def log_error(msg):
 def log_warn(msg):
     print(f"{Colors.YELLOW}[WARN]{Colors.NC} {msg}")
 
-def run_command(cmd, cwd=None):
+def run_command(cmd, cwd=None, env=None):
     """Run command and exit on failure"""
-    result = subprocess.run(cmd, cwd=cwd, shell=False)
-    if result.returncode != 0:
+    returncode = run_metrics.run_process(cmd, cwd=cwd, env=env)
+    if returncode != 0:
         log_error(f"Command failed: {' '.join(cmd)}")
         sys.exit(1)
 
 def main():
+    parser = argparse.ArgumentParser(description="Update Crates.io DuckDB with latest data")
+    parser.add_argument(
+        "--full-build",
+        action="store_true",
+        help="Rebuild every dbt model and run the relationship tests, whatever changed"
+    )
+    args = parser.parse_args()
+
     # Ensure we're in project root
     if not Path("pyproject.toml").exists():
         log_error("Must run from project root directory")
@@ -54,32 +68,108 @@ def main():
     print("  1. Download latest crates.io database dump")
     print("  2. Recreate all raw tables from dump (crates, versions, etc.)")
     print("  3. Check the freshness of the updated raw schema")
-    print("  4. Run dbt transformations (incremental mode for version_downloads, others full refresh) and tests")
+    print("  4. Fill missing days in version_downloads from the archives and report coverage")
+    print("  5. Run dbt transformations for the changed sources (incremental mode for version_downloads) and tests")
+    print("  6. Compact version downloads older than the daily retention window into weekly/monthly rollups")
+    print("  7. Warm the dashboard query cache")
     print("\nEstimated time: 5-10 minutes\n")
     
-    print()
-    log_info("[1/4] Downloading latest crates.io database dump...")
-    run_command(["uv", "run", "scripts/ingest_dump.py"])
-    
-    print()
-    log_info("[2/4] Recreating raw tables and loading data into DuckDB...")
-    run_command(["uv", "run", "scripts/load_duckdb.py"])
-    
-    print()
-    log_info("[3/4] Checking the freshness of the raw schema...")
-    run_command(["uv", "run", "dbt", "source", "freshness", "--profiles-dir", "."], cwd="transformations")
-    
-    print()
-    log_info("[4/4] Running dbt transformations (incremental mode for version_downloads, others full refresh) and tests...")
-    run_command(["uv", "run", "dbt", "build", "--profiles-dir", "."], cwd="transformations")
-    
+    # Every stage below, and the stages inside each script, go into one run report
+    run_metrics.start_run("update")
+    status = "failed"
+    # DuckDB resources of the dbt_build preset, passed to the dbt commands only
+    dbt_env = runtime_config.dbt_environment(dbt_plan.dag_width())
+    try:
+        print()
+        log_info("[1/7] Downloading latest crates.io database dump...")
+        with stage("download dump"):
+            run_command(["uv", "run", "scripts/ingest_dump.py"])
+
+        print()
+        log_info("[2/7] Recreating raw tables and loading data into DuckDB...")
+        with stage("load raw tables"):
+            run_command(["uv", "run", "scripts/load_duckdb.py"])
+
+        print()
+        log_info("[3/7] Checking the freshness of the raw schema...")
+        with stage("dbt source freshness"):
+            run_command(["uv", "run", "dbt", "source", "freshness", "--profiles-dir", "."], cwd="transformations", env=dbt_env)
+
+        print()
+        log_info("[4/7] Filling missing days in version_downloads...")
+        last_unbuilt = dbt_plan.first_unbuilt_date()
+        with stage("fill version downloads gaps") as record:
+            run_command(["uv", "run", "scripts/fill_gaps.py"])
+            with open(COVERAGE_PATH) as f:
+                coverage = json.load(f)
+            record.update(filled_days=len(coverage['filled_days']), missing_days=len(coverage['missing_days']))
+        # Filled days can be older than MAX(date), the version downloads tests have to start from the first of them
+        validate_from = min(coverage['filled_days'] + [last_unbuilt]) if last_unbuilt else None
+
+        print()
+        log_info("[5/7] Running dbt transformations (incremental mode for version_downloads) and tests...")
+        with stage("plan dbt build") as record:
+            plan = dbt_plan.plan_build(full=args.full_build, validate_from=validate_from)
+            record.update(
+                {key: value for key, value in dbt_env.items() if key.startswith(("DBT_", "DUCKDB_"))},
+                changed_sources=plan.changed_sources,
+                reason=plan.reason
+            )
+        log_info(
+            f"Build plan: {plan.reason}; dbt threads {dbt_env['DBT_THREADS']}, DuckDB threads {dbt_env['DUCKDB_THREADS']}, "
+            f"memory limit {dbt_env.get('DUCKDB_MEMORY_LIMIT', 'DuckDB default')}"
+        )
+        if plan.select:
+            log_info(f"Selecting {' '.join(plan.select)}")
+        if plan.validate_from:
+            log_info(f"Testing version downloads from {plan.validate_from} on")
+        else:
+            log_info("Full validation: testing every version downloads row")
+
+        with stage("dbt build"):
+            try:
+                run_command(
+                    ["uv", "run", "dbt", "build", "--profiles-dir", ".", *plan.build_args()],
+                    cwd="transformations",
+                    env=dbt_env
+                )
+            finally:
+                run_metrics.record_dbt_results()
+
+        if plan.run_relationship_tests:
+            log_info("Running the scheduled relationship tests...")
+            with stage("dbt relationship tests"):
+                try:
+                    run_command(
+                        ["uv", "run", "dbt", "test", "--profiles-dir", ".", "--select", dbt_plan.RELATIONSHIP_TESTS],
+                        cwd="transformations",
+                        env=dbt_env
+                    )
+                finally:
+                    run_metrics.record_dbt_results()
+        else:
+            log_info(f"Relationship tests are not due (every {dbt_plan.RELATIONSHIP_TESTS_EVERY_DAYS:g} days, or use --full-build)")
+        dbt_plan.save_state(plan, relationship_tests_ran=plan.run_relationship_tests)
+
+        print()
+        log_info("[6/7] Compacting old version downloads...")
+        with stage("version downloads retention"):
+            run_command(["uv", "run", "scripts/compact_version_downloads.py"])
+
+        print()
+        log_info("[7/7] Warming the dashboard query cache...")
+        with stage("warm dashboard cache"):
+            run_command(["uv", "run", "visualization/dashboard_data.py", "--warm"])
+        status = "ok"
+    finally:
+        run_metrics.finish_run(status)
+
     print("\n" + "="*40)
     print(f"{Colors.GREEN}Update Complete!{Colors.NC}")
     print("="*40 + "\n")
     
-    db_path = Path.cwd() / "crates.duckdb"
     print(f"Database updated with latest data.")
-    print(f"Location: {db_path}\n")
+    print(f"Location: {runtime_config.DUCKDB_PATH}\n")
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,422 @@
+"""
+Data layer for the orphan dashboard.
+
+All dashboard queries live here. Every monthly and overall orphan metric
+comes from a single GROUPING SETS scan of the fact table (``orphan_rollup``)
+and the charts are derived from that shared result in pandas. The top-orphans
+list and the yearly comparison have their own scans; the yearly one only runs
+when that section is opened. ``load_concurrently`` runs independent queries
+in parallel on separate cursors and yields results as they finish.
+
+The fact-table scans take a ``Filters`` date range (and optional crate,
+category, keyword or version subset) as bound parameters; by default only the
+last DEFAULT_WINDOW_DAYS days are read, however much history is loaded. Crate
+subsets are resolved on ``marts.mart_crate_facets``, one row per crate with its
+keywords and categories as arrays, so any combination needs no extra joins.
+
+The scans read ``staging.stg_version_downloads_all``, the daily rows plus the
+weekly and monthly rollups older days are compacted into (see
+``scripts/compact_version_downloads.py``). Record counts are daily rows, so they
+add up the same at every grain; a range boundary inside a compacted period
+includes the whole period.
+
+Results are served from memory or an on-disk Parquet cache keyed by a
+warehouse version stamp (size + mtime of the DuckDB file) and the filters, so
+page loads only touch DuckDB after the warehouse or the filters have changed. ``update.py`` warms
+the cache right after a run:
+
+    uv run visualization/dashboard_data.py --warm
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import pandas as pd
+
+# The warehouse path and DuckDB resource presets are shared with the scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import runtime_config
+from runtime_config import DUCKDB_PATH
+from timeseries import GRANULARITY_DAYS, choose_granularity
+
+CACHE_DIR = os.path.join(runtime_config.PROJECT_ROOT, 'data', 'cache', 'dashboard')
+# Filter combinations kept in process; older ones are reread from the Parquet cache
+MEMORY_ENTRIES = int(os.environ.get('DASHBOARD_MEMORY_ENTRIES', 64))
+QUERY_LOG_ENTRIES = 1000
+
+# Sidebar filters as bound parameters, so DuckDB can skip row groups outside the date range
+_FILTER = """
+    vd.date BETWEEN $from_date AND $to_date
+    AND (len($version_ids::BIGINT[]) = 0 OR list_contains($version_ids::BIGINT[], vd.version_id))
+    AND (len($crate_names::VARCHAR[]) + len($categories::VARCHAR[]) + len($keywords::VARCHAR[]) = 0 OR vd.version_id IN (
+        SELECT fv.id
+        FROM staging.stg_versions fv
+        JOIN marts.mart_crate_facets ff ON fv.crate_id = ff.crate_id
+        WHERE (len($crate_names::VARCHAR[]) = 0 OR list_contains($crate_names::VARCHAR[], ff.name))
+          AND list_has_all(ff.categories, $categories::VARCHAR[])
+          AND list_has_all(ff.keywords, $keywords::VARCHAR[])
+    ))
+"""
+
+_ORPHAN_JOINED = f"""
+            SELECT
+                vd.version_id,
+                vd.downloads,
+                vd.days,
+                vd.first_date,
+                vd.last_date,
+                DATE_TRUNC('month', vd.date) AS month,
+                EXTRACT(YEAR FROM vd.date) AS year,
+                v.id IS NULL AS is_orphan
+            FROM staging.stg_version_downloads_all vd
+            LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
+            WHERE {_FILTER}
+        """
+
+_ORPHAN_METRICS = """
+            COALESCE(SUM(days), 0)::BIGINT AS total_records,
+            COALESCE(SUM(days) FILTER (WHERE is_orphan), 0)::BIGINT AS orphan_records,
+            COALESCE(SUM(downloads), 0) AS total_downloads,
+            COALESCE(SUM(downloads) FILTER (WHERE is_orphan), 0) AS orphan_downloads,
+            COUNT(DISTINCT version_id) AS total_version_ids,
+            COUNT(DISTINCT version_id) FILTER (WHERE is_orphan) AS orphan_version_ids,
+            MIN(first_date) FILTER (WHERE is_orphan) AS orphan_earliest,
+            MAX(last_date) FILTER (WHERE is_orphan) AS orphan_latest
+        """
+
+QUERIES = {
+    'date_bounds': """
+        SELECT MIN(first_date) AS min_date, MAX(last_date) AS max_date
+        FROM staging.stg_version_downloads_all
+    """,
+    # Days each rollup grain covers; a chart must not be finer than any grain in its range
+    'rollup_grains': """
+        SELECT grain, MIN(date) AS first_date, MAX(last_date) AS last_date
+        FROM staging.stg_version_downloads_rollup
+        GROUP BY grain
+    """,
+    'counts': """
+        SELECT
+            (SELECT COUNT(*) FROM staging.stg_crates) AS total_crates,
+            (SELECT COUNT(*) FROM staging.stg_versions) AS total_versions
+    """,
+    # One scan of the fact table for every monthly and overall orphan metric
+    'orphan_rollup': f"""
+        WITH joined AS ({_ORPHAN_JOINED})
+        SELECT
+            CASE WHEN GROUPING(month) = 0 THEN 'month' ELSE 'total' END AS grain,
+            month,
+            {_ORPHAN_METRICS}
+        FROM joined
+        GROUP BY GROUPING SETS ((month), ())
+        ORDER BY grain, month
+    """,
+    # Only needed by the yearly comparison, which is loaded on demand
+    'yearly_rollup': f"""
+        WITH joined AS ({_ORPHAN_JOINED})
+        SELECT
+            year,
+            {_ORPHAN_METRICS}
+        FROM joined
+        GROUP BY year
+        ORDER BY year
+    """,
+    'top_orphans': f"""
+        SELECT
+            vd.version_id,
+            SUM(vd.days)::BIGINT as record_count,
+            SUM(vd.downloads) as total_downloads,
+            MIN(vd.first_date) as first_seen,
+            MAX(vd.last_date) as last_seen,
+            MAX(vd.last_date) - MIN(vd.first_date) as days_active
+        FROM staging.stg_version_downloads_all vd
+        ANTI JOIN staging.stg_versions v ON vd.version_id = v.id
+        WHERE {_FILTER}
+        GROUP BY vd.version_id
+        ORDER BY total_downloads DESC
+        LIMIT 30
+    """,
+}
+
+# Valid and orphan downloads per day, week or month, see timeseries.py for which one a chart uses
+for _granularity in GRANULARITY_DAYS:
+    QUERIES[f'downloads_by_{_granularity}'] = f"""
+        SELECT
+            DATE_TRUNC('{_granularity}', vd.date) AS period,
+            COALESCE(SUM(vd.downloads), 0) AS total_downloads,
+            COALESCE(SUM(vd.downloads) FILTER (WHERE v.id IS NULL), 0) AS orphan_downloads
+        FROM staging.stg_version_downloads_all vd
+        LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
+        WHERE {_FILTER}
+        GROUP BY period
+        ORDER BY period
+    """
+
+# Queries that take the Filters parameters
+FILTERED_QUERIES = {'orphan_rollup', 'yearly_rollup', 'top_orphans'} | {
+    f'downloads_by_{granularity}' for granularity in GRANULARITY_DAYS
+}
+
+# Default window when no date range is chosen, counted back from the latest loaded day
+DEFAULT_WINDOW_DAYS = 90
+
+
+@dataclass(frozen=True)
+class Filters:
+    """
+    Date range and optional subsets applied to every filtered query. Crates must
+    match every given subset: a listed name, all the categories and all the keywords.
+    """
+    from_date: date
+    to_date: date
+    crate_names: tuple = ()
+    version_ids: tuple = ()
+    categories: tuple = ()
+    keywords: tuple = ()
+
+    def params(self) -> dict:
+        return {
+            'from_date': self.from_date,
+            'to_date': self.to_date,
+            'crate_names': list(self.crate_names),
+            'version_ids': list(self.version_ids),
+            'categories': list(self.categories),
+            'keywords': list(self.keywords),
+        }
+
+    def key(self) -> str:
+        """Short stable digest used in cache keys."""
+        return hashlib.sha1(json.dumps(self.params(), default=str, sort_keys=True).encode()).hexdigest()[:12]
+
+# (query name, seconds, 'memory', 'cache' or 'duckdb') for the latest load() calls in this process
+QUERY_LOG = deque(maxlen=QUERY_LOG_ENTRIES)
+
+# LRU of results of the current warehouse version, shared by every session and rerun
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def warehouse_version(duckdb_path: str = DUCKDB_PATH) -> str:
+    """Version stamp of the warehouse, derived from the database file without opening it."""
+    stat = os.stat(duckdb_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _cache_path(version: str, name: str, filters: Filters = None) -> str:
+    filename = f"{name}-{filters.key()}.parquet" if name in FILTERED_QUERIES else f"{name}.parquet"
+    return os.path.join(CACHE_DIR, version, filename)
+
+
+def _connect():
+    return runtime_config.connect('interactive', read_only=True)
+
+
+def _load(name: str, version: str, filters: Filters, connect) -> tuple[pd.DataFrame, str]:
+    """Memory, then Parquet cache, then DuckDB through a connection (or cursor) from ``connect``."""
+    filtered = name in FILTERED_QUERIES
+    if filtered and filters is None:
+        raise ValueError(f"Query {name} needs filters")
+    key = (version, name, filters.key() if filtered else None)
+    with _memory_lock:
+        df = _memory.get(key)
+        if df is not None:
+            _memory.move_to_end(key)
+    if df is not None:
+        return df, 'memory'
+
+    path = _cache_path(version, name, filters)
+    if os.path.exists(path):
+        df, source = pd.read_parquet(path), 'cache'
+    else:
+        con = connect()
+        try:
+            params = filters.params() if filtered else None
+            df, source = con.execute(QUERIES[name], params).fetchdf(), 'duckdb'
+        finally:
+            con.close()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    with _memory_lock:
+        for stale in [stale for stale in _memory if stale[0] != version]:
+            del _memory[stale]
+        _memory[key] = df
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+    return df, source
+
+
+def load(name: str, version: str = None, filters: Filters = None) -> pd.DataFrame:
+    """
+    Result of a named dashboard query, from the Parquet cache when it matches the warehouse version.
+
+    Args:
+        name: Key in QUERIES
+        version: Warehouse version stamp (default: current one)
+        filters: Required for FILTERED_QUERIES, part of the cache key
+    """
+    version = version or warehouse_version()
+    start = time.perf_counter()
+    df, source = _load(name, version, filters, _connect)
+    QUERY_LOG.append((name, time.perf_counter() - start, source))
+    return df
+
+
+def load_concurrently(names: list, version: str = None, filters: Filters = None):
+    """
+    Run several dashboard queries at once, each on its own cursor of a shared read-only connection.
+
+    Yields (name, DataFrame, seconds, source) in completion order, so callers can render
+    whatever is ready while the slower queries are still running.
+    """
+    version = version or warehouse_version()
+    con = None
+    con_lock = threading.Lock()
+
+    def cursor():
+        # Opened lazily: nothing touches DuckDB when every result is cached
+        nonlocal con
+        with con_lock:
+            if con is None:
+                con = _connect()
+            return con.cursor()
+
+    def timed_load(name):
+        start = time.perf_counter()
+        df, source = _load(name, version, filters, cursor)
+        seconds = time.perf_counter() - start
+        QUERY_LOG.append((name, seconds, source))
+        return name, df, seconds, source
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="dashboard-query") as executor:
+            for future in as_completed([executor.submit(timed_load, name) for name in names]):
+                yield future.result()
+    finally:
+        if con is not None:
+            con.close()
+
+
+def default_filters(version: str = None) -> Filters:
+    """The last DEFAULT_WINDOW_DAYS days of loaded downloads, with no crate or version subset."""
+    bounds = load('date_bounds', version).iloc[0]
+    to_date = date.today() if pd.isna(bounds['max_date']) else pd.Timestamp(bounds['max_date']).date()
+    return Filters(from_date=to_date - timedelta(days=DEFAULT_WINDOW_DAYS - 1), to_date=to_date)
+
+
+def stored_grain(filters: Filters, version: str = None) -> str:
+    """Coarsest grain the version downloads are stored at within the filtered date range."""
+    grains = load('rollup_grains', version)
+    overlapping = grains[
+        (pd.to_datetime(grains['first_date']) <= pd.Timestamp(filters.to_date))
+        & (pd.to_datetime(grains['last_date']) >= pd.Timestamp(filters.from_date))
+    ]['grain']
+    return max(['day', *overlapping], key=GRANULARITY_DAYS.get)
+
+
+def downloads_query(filters: Filters, version: str = None) -> str:
+    """
+    Name of the downloads-over-time query whose granularity suits the filtered date range.
+
+    Compacted history is only exact at its own grain, so a range reaching into
+    the weekly or monthly rollups is charted per week or month.
+    """
+    granularity = choose_granularity(filters.from_date, filters.to_date, finest=stored_grain(filters, version))
+    return f"downloads_by_{granularity}"
+
+
+def _grain(rollup: pd.DataFrame, grain: str) -> pd.DataFrame:
+    return rollup[rollup['grain'] == grain].reset_index(drop=True)
+
+
+def summary(rollup: pd.DataFrame) -> dict:
+    """Overall orphan metrics from the ``total`` row of the rollup."""
+    total = _grain(rollup, 'total')
+    if total.empty:
+        return {}
+    row = total.iloc[0]
+    return {
+        'total_downloads': row['total_downloads'],
+        'total_records': row['total_records'],
+        'total_orphan_versions': row['orphan_version_ids'],
+        'total_orphan_downloads': row['orphan_downloads'],
+        'orphan_records': row['orphan_records'],
+        'orphan_earliest': None if pd.isna(row['orphan_earliest']) else pd.Timestamp(row['orphan_earliest']).date(),
+        'orphan_latest': None if pd.isna(row['orphan_latest']) else pd.Timestamp(row['orphan_latest']).date(),
+        'avg_downloads': row['total_downloads'] / row['total_records'] if row['total_records'] else None,
+        'avg_orphan_downloads': row['orphan_downloads'] / row['orphan_records'] if row['orphan_records'] else None,
+    }
+
+
+def downloads_over_time(downloads: pd.DataFrame) -> pd.DataFrame:
+    """Valid and orphan downloads per period of a ``downloads_by_*`` result."""
+    df = downloads.sort_values('period').reset_index(drop=True)
+    df['valid_downloads'] = df['total_downloads'] - df['orphan_downloads']
+    return df
+
+
+def monthly(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Per-month downloads, records and orphan rate, sorted by month."""
+    df = _grain(rollup, 'month').sort_values('month').reset_index(drop=True)
+    df['valid_downloads'] = df['total_downloads'] - df['orphan_downloads']
+    df['orphan_percentage'] = df['orphan_records'] * 100.0 / df['total_records']
+    return df
+
+
+def monthly_orphans(rollup: pd.DataFrame) -> pd.DataFrame:
+    """Months with orphan records, with distinct orphan version IDs."""
+    df = monthly(rollup)
+    df = df[df['orphan_records'] > 0]
+    return df[['month', 'orphan_version_ids', 'orphan_records', 'orphan_downloads']] \
+        .rename(columns={'orphan_version_ids': 'distinct_orphan_ids'}).reset_index(drop=True)
+
+
+def yearly(yearly_rollup: pd.DataFrame) -> pd.DataFrame:
+    """Per-year orphan vs total version IDs, records and downloads."""
+    df = yearly_rollup.sort_values('year').reset_index(drop=True)
+    return df[['year', 'total_version_ids', 'orphan_records', 'orphan_version_ids', 'orphan_downloads', 'total_downloads']]
+
+
+def warm():
+    """Run every dashboard query with the default filters for the current warehouse version and drop stale cache versions."""
+    version = warehouse_version()
+    start = time.time()
+    filters = default_filters(version)
+    names = [name for name in QUERIES if not name.startswith('downloads_by_')] + [downloads_query(filters, version)]
+    for name, _, seconds, source in load_concurrently(names, version, filters):
+        print(f"  {name}: {seconds:.2f}s ({source})")
+
+    for stale in os.listdir(CACHE_DIR):
+        if stale != version:
+            shutil.rmtree(os.path.join(CACHE_DIR, stale), ignore_errors=True)
+
+    print(f"✓ Dashboard cache warm for warehouse version {version} in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Precompute all dashboard queries into the on-disk cache"
+    )
+    args = parser.parse_args()
+
+    if args.warm:
+        warm()
+    else:
+        parser.print_help()
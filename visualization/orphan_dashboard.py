@@ -1,9 +1,14 @@
+import time
+
 import streamlit as st
-import duckdb
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+import dashboard_data as data
+import timeseries
+
 # Page config
 st.set_page_config(
     page_title="Orphan Version Analysis - Rust Crates",
@@ -11,436 +16,425 @@ st.set_page_config(
     layout="wide"
 )
 
-# Connect to DuckDB
-@st.cache_resource
-def get_db():
-    return duckdb.connect('data/crates.duckdb', read_only=True)
+def render_summary(results):
+    """Headline counts and orphan totals."""
+    counts = results['counts'].iloc[0]
+    summary = data.summary(results['orphan_rollup'])
 
-con = get_db()
+    col1, col2, col3, col4, col5 = st.columns(5)
 
-# Title and description
-st.title("🔍 Orphan Version Analysis Dashboard")
-st.markdown("""
-This dashboard analyzes **orphan version IDs** - download records that reference versions no longer present in the `stg_versions` table.
-These orphans may indicate deleted/yanked versions, data sync issues, or historical data inconsistencies.
-""")
-st.markdown("---")
+    with col1:
+        total_crates = counts['total_crates']
+        st.metric("Total Crates", f"{total_crates:,}")
 
-# SUMMARY STATISTICS
-st.header("📊 Summary Statistics")
-
-col1, col2, col3, col4, col5 = st.columns(5)
-
-with col1:
-    total_crates = con.execute("SELECT COUNT(*) FROM staging.stg_crates").fetchone()[0]
-    st.metric("Total Crates", f"{total_crates:,}")
-
-with col2:
-    total_versions = con.execute("SELECT COUNT(*) FROM staging.stg_versions").fetchone()[0]
-    st.metric("Total Versions", f"{total_versions:,}")
-
-with col3:
-    orphan_versions_query = """
-        SELECT COUNT(DISTINCT vd.version_id)
-        FROM staging.stg_version_downloads vd
-        LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-        WHERE v.id IS NULL
-    """
-    total_orphan_versions = con.execute(orphan_versions_query).fetchone()[0]
-    st.metric(
-        "Total Orphan Versions",
-        f"{total_orphan_versions:,}",
-        delta=f"{(total_orphan_versions / total_versions * 100):.2f}% of versions" if total_versions > 0 else "0%",
-        delta_color="inverse"
-    )
+    with col2:
+        total_versions = counts['total_versions']
+        st.metric("Total Versions", f"{total_versions:,}")
 
-with col4:
-    total_downloads = con.execute("SELECT SUM(downloads) FROM staging.stg_version_downloads").fetchone()[0]
-    st.metric("Total Downloads", f"{total_downloads/1e9:.2f}B")
-
-with col5:
-    orphan_downloads_query = """
-        SELECT SUM(vd.downloads)
-        FROM staging.stg_version_downloads vd
-        LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-        WHERE v.id IS NULL
-    """
-    total_orphan_downloads = con.execute(orphan_downloads_query).fetchone()[0]
-
-    if total_orphan_downloads:
-        orphan_pct = (total_orphan_downloads / total_downloads * 100) if total_downloads > 0 else 0
+    with col3:
+        total_orphan_versions = summary.get('total_orphan_versions', 0)
         st.metric(
-            "Total Orphan Downloads",
-            f"{total_orphan_downloads/1e6:.2f}M",
-            delta=f"{orphan_pct:.3f}% of total",
+            "Total Orphan Versions",
+            f"{total_orphan_versions:,}",
+            delta=f"{(total_orphan_versions / total_versions * 100):.2f}% of versions" if total_versions > 0 else "0%",
             delta_color="inverse"
         )
-    else:
-        st.metric("Total Orphan Downloads", "0")
 
-st.markdown("---")
+    with col4:
+        total_downloads = summary.get('total_downloads', 0)
+        st.metric("Total Downloads", f"{total_downloads/1e9:.2f}B")
 
-# Detailed orphan metrics
-st.header("🔢 Orphan Metrics Breakdown")
-
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    orphan_records_query = """
-        SELECT COUNT(*)
-        FROM staging.stg_version_downloads vd
-        LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-        WHERE v.id IS NULL
-    """
-    orphan_records = con.execute(orphan_records_query).fetchone()[0]
-    total_records = con.execute("SELECT COUNT(*) FROM staging.stg_version_downloads").fetchone()[0]
-
-    st.metric(
-        "Orphan Download Records",
-        f"{orphan_records:,}",
-        delta=f"{(orphan_records / total_records * 100):.2f}% of records" if total_records > 0 else "0%",
-        delta_color="inverse"
-    )
+    with col5:
+        total_orphan_downloads = summary.get('total_orphan_downloads')
+
+        if total_orphan_downloads:
+            orphan_pct = (total_orphan_downloads / total_downloads * 100) if total_downloads > 0 else 0
+            st.metric(
+                "Total Orphan Downloads",
+                f"{total_orphan_downloads/1e6:.2f}M",
+                delta=f"{orphan_pct:.3f}% of total",
+                delta_color="inverse"
+            )
+        else:
+            st.metric("Total Orphan Downloads", "0")
+
+
+def render_breakdown(results):
+    """Orphan records, date range and average downloads."""
+    summary = data.summary(results['orphan_rollup'])
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        orphan_records = summary.get('orphan_records', 0)
+        total_records = summary.get('total_records', 0)
 
-with col2:
-    date_range_query = """
-        SELECT
-            MIN(vd.date) as earliest,
-            MAX(vd.date) as latest
-        FROM staging.stg_version_downloads vd
-        LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-        WHERE v.id IS NULL
-    """
-    earliest, latest = con.execute(date_range_query).fetchone()
-
-    st.metric("Orphan Date Range", f"{(latest - earliest).days if earliest and latest else 0} days")
-    if earliest and latest:
-        st.caption(f"From {earliest} to {latest}")
-
-with col3:
-    avg_orphan_downloads_query = """
-        SELECT AVG(vd.downloads)
-        FROM staging.stg_version_downloads vd
-        LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-        WHERE v.id IS NULL
-    """
-    avg_orphan = con.execute(avg_orphan_downloads_query).fetchone()[0]
-    avg_all = con.execute("SELECT AVG(downloads) FROM staging.stg_version_downloads").fetchone()[0]
-
-    if avg_orphan:
         st.metric(
-            "Avg Downloads per Orphan Record",
-            f"{avg_orphan:.1f}",
-            delta=f"{((avg_orphan - avg_all) / avg_all * 100):.1f}% vs all records" if avg_all > 0 else "N/A"
+            "Orphan Download Records",
+            f"{orphan_records:,}",
+            delta=f"{(orphan_records / total_records * 100):.2f}% of records" if total_records > 0 else "0%",
+            delta_color="inverse"
         )
-    else:
-        st.metric("Avg Downloads per Orphan Record", "0")
 
-st.markdown("---")
+    with col2:
+        earliest, latest = summary.get('orphan_earliest'), summary.get('orphan_latest')
 
-# MONTHLY DOWNLOADS COMPARISON
-st.header("📈 Monthly Downloads: Valid vs Orphan")
-
-monthly_downloads_query = """
-    SELECT
-        DATE_TRUNC('month', vd.date) as month,
-        SUM(CASE WHEN v.id IS NULL THEN vd.downloads ELSE 0 END) as orphan_downloads,
-        SUM(CASE WHEN v.id IS NOT NULL THEN vd.downloads ELSE 0 END) as valid_downloads,
-        SUM(vd.downloads) as total_downloads
-    FROM staging.stg_version_downloads vd
-    LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-    GROUP BY month
-    ORDER BY month
-"""
-
-df_monthly = con.execute(monthly_downloads_query).fetchdf()
-
-if not df_monthly.empty:
-    # Create two separate line charts
-    fig_monthly = make_subplots(
-        rows=2, cols=1,
-        subplot_titles=('Valid Downloads per Month', 'Orphan Downloads per Month'),
-        vertical_spacing=0.12,
-        specs=[[{"type": "scatter"}], [{"type": "scatter"}]]
-    )
+        st.metric("Orphan Date Range", f"{(latest - earliest).days if earliest and latest else 0} days")
+        if earliest and latest:
+            st.caption(f"From {earliest} to {latest}")
 
-    # Add valid downloads chart
-    fig_monthly.add_trace(
-        go.Scatter(
-            x=df_monthly['month'],
-            y=df_monthly['valid_downloads'],
-            name='Valid Downloads',
-            fill='tozeroy',
-            line=dict(color='#2ecc71', width=2),
-            hovertemplate='%{y:,.0f}<extra></extra>'
-        ),
-        row=1, col=1
-    )
+    with col3:
+        avg_orphan = summary.get('avg_orphan_downloads')
+        avg_all = summary.get('avg_downloads')
+
+        if avg_orphan:
+            st.metric(
+                "Avg Downloads per Orphan Record",
+                f"{avg_orphan:.1f}",
+                delta=f"{((avg_orphan - avg_all) / avg_all * 100):.1f}% vs all records" if avg_all > 0 else "N/A"
+            )
+        else:
+            st.metric("Avg Downloads per Orphan Record", "0")
+
+
+def render_downloads_over_time(results):
+    """Valid vs orphan downloads per day, week or month, depending on the date range."""
+    downloads_query = data.downloads_query(filters, version)
+    granularity = downloads_query.removeprefix('downloads_by_')
+    df_downloads = data.downloads_over_time(results[downloads_query])
+    df_monthly = data.monthly(results['orphan_rollup'])
+
+    if not df_downloads.empty:
+        # Bounded number of points per trace, whatever the range
+        df_valid = timeseries.downsample(df_downloads, 'period', 'valid_downloads')
+        df_orphan = timeseries.downsample(df_downloads, 'period', 'orphan_downloads')
+
+        # Create two separate line charts
+        fig_monthly = make_subplots(
+            rows=2, cols=1,
+            subplot_titles=(f'Valid Downloads per {granularity.title()}', f'Orphan Downloads per {granularity.title()}'),
+            vertical_spacing=0.12,
+            specs=[[{"type": "scatter"}], [{"type": "scatter"}]]
+        )
 
-    # Add orphan downloads chart
-    fig_monthly.add_trace(
-        go.Scatter(
-            x=df_monthly['month'],
-            y=df_monthly['orphan_downloads'],
-            name='Orphan Downloads',
-            fill='tozeroy',
-            line=dict(color='#e74c3c', width=2),
-            hovertemplate='%{y:,.0f}<extra></extra>'
-        ),
-        row=2, col=1
-    )
+        # Add valid downloads chart
+        fig_monthly.add_trace(
+            go.Scatter(
+                x=df_valid['period'],
+                y=df_valid['valid_downloads'],
+                name='Valid Downloads',
+                fill='tozeroy',
+                line=dict(color='#2ecc71', width=2),
+                hovertemplate='%{y:,.0f}<extra></extra>'
+            ),
+            row=1, col=1
+        )
 
-    fig_monthly.update_xaxes(title_text="Month", row=2, col=1)
-    fig_monthly.update_yaxes(title_text="Downloads", row=1, col=1)
-    fig_monthly.update_yaxes(title_text="Downloads", row=2, col=1)
+        # Add orphan downloads chart
+        fig_monthly.add_trace(
+            go.Scatter(
+                x=df_orphan['period'],
+                y=df_orphan['orphan_downloads'],
+                name='Orphan Downloads',
+                fill='tozeroy',
+                line=dict(color='#e74c3c', width=2),
+                hovertemplate='%{y:,.0f}<extra></extra>'
+            ),
+            row=2, col=1
+        )
 
-    fig_monthly.update_layout(
-        height=700,
-        showlegend=True,
-        hovermode='x unified'
-    )
+        fig_monthly.update_xaxes(title_text=granularity.title(), row=2, col=1)
+        fig_monthly.update_yaxes(title_text="Downloads", row=1, col=1)
+        fig_monthly.update_yaxes(title_text="Downloads", row=2, col=1)
 
-    st.plotly_chart(fig_monthly, use_container_width=True)
+        fig_monthly.update_layout(
+            height=700,
+            showlegend=True,
+            hovermode='x unified'
+        )
 
-    with st.expander("📋 View Monthly Data Table"):
-        df_monthly['orphan_pct'] = (df_monthly['orphan_downloads'] / df_monthly['total_downloads'] * 100).round(3)
-        st.dataframe(df_monthly, use_container_width=True)
-else:
-    st.info("No monthly download data available.")
+        st.plotly_chart(fig_monthly, use_container_width=True)
+        st.caption(
+            f"{len(df_downloads):,} {granularity}s in range, "
+            f"plotted with {max(len(df_valid), len(df_orphan)):,} points per trace"
+        )
 
-st.markdown("---")
+        with st.expander("📋 View Monthly Data Table"):
+            df_monthly_table = df_monthly[['month', 'orphan_downloads', 'valid_downloads', 'total_downloads']].copy()
+            df_monthly_table['orphan_pct'] = (df_monthly_table['orphan_downloads'] / df_monthly_table['total_downloads'] * 100).round(3)
+            st.dataframe(df_monthly_table, use_container_width=True)
+    else:
+        st.info("No download data available.")
 
-# MONTHLY ORPHAN VERSION IDS
-st.header("🆔 Monthly Distinct Orphan Version IDs")
-
-monthly_orphan_ids_query = """
-    SELECT
-        DATE_TRUNC('month', vd.date) as month,
-        COUNT(DISTINCT vd.version_id) as distinct_orphan_ids,
-        COUNT(*) as orphan_records,
-        SUM(vd.downloads) as orphan_downloads
-    FROM staging.stg_version_downloads vd
-    LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-    WHERE v.id IS NULL
-    GROUP BY month
-    ORDER BY month
-"""
-
-df_monthly_orphans = con.execute(monthly_orphan_ids_query).fetchdf()
-
-if not df_monthly_orphans.empty:
-    # Create figure with secondary axis
-    fig_orphan_ids = make_subplots(
-        rows=2, cols=1,
-        subplot_titles=('Distinct Orphan Version IDs per Month', 'Orphan Download Records per Month'),
-        vertical_spacing=0.15,
-        specs=[[{"secondary_y": False}], [{"secondary_y": False}]]
-    )
 
-    # Distinct IDs
-    fig_orphan_ids.add_trace(
-        go.Bar(
-            x=df_monthly_orphans['month'],
-            y=df_monthly_orphans['distinct_orphan_ids'],
-            name='Distinct Orphan IDs',
-            marker_color='#e67e22',
-            hovertemplate='%{y:,.0f} orphan IDs'
-        ),
-        row=1, col=1
-    )
+def render_monthly_orphan_ids(results):
+    """Distinct orphan version IDs and records per month."""
+    df_monthly_orphans = data.monthly_orphans(results['orphan_rollup'])
 
-    # Orphan records
-    fig_orphan_ids.add_trace(
-        go.Bar(
-            x=df_monthly_orphans['month'],
-            y=df_monthly_orphans['orphan_records'],
-            name='Orphan Records',
-            marker_color='#9b59b6',
-            hovertemplate='%{y:,.0f} records'
-        ),
-        row=2, col=1
-    )
+    if not df_monthly_orphans.empty:
+        # Create figure with secondary axis
+        fig_orphan_ids = make_subplots(
+            rows=2, cols=1,
+            subplot_titles=('Distinct Orphan Version IDs per Month', 'Orphan Download Records per Month'),
+            vertical_spacing=0.15,
+            specs=[[{"secondary_y": False}], [{"secondary_y": False}]]
+        )
 
-    fig_orphan_ids.update_xaxes(title_text="Month", row=2, col=1)
-    fig_orphan_ids.update_yaxes(title_text="Count", row=1, col=1)
-    fig_orphan_ids.update_yaxes(title_text="Count", row=2, col=1)
+        # Distinct IDs
+        fig_orphan_ids.add_trace(
+            go.Bar(
+                x=df_monthly_orphans['month'],
+                y=df_monthly_orphans['distinct_orphan_ids'],
+                name='Distinct Orphan IDs',
+                marker_color='#e67e22',
+                hovertemplate='%{y:,.0f} orphan IDs'
+            ),
+            row=1, col=1
+        )
 
-    fig_orphan_ids.update_layout(
-        height=700,
-        showlegend=True,
-        hovermode='x unified'
-    )
+        # Orphan records
+        fig_orphan_ids.add_trace(
+            go.Bar(
+                x=df_monthly_orphans['month'],
+                y=df_monthly_orphans['orphan_records'],
+                name='Orphan Records',
+                marker_color='#9b59b6',
+                hovertemplate='%{y:,.0f} records'
+            ),
+            row=2, col=1
+        )
 
-    st.plotly_chart(fig_orphan_ids, use_container_width=True)
+        fig_orphan_ids.update_xaxes(title_text="Month", row=2, col=1)
+        fig_orphan_ids.update_yaxes(title_text="Count", row=1, col=1)
+        fig_orphan_ids.update_yaxes(title_text="Count", row=2, col=1)
 
-    # Summary metrics
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Peak Orphan IDs (Single Month)", f"{df_monthly_orphans['distinct_orphan_ids'].max():,}")
-    with col2:
-        st.metric("Avg Orphan IDs per Month", f"{df_monthly_orphans['distinct_orphan_ids'].mean():.0f}")
-    with col3:
-        avg_records_per_id = (df_monthly_orphans['orphan_records'].sum() / df_monthly_orphans['distinct_orphan_ids'].sum())
-        st.metric("Avg Records per Orphan ID", f"{avg_records_per_id:.1f}")
+        fig_orphan_ids.update_layout(
+            height=700,
+            showlegend=True,
+            hovermode='x unified'
+        )
 
-    with st.expander("📋 View Orphan IDs Data Table"):
-        st.dataframe(df_monthly_orphans, use_container_width=True)
-else:
-    st.info("No orphan version ID data available.")
+        st.plotly_chart(fig_orphan_ids, use_container_width=True)
 
-st.markdown("---")
+        # Summary metrics
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Peak Orphan IDs (Single Month)", f"{df_monthly_orphans['distinct_orphan_ids'].max():,}")
+        with col2:
+            st.metric("Avg Orphan IDs per Month", f"{df_monthly_orphans['distinct_orphan_ids'].mean():.0f}")
+        with col3:
+            avg_records_per_id = (df_monthly_orphans['orphan_records'].sum() / df_monthly_orphans['distinct_orphan_ids'].sum())
+            st.metric("Avg Records per Orphan ID", f"{avg_records_per_id:.1f}")
 
-# TOP ORPHAN VERSION IDS
-st.header("🔝 Top Orphan Version IDs by Downloads")
-
-top_orphans_query = """
-    SELECT
-        vd.version_id,
-        COUNT(*) as record_count,
-        SUM(vd.downloads) as total_downloads,
-        MIN(vd.date) as first_seen,
-        MAX(vd.date) as last_seen,
-        MAX(vd.date) - MIN(vd.date) as days_active
-    FROM staging.stg_version_downloads vd
-    LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-    WHERE v.id IS NULL
-    GROUP BY vd.version_id
-    ORDER BY total_downloads DESC
-    LIMIT 30
-"""
-
-df_top_orphans = con.execute(top_orphans_query).fetchdf()
-
-if not df_top_orphans.empty:
-    col1, col2 = st.columns([2, 1])
+        with st.expander("📋 View Orphan IDs Data Table"):
+            st.dataframe(df_monthly_orphans, use_container_width=True)
+    else:
+        st.info("No orphan version ID data available.")
+
+
+def render_top_orphans(results):
+    """Orphan version IDs with the most downloads."""
+    df_top_orphans = results['top_orphans']
+
+    if not df_top_orphans.empty:
+        col1, col2 = st.columns([2, 1])
+
+        with col1:
+            fig_top_orphans = px.bar(
+                df_top_orphans.head(20),
+                x='version_id',
+                y='total_downloads',
+                title='Top 20 Orphan Version IDs by Total Downloads',
+                labels={'version_id': 'Version ID', 'total_downloads': 'Total Downloads'},
+                color='total_downloads',
+                color_continuous_scale='Reds',
+                hover_data=['record_count', 'days_active']
+            )
+            fig_top_orphans.update_layout(xaxis_tickangle=-45)
+            st.plotly_chart(fig_top_orphans, use_container_width=True)
+
+        with col2:
+            st.subheader("Top 10 Details")
+            for idx, row in df_top_orphans.head(10).iterrows():
+                with st.container():
+                    st.markdown(f"**Version ID:** `{row['version_id']}`")
+                    # days_active is already an integer representing days
+                    days = int(row['days_active']) if row['days_active'] is not None else 0
+                    st.caption(f"Downloads: {row['total_downloads']:,} | Records: {row['record_count']} | Active: {days} days")
+                    st.divider()
+
+        with st.expander("📋 View Top 30 Orphan Version IDs"):
+            st.dataframe(df_top_orphans, use_container_width=True)
+    else:
+        st.info("No orphan version data available.")
 
-    with col1:
-        fig_top_orphans = px.bar(
-            df_top_orphans.head(20),
-            x='version_id',
-            y='total_downloads',
-            title='Top 20 Orphan Version IDs by Total Downloads',
-            labels={'version_id': 'Version ID', 'total_downloads': 'Total Downloads'},
-            color='total_downloads',
-            color_continuous_scale='Reds',
-            hover_data=['record_count', 'days_active']
+
+def render_orphan_rate(results):
+    """Share of orphan records per month."""
+    df_orphan_rate = data.monthly(results['orphan_rollup'])
+
+    if not df_orphan_rate.empty:
+        fig_rate = go.Figure()
+
+        fig_rate.add_trace(go.Scatter(
+            x=df_orphan_rate['month'],
+            y=df_orphan_rate['orphan_percentage'],
+            mode='lines+markers',
+            name='Orphan Rate',
+            line=dict(color='#e74c3c', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(231, 76, 60, 0.1)'
+        ))
+
+        fig_rate.update_layout(
+            title='Orphan Rate (%) Over Time',
+            xaxis_title='Month',
+            yaxis_title='Orphan Percentage (%)',
+            hovermode='x unified',
+            height=400
         )
-        fig_top_orphans.update_layout(xaxis_tickangle=-45)
-        st.plotly_chart(fig_top_orphans, use_container_width=True)
 
-    with col2:
-        st.subheader("Top 10 Details")
-        for idx, row in df_top_orphans.head(10).iterrows():
-            with st.container():
-                st.markdown(f"**Version ID:** `{row['version_id']}`")
-                # days_active is already an integer representing days
-                days = int(row['days_active']) if row['days_active'] is not None else 0
-                st.caption(f"Downloads: {row['total_downloads']:,} | Records: {row['record_count']} | Active: {days} days")
-                st.divider()
-
-    with st.expander("📋 View Top 30 Orphan Version IDs"):
-        st.dataframe(df_top_orphans, use_container_width=True)
-else:
-    st.info("No orphan version data available.")
+        st.plotly_chart(fig_rate, use_container_width=True)
 
-st.markdown("---")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Current Month Orphan Rate", f"{df_orphan_rate.iloc[-1]['orphan_percentage']:.3f}%")
+        with col2:
+            st.metric("Average Orphan Rate", f"{df_orphan_rate['orphan_percentage'].mean():.3f}%")
+        with col3:
+            st.metric("Peak Orphan Rate", f"{df_orphan_rate['orphan_percentage'].max():.3f}%")
+    else:
+        st.info("No orphan rate data available.")
 
-# ORPHAN PERCENTAGE OVER TIME
-st.header("📉 Orphan Rate Over Time")
-
-orphan_rate_query = """
-    SELECT
-        DATE_TRUNC('month', vd.date) as month,
-        COUNT(*) as total_records,
-        SUM(CASE WHEN v.id IS NULL THEN 1 ELSE 0 END) as orphan_records,
-        (SUM(CASE WHEN v.id IS NULL THEN 1 ELSE 0 END) * 100.0 / COUNT(*)) as orphan_percentage
-    FROM staging.stg_version_downloads vd
-    LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-    GROUP BY month
-    ORDER BY month
-"""
-
-df_orphan_rate = con.execute(orphan_rate_query).fetchdf()
-
-if not df_orphan_rate.empty:
-    fig_rate = go.Figure()
-
-    fig_rate.add_trace(go.Scatter(
-        x=df_orphan_rate['month'],
-        y=df_orphan_rate['orphan_percentage'],
-        mode='lines+markers',
-        name='Orphan Rate',
-        line=dict(color='#e74c3c', width=3),
-        fill='tozeroy',
-        fillcolor='rgba(231, 76, 60, 0.1)'
-    ))
-
-    fig_rate.update_layout(
-        title='Orphan Rate (%) Over Time',
-        xaxis_title='Month',
-        yaxis_title='Orphan Percentage (%)',
-        hovermode='x unified',
-        height=400
-    )
 
-    st.plotly_chart(fig_rate, use_container_width=True)
+def render_yearly(results):
+    """Orphan vs total version IDs per year."""
+    df_yearly = data.yearly(results['yearly_rollup'])
 
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Current Month Orphan Rate", f"{df_orphan_rate.iloc[-1]['orphan_percentage']:.3f}%")
-    with col2:
-        st.metric("Average Orphan Rate", f"{df_orphan_rate['orphan_percentage'].mean():.3f}%")
-    with col3:
-        st.metric("Peak Orphan Rate", f"{df_orphan_rate['orphan_percentage'].max():.3f}%")
-else:
-    st.info("No orphan rate data available.")
+    if not df_yearly.empty:
+        df_yearly['orphan_id_pct'] = (df_yearly['orphan_version_ids'] / df_yearly['total_version_ids'] * 100).round(2)
+        df_yearly['orphan_download_pct'] = (df_yearly['orphan_downloads'] / df_yearly['total_downloads'] * 100).round(4)
 
-st.markdown("---")
+        fig_yearly = px.bar(
+            df_yearly,
+            x='year',
+            y=['orphan_version_ids', 'total_version_ids'],
+            title='Orphan vs Total Version IDs by Year',
+            labels={'value': 'Count', 'variable': 'Type'},
+            barmode='group',
+            color_discrete_map={'orphan_version_ids': '#e74c3c', 'total_version_ids': '#3498db'}
+        )
 
-# YEARLY COMPARISON
-st.header("📅 Yearly Orphan Comparison")
-
-yearly_query = """
-    SELECT
-        EXTRACT(YEAR FROM vd.date) as year,
-        COUNT(DISTINCT vd.version_id) as total_version_ids,
-        SUM(CASE WHEN v.id IS NULL THEN 1 ELSE 0 END) as orphan_records,
-        COUNT(DISTINCT CASE WHEN v.id IS NULL THEN vd.version_id END) as orphan_version_ids,
-        SUM(CASE WHEN v.id IS NULL THEN vd.downloads ELSE 0 END) as orphan_downloads,
-        SUM(vd.downloads) as total_downloads
-    FROM staging.stg_version_downloads vd
-    LEFT JOIN staging.stg_versions v ON vd.version_id = v.id
-    GROUP BY year
-    ORDER BY year
-"""
-
-df_yearly = con.execute(yearly_query).fetchdf()
-
-if not df_yearly.empty:
-    df_yearly['orphan_id_pct'] = (df_yearly['orphan_version_ids'] / df_yearly['total_version_ids'] * 100).round(2)
-    df_yearly['orphan_download_pct'] = (df_yearly['orphan_downloads'] / df_yearly['total_downloads'] * 100).round(4)
-
-    fig_yearly = px.bar(
-        df_yearly,
-        x='year',
-        y=['orphan_version_ids', 'total_version_ids'],
-        title='Orphan vs Total Version IDs by Year',
-        labels={'value': 'Count', 'variable': 'Type'},
-        barmode='group',
-        color_discrete_map={'orphan_version_ids': '#e74c3c', 'total_version_ids': '#3498db'}
-    )
+        st.plotly_chart(fig_yearly, use_container_width=True)
 
-    st.plotly_chart(fig_yearly, use_container_width=True)
+        with st.expander("📋 View Yearly Breakdown"):
+            st.dataframe(df_yearly, use_container_width=True)
+    else:
+        st.info("No yearly data available.")
+
+
+page_start = time.perf_counter()
+# Query results are cached in memory and on disk per warehouse version and filters, DuckDB is only hit after an update
+version = data.warehouse_version()
+defaults = data.default_filters(version)
+bounds = data.load('date_bounds', version).iloc[0]
+min_date = defaults.from_date if pd.isna(bounds['min_date']) else min(pd.Timestamp(bounds['min_date']).date(), defaults.from_date)
+
+# Filters are pushed down into every download query
+with st.sidebar:
+    st.header("Filters")
+    date_range = st.date_input(
+        "Date range",
+        value=(defaults.from_date, defaults.to_date),
+        min_value=min_date,
+        max_value=defaults.to_date,
+        help=f"Defaults to the last {data.DEFAULT_WINDOW_DAYS} days of loaded downloads"
+    )
+    crate_input = st.text_input(
+        "Crates",
+        placeholder="serde, tokio",
+        help="Comma-separated crate names. Orphan records have no crate, so this shows only the crates' valid downloads"
+    )
+    category_input = st.text_input(
+        "Categories",
+        placeholder="Web programming::HTTP client",
+        help="Comma-separated category names, crates must be in all of them. A parent category includes its subcategories"
+    )
+    keyword_input = st.text_input("Keywords", placeholder="async, http", help="Comma-separated keywords, crates must have all of them")
+    version_input = st.text_input("Version IDs", placeholder="123, 456", help="Comma-separated version IDs")
+
+# The range picker returns a single date while the second one is being chosen
+from_date, to_date = (date_range[0], date_range[-1]) if date_range else (defaults.from_date, defaults.to_date)
+version_ids = [part.strip() for part in version_input.split(',') if part.strip()]
+if not all(part.isdigit() for part in version_ids):
+    st.sidebar.error("Version IDs must be numbers")
+    version_ids = []
+filters = data.Filters(
+    from_date=from_date,
+    to_date=to_date,
+    crate_names=tuple(sorted({part.strip() for part in crate_input.split(',') if part.strip()})),
+    version_ids=tuple(sorted({int(part) for part in version_ids})),
+    categories=tuple(sorted({part.strip() for part in category_input.split(',') if part.strip()})),
+    keywords=tuple(sorted({part.strip() for part in keyword_input.split(',') if part.strip()}))
+)
 
-    with st.expander("📋 View Yearly Breakdown"):
-        st.dataframe(df_yearly, use_container_width=True)
-else:
-    st.info("No yearly data available.")
+# Sections in page order: (header, queries it needs, renderer, loaded only on request)
+SECTIONS = [
+    ("📊 Summary Statistics", ['counts', 'orphan_rollup'], render_summary, False),
+    ("🔢 Orphan Metrics Breakdown", ['orphan_rollup'], render_breakdown, False),
+    ("📈 Downloads Over Time: Valid vs Orphan", [data.downloads_query(filters, version), 'orphan_rollup'], render_downloads_over_time, False),
+    ("🆔 Monthly Distinct Orphan Version IDs", ['orphan_rollup'], render_monthly_orphan_ids, False),
+    ("🔝 Top Orphan Version IDs by Downloads", ['top_orphans'], render_top_orphans, False),
+    ("📉 Orphan Rate Over Time", ['orphan_rollup'], render_orphan_rate, False),
+    ("📅 Yearly Orphan Comparison", ['yearly_rollup'], render_yearly, True),
+]
 
-st.markdown("---")
+# Title and description
+st.title("🔍 Orphan Version Analysis Dashboard")
+st.markdown("""
+This dashboard analyzes **orphan version IDs** - download records that reference versions no longer present in the `stg_versions` table.
+These orphans may indicate deleted/yanked versions, data sync issues, or historical data inconsistencies.
+""")
+st.caption(f"Showing downloads from {filters.from_date} to {filters.to_date}")
+
+# Lay out every section first with a placeholder, then fill them in as their queries finish
+pending = []
+for title, queries, render, lazy in SECTIONS:
+    st.markdown("---")
+    st.header(title)
+    if lazy and not st.toggle("Load this section", key=f"load_{render.__name__}",
+                              help="Runs a separate scan of the download history"):
+        continue
+    placeholder = st.empty()
+    placeholder.info("⏳ Loading...")
+    pending.append((queries, render, placeholder))
+
+results, sources = {}, {}
+needed = list(dict.fromkeys(query for queries, _, _ in pending for query in queries))
+for name, df, seconds, source in data.load_concurrently(needed, version, filters):
+    results[name], sources[name] = df, source
+    for section in [section for section in pending if all(query in results for query in section[0])]:
+        queries, render, placeholder = section
+        with placeholder.container():
+            render(results)
+            st.caption(
+                f"⏱️ Ready {time.perf_counter() - page_start:.2f}s after page start "
+                f"({', '.join(sorted({sources[query] for query in queries}))})"
+            )
+        pending.remove(section)
 
 # Footer
 st.markdown("---")
+with st.expander("⏱️ Query Stats"):
+    # The log is shared by every session of this dashboard process
+    query_log = list(data.QUERY_LOG)
+    duckdb_queries = [entry for entry in query_log if entry[2] == 'duckdb']
+    st.caption(
+        f"Last {len(query_log)} loads across all sessions of this dashboard server: "
+        f"{len(duckdb_queries)} DuckDB queries ({sum(entry[1] for entry in duckdb_queries):.2f}s), "
+        f"{len(query_log) - len(duckdb_queries)} served from memory or the on-disk cache"
+    )
+    st.dataframe(pd.DataFrame(query_log, columns=['query', 'seconds', 'source']), use_container_width=True)
 st.markdown("""
 **Data Source:** crates.io database dump | **Database:** DuckDB | **Framework:** Streamlit
-""")
\ No newline at end of file
+""")
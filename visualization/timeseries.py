@@ -0,0 +1,87 @@
+"""
+Time-series preparation for dashboard charts.
+
+The bucket size is picked from the requested range: daily while the range fits
+in MAX_POINTS days, then weekly, then monthly, but never finer than the
+coarsest retention tier the range reaches into (history older than the daily
+window is only kept as weekly or monthly rollups, whose rows would otherwise
+show up as spikes on their first day). Every series is then reduced
+with Largest-Triangle-Three-Buckets (LTTB), which keeps the points that shape
+the curve (peaks, dips) rather than every n-th one. Together they bound what a
+chart ships to the browser to MAX_POINTS points per trace, however long the
+range is or however many versions are plotted.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 1000
+
+# Bucket width in days, finest first
+GRANULARITY_DAYS = {
+    'day': 1,
+    'week': 7,
+    'month': 30,
+}
+
+
+def choose_granularity(from_date: date, to_date: date, max_points: int = MAX_POINTS, finest: str = 'day') -> str:
+    """
+    Finest granularity that covers the range in at most ``max_points`` buckets
+    and is not finer than ``finest`` (the coarsest stored grain in the range).
+    """
+    days = (to_date - from_date).days + 1
+    for granularity, bucket_days in GRANULARITY_DAYS.items():
+        if bucket_days >= GRANULARITY_DAYS[finest] and days / bucket_days <= max_points:
+            return granularity
+    return 'month'
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Args:
+        x: Ascending x values (numbers or datetime64)
+        y: Values at ``x``
+        threshold: Number of points to keep, including the first and last one
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('int64')
+    x = x.astype(float)
+    y = np.asarray(y, dtype=float)
+
+    # Points between the fixed first and last one, split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick and the next bucket's average
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        keep[i + 1] = selected
+    return keep
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """Rows of ``df`` (sorted by ``x``) that LTTB keeps for the ``y`` series."""
+    df = df.sort_values(x).reset_index(drop=True)
+    if len(df) <= max_points:
+        return df
+    return df.iloc[lttb(df[x].to_numpy(), df[y].fillna(0).to_numpy(), max_points)].reset_index(drop=True)